@@ -0,0 +1,104 @@
+"""
+Compresión de `code` y del HTML resaltado (snippets.compression): espacio en
+la base de datos frente a tiempo de escritura y de lectura.
+
+Para cada configuración (sin comprimir, zlib con nivel 1 y 6, zstd si está
+instalado) se vacía la tabla, se insertan los mismos snippets ya resaltados
+y se mide: la inserción, los bytes guardados en las dos columnas, el tamaño
+de las tablas (con índices y TOAST en PostgreSQL; en SQLite, la base entera),
+una lectura completa del HTML y el p50 del highlight y del detalle. Cada
+snippet tiene un código distinto, para que no se compartan (snippets.renderings).
+
+Uso: python benchmarks/compression.py [--database auto] [--snippets 2000] [--code-lines 60] [--requests 200]
+"""
+import argparse
+import random
+import time
+
+from utils import DATABASE_CHOICES, make_code, measure, seed, setup_django, summary, test_database
+
+
+def database_size(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT pg_total_relation_size('snippets_snippet')"
+                           " + pg_total_relation_size('snippets_snippetrendering')")
+            return cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_count')
+        pages = cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_size')
+        return pages * cursor.fetchone()[0]
+
+
+def stored_bytes(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT SUM(LENGTH(code)) FROM snippets_snippet')
+        code_bytes, = cursor.fetchone()
+        cursor.execute('SELECT SUM(LENGTH(html)) FROM snippets_snippetrendering')
+        return code_bytes, cursor.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', choices=DATABASE_CHOICES, default='auto')
+    parser.add_argument('--snippets', type=int, default=2000)
+    parser.add_argument('--code-lines', type=int, default=60)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django(args.database)
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+    from snippets.compression import zstandard
+    from snippets.highlighting import highlight_cache, render, stores_full_document
+    from snippets.models import Snippet, SnippetRendering
+
+    code = make_code(args.code_lines)
+    html = render(code, 'python', 'friendly', False, '', full=stores_full_document())
+    variants = [('sin comprimir', {'COMPRESSION_THRESHOLD': 10 ** 9}),
+                ('zlib 1', {'COMPRESSION_CODEC': 'zlib', 'COMPRESSION_LEVEL': 1}),
+                ('zlib 6', {'COMPRESSION_CODEC': 'zlib', 'COMPRESSION_LEVEL': 6})]
+    if zstandard is not None:
+        variants.append(('zstd 3', {'COMPRESSION_CODEC': 'zstd', 'COMPRESSION_LEVEL': 3}))
+
+    print('código %d caracteres, highlighted %d caracteres' % (len(code), len(html)))
+    print('%-14s %9s %10s %14s %10s %10s %12s %11s' % (
+        'modo', 'insert s', 'code KB', 'highlight KB', 'tabla KB', 'scan ms', 'highlight ms', 'detalle ms'))
+    base = dict(settings.SNIPPETS)
+    with test_database() as connection:
+        for name, options in variants:
+            settings.SNIPPETS = dict(base, **options)
+            # Se parte de una tabla vacía y compactada
+            User.objects.all().delete()
+            SnippetRendering.objects.all().delete()
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('VACUUM FULL snippets_snippet')
+                    cursor.execute('VACUUM FULL snippets_snippetrendering')
+                else:
+                    cursor.execute('VACUUM')
+            start = time.perf_counter()
+            seed(snippets=args.snippets, code_lines=args.code_lines, highlighted=html, distinct=True)
+            inserted = time.perf_counter() - start
+            code_bytes, html_bytes = stored_bytes(connection)
+            size = database_size(connection)
+            scan = summary(measure(lambda: list(SnippetRendering.objects.values_list('html', flat=True)),
+                                   repeat=3, warmup=1))
+
+            highlight_cache.clear()
+            pks = list(Snippet.objects.values_list('pk', flat=True))
+            rng = random.Random(0)
+            sample = [rng.choice(pks) for _ in range(args.requests)]
+            client = APIClient()
+            highlight = [t for pk in sample
+                         for t in measure(lambda: client.get('/snippets/%d/highlight/' % pk), repeat=1, warmup=0)]
+            detail = [t for pk in sample
+                      for t in measure(lambda: client.get('/snippets/%d/' % pk), repeat=1, warmup=0)]
+            print('%-14s %9.2f %10.1f %14.1f %10.1f %10.2f %12.3f %11.3f' % (
+                name, inserted, code_bytes / 1024, html_bytes / 1024, size / 1024, scan['p50_ms'],
+                summary(highlight)['p50_ms'], summary(detail)['p50_ms']))
+
+
+if __name__ == '__main__':
+    main()
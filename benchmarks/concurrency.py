@@ -0,0 +1,253 @@
+"""
+Rendimiento con peticiones concurrentes: WSGI (gunicorn, workers síncronos)
+frente a ASGI (uvicorn, tutorial/asgi.py) con las vistas asíncronas de /async/.
+
+Se levantan los servidores sobre una base SQLite temporal con datos sintéticos
+y se piden las mismas rutas con N conexiones HTTP/1.1 simultáneas (keep-alive
+cuando el servidor lo admite), a varios niveles de concurrencia:
+
+- wsgi: gunicorn con las vistas del router (/snippets/, /users/...),
+- asgi-sync: uvicorn con esas mismas vistas síncronas,
+- asgi-async: uvicorn con las vistas de /async/.
+
+En la ruta highlight los snippets están pendientes de resaltar y se piden más
+que los que caben en la caché, así que cada petición resalta con pygments:
+en la vista síncrona dentro del worker, en la asíncrona en el pool de
+snippets.tasks, sin bloquear el bucle de eventos.
+
+El ORM asíncrono de Django (4.1+) sigue ejecutando cada consulta en el hilo
+compartido de sync_to_async, así que las esperas a la base de datos de un
+worker ASGI no se solapan entre sí; la ganancia está en no ocupar un worker
+por conexión y en sacar el resaltado del bucle.
+
+Requiere Django 3.1+, gunicorn y uvicorn (los servidores que falten se saltan).
+
+Uso: python benchmarks/concurrency.py [--workers 2] [--concurrency 1,8,32,128]
+                                      [--duration 5] [--snippets 2000] [--routes list,detail]
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from utils import BASE_DIR, seed
+
+
+SETTINGS = '''
+from {settings} import *
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+DATABASES = {{'default': {{'ENGINE': 'django.db.backends.sqlite3', 'NAME': {database!r},
+                          'OPTIONS': {{'timeout': 30}}}}}}
+SNIPPETS = dict(globals().get('SNIPPETS', {{}}), RESPONSE_CACHE_ALIAS=None, HIGHLIGHT_PENDING_RESPONSE='render')
+'''
+
+REQUEST_TIMEOUT = 30
+
+# nombre: (ruta síncrona, ruta asíncrona), con {pk} y {user} sustituidos en cada petición
+ROUTES = {
+    'list': ('/snippets/?page_size=20', '/async/snippets/?page_size=20'),
+    'detail': ('/snippets/{pk}/', '/async/snippets/{pk}/'),
+    'highlight': ('/snippets/{pk}/highlight/', '/async/snippets/{pk}/highlight/'),
+    'users': ('/users/?page_size=20', '/async/users/?page_size=20'),
+    'user': ('/users/{user}/', '/async/users/{user}/'),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare(directory, args):
+    """
+    Crea la base SQLite y los settings temporales; devuelve (entorno, pks, pks de usuarios).
+    """
+    settings = os.environ.get('DJANGO_SETTINGS_MODULE', 'tutorial.settings')
+    with open(os.path.join(directory, 'concurrency_settings.py'), 'w') as settings_file:
+        settings_file.write(SETTINGS.format(settings=settings, database=os.path.join(directory, 'db.sqlite3')))
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='concurrency_settings',
+               PYTHONPATH=os.pathsep.join(filter(None, [directory, BASE_DIR, os.environ.get('PYTHONPATH')])))
+
+    sys.path[:0] = [directory, BASE_DIR]
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'concurrency_settings'
+    import django
+    from django.core.management import call_command
+    django.setup()
+    from snippets.models import Snippet, UserProfile
+
+    call_command('migrate', verbosity=0)
+    owners = seed(users=args.users, snippets=args.snippets, code_lines=args.code_lines)
+    UserProfile.refresh([owner.pk for owner in owners])
+    pks = list(Snippet.objects.order_by('pk').values_list('pk', flat=True))
+    # Pendientes de resaltar: el highlight resalta en cada petición
+    Snippet.objects.update(highlight_status=Snippet.HIGHLIGHT_PENDING)
+    return env, pks, [owner.pk for owner in owners]
+
+
+def server_commands(args, port):
+    bind = '127.0.0.1:%d' % port
+    commands = {}
+    if shutil.which('gunicorn') or importlib.util.find_spec('gunicorn'):
+        commands['wsgi'] = [sys.executable, '-m', 'gunicorn', 'tutorial.wsgi:application', '--bind', bind,
+                            '--workers', str(args.workers), '--log-level', 'warning']
+    if importlib.util.find_spec('uvicorn'):
+        commands['asgi'] = [sys.executable, '-m', 'uvicorn', 'tutorial.asgi:application', '--host', '127.0.0.1',
+                            '--port', str(port), '--workers', str(args.workers), '--log-level', 'warning',
+                            '--no-access-log']
+    return commands
+
+
+def wait_for(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('el servidor ha terminado con código %d' % process.returncode)
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('el servidor no responde en el puerto %d' % port)
+
+
+async def read_response(reader):
+    """
+    Lee una respuesta HTTP/1.1; devuelve (estado, bytes del cuerpo, keep-alive).
+    """
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip().lower()
+    if 'content-length' in headers:
+        size = int(headers['content-length'])
+        await reader.readexactly(size)
+    elif headers.get('transfer-encoding') == 'chunked':
+        size = 0
+        while True:
+            chunk = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(chunk + 2)
+            size += chunk
+            if not chunk:
+                break
+    else:
+        size = len(await reader.read())
+        return status, size, False
+    return status, size, headers.get('connection') != 'close'
+
+
+async def worker(port, paths, deadline, timings, errors):
+    reader = writer = None
+    index = 0
+    while time.monotonic() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(('GET %s HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n' % path).encode('ascii'))
+            status, _, keep_alive = await asyncio.wait_for(read_response(reader), REQUEST_TIMEOUT)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            errors.append('conexión')
+            keep_alive = False
+        else:
+            if status == 200:
+                timings.append(time.perf_counter() - start)
+            else:
+                errors.append(status)
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, paths, concurrency, duration):
+    timings, errors = [], []
+    deadline = time.monotonic() + duration
+    start = time.perf_counter()
+    # Cada conexión empieza en un punto distinto de la lista de rutas
+    await asyncio.gather(*[
+        worker(port, paths[i * 7 % len(paths):] + paths[:i * 7 % len(paths)], deadline, timings, errors)
+        for i in range(concurrency)
+    ])
+    return timings, errors, time.perf_counter() - start
+
+
+def route_paths(template, pks, users):
+    if '{pk}' in template:
+        return [template.format(pk=pk) for pk in pks]
+    if '{user}' in template:
+        return [template.format(user=user) for user in users]
+    return [template]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', default='1,8,32,128')
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--snippets', type=int, default=2000)
+    parser.add_argument('--code-lines', type=int, default=20)
+    parser.add_argument('--routes', default=','.join(ROUTES))
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    directory = tempfile.mkdtemp(prefix='concurrency-')
+    try:
+        env, pks, users = prepare(directory, args)
+        import django
+        if django.VERSION < (3, 1):
+            print('ASGI requiere Django 3.1 o posterior (instalado: %s)' % django.get_version())
+            return
+        port = free_port()
+        commands = server_commands(args, port)
+        for name in ('wsgi', 'asgi'):
+            if name not in commands:
+                print('sin %s: instala %s para medirlo' % (name, 'gunicorn' if name == 'wsgi' else 'uvicorn'))
+
+        print('%-10s %-11s %6s %10s %9s %9s %8s' % ('ruta', 'servidor', 'conc.', 'req/s', 'p50 ms', 'p99 ms',
+                                                    'errores'))
+        for server, command in commands.items():
+            process = subprocess.Popen(command, cwd=BASE_DIR, env=env)
+            try:
+                wait_for(port, process)
+                for route in args.routes.split(','):
+                    sync_path, async_path = ROUTES[route]
+                    variants = [('wsgi', sync_path)] if server == 'wsgi' else [
+                        ('asgi-sync', sync_path), ('asgi-async', async_path)]
+                    for label, template in variants:
+                        paths = route_paths(template, pks, users)
+                        # Calentamiento: conexiones, planes de serialización, pool de resaltado
+                        asyncio.run(load(port, paths, max(levels), 1))
+                        for concurrency in levels:
+                            timings, errors, elapsed = asyncio.run(load(port, paths, concurrency, args.duration))
+                            ordered = sorted(timings) or [0]
+                            print('%-10s %-11s %6d %10.1f %9.2f %9.2f %8d' % (
+                                route, label, concurrency, len(timings) / elapsed,
+                                statistics.median(ordered) * 1000,
+                                ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, len(errors)))
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Coste de la conexión a la base de datos por petición: sin conexiones
+persistentes (CONN_MAX_AGE = 0), persistentes por hilo (CONN_MAX_AGE = 60)
+y con el pool de snippets.db (CONN_MAX_AGE = 0 y POOL).
+
+Cada "petición" hace lo que Django alrededor de una vista: una consulta y
+close_if_unusable_or_obsolete() al terminar (señal request_finished). Con
+--threads varios hilos piden a la vez, como los de un worker con hilos; el
+pool limita las conexiones abiertas a su SIZE.
+
+Con SQLite (si no hay PostgreSQL) abrir una conexión es barato y la
+diferencia es pequeña; la que importa es la de PostgreSQL.
+
+Uso: python benchmarks/connections.py [--database auto] [--requests 500] [--threads 1,8] [--pool-size 4]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from utils import DATABASE_CHOICES, setup_django, summary
+
+
+def run(databases, alias, requests, threads):
+    from django.db.utils import ConnectionHandler
+
+    handler = ConnectionHandler(databases)
+    timings = []
+    lock = threading.Lock()
+
+    def worker():
+        # ConnectionHandler da un DatabaseWrapper por hilo, como en Django
+        connection = handler[alias]
+        local = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            connection.close_if_unusable_or_obsolete()
+            local.append(time.perf_counter() - start)
+        connection.close()
+        with lock:
+            timings.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return timings, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', choices=DATABASE_CHOICES, default='auto')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--threads', default='1,8')
+    parser.add_argument('--pool-size', type=int, default=4)
+    args = parser.parse_args()
+
+    setup_django(args.database)
+    from django.conf import settings
+    from snippets.db.pool import close_pools, get_pool
+
+    base = dict(settings.DATABASES['default'])
+    directory = None
+    if 'sqlite' in base['ENGINE']:
+        # Un fichero: con una base en memoria cada conexión sería una base distinta
+        directory = tempfile.mkdtemp()
+        base['NAME'] = os.path.join(directory, 'connections.sqlite3')
+    pooled_engine = 'snippets.db.sqlite3' if 'sqlite' in base['ENGINE'] else 'snippets.db.postgresql'
+    variants = (
+        ('sin persistencia', dict(base, CONN_MAX_AGE=0)),
+        ('persistente', dict(base, CONN_MAX_AGE=60)),
+        ('pool', dict(base, ENGINE=pooled_engine, CONN_MAX_AGE=0, POOL={'SIZE': args.pool_size})),
+    )
+
+    print('base de datos: %s' % base['ENGINE'])
+    print('%-18s %7s %9s %9s %10s %9s' % ('modo', 'hilos', 'p50 ms', 'p99 ms', 'req/s', 'conexiones'))
+    try:
+        for threads in [int(value) for value in args.threads.split(',')]:
+            for name, database in variants:
+                databases = {'default': database}
+                timings, elapsed = run(databases, 'default', args.requests, threads)
+                opened = get_pool('default', database['POOL']).stats()['created'] if 'POOL' in database else None
+                result = summary(timings)
+                print('%-18s %7d %9.3f %9.3f %10.1f %9s' % (
+                    name, threads, result['p50_ms'], result['p99_ms'], len(timings) / elapsed,
+                    opened if opened is not None else '-'))
+                close_pools()
+    finally:
+        if directory is not None:
+            for filename in os.listdir(directory):
+                os.remove(os.path.join(directory, filename))
+            os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
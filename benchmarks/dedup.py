@@ -0,0 +1,55 @@
+"""
+Snippets con el mismo código (snippets.renderings): espacio del HTML resaltado
+y latencia de creación según la proporción de duplicados.
+
+Para cada proporción se crean los snippets con save(), con la caché de
+resaltado vacía, repartiendo entre ellos un conjunto de códigos distintos
+tanto más pequeño cuanto más duplicados. Se compara el HTML que
+ocuparía una copia por snippet con el guardado en SnippetRendering, y los
+resaltados hechos (uno por SnippetRendering) con los snippets creados.
+
+Uso: python benchmarks/dedup.py [--snippets 500] [--code-lines 60] [--ratios 0,0.5,0.9,0.99]
+"""
+import argparse
+
+from utils import make_code, measure, setup_django, summary, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--snippets', type=int, default=500)
+    parser.add_argument('--code-lines', type=int, default=60)
+    parser.add_argument('--ratios', default='0,0.5,0.9,0.99')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from snippets.highlighting import highlight_cache
+    from snippets.models import Snippet, SnippetRendering
+
+    base = make_code(args.code_lines)
+    print('%-10s %9s %10s %12s %12s %9s %9s' % (
+        'duplicado', 'códigos', 'resaltados', 'copias KB', 'guardado KB', 'p50 ms', 'p99 ms'))
+    with test_database():
+        for ratio in [float(value) for value in args.ratios.split(',')]:
+            User.objects.all().delete()
+            SnippetRendering.objects.all().delete()
+            highlight_cache.clear()
+            user = User.objects.create(username='bench')
+            codes = [base + '# %d\n' % i for i in range(max(1, round(args.snippets * (1 - ratio))))]
+            timings = []
+            for i in range(args.snippets):
+                code = codes[i % len(codes)]
+                timings.extend(measure(lambda: Snippet.objects.create(owner=user, code=code), repeat=1, warmup=0))
+
+            renderings = SnippetRendering.objects.values_list('html', 'refcount')
+            copies = sum(len(html) * refcount for html, refcount in renderings)
+            stored = sum(len(html) for html, _ in renderings)
+            result = summary(timings)
+            print('%-10.2f %9d %10d %12.1f %12.1f %9.3f %9.3f' % (
+                ratio, len(codes), len(renderings), copies / 1024, stored / 1024,
+                result['p50_ms'], result['p99_ms']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+Latencia y rendimiento de cada ruta GET de snippets/urls.py (tutoriales 1 a 6,
+router incluido) y del router de quickstart, con datos sintéticos.
+
+Cada ruta se pide por el stack completo de Django (cliente de pruebas, con
+middlewares) como usuario anónimo. Las rutas con <pk> de snippet se miden con
+un snippet normal y con uno grande. Las rutas del router de quickstart que
+quedan tapadas por otra anterior con la misma URL (p.ej. /users/) se miden
+llamando a su vista directamente, y se marcan con "shadowed".
+
+El resultado se guarda en JSON (--output) junto con el commit y las
+versiones, para comparar entre commits con --compare resultado_anterior.json.
+
+Uso: python benchmarks/endpoints.py [--database auto] [--users 100] [--snippets 2000]
+                                    [--large-snippets 20] [--large-lines 2000]
+                                    [--repeat 50] [--routes t6] [--output endpoints.json]
+"""
+import argparse
+import datetime
+import json
+import logging
+import platform
+import re
+import subprocess
+import time
+
+from utils import BASE_DIR, DATABASE_CHOICES, make_code, measure, seed, setup_django, summary, test_database
+
+
+PARAMETERS = re.compile(r'<(?:\w+:)?(\w+)>|\(\?P<(\w+)>[^)]*\)')
+
+
+def route_patterns():
+    """
+    Rutas de snippets.urls y del router de quickstart: (origen, patrón, vista).
+    """
+    from django.urls import URLResolver
+    from snippets import urls as snippets_urls
+    from tutorial import urls as tutorial_urls
+
+    def walk(patterns, prefix=''):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns, prefix + str(pattern.pattern).lstrip('^'))
+            else:
+                yield prefix + str(pattern.pattern).lstrip('^').rstrip('$'), pattern
+
+    for source, patterns in (('snippets', snippets_urls.urlpatterns), ('quickstart', tutorial_urls.router.urls)):
+        for route, pattern in walk(patterns):
+            if '<format>' in route:
+                # Variantes con sufijo de formato (.json, .api) del router
+                continue
+            yield source, route, pattern
+
+
+def build_path(route, values):
+    """
+    URL concreta de `route` sustituyendo sus parámetros por `values`, o None.
+    """
+    missing = []
+
+    def replace(match):
+        name = match.group(1) or match.group(2)
+        if name not in values:
+            missing.append(name)
+            return ''
+        return str(values[name])
+
+    path = PARAMETERS.sub(replace, route).replace('\\', '')
+    return None if missing else '/' + path
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR,
+                                       stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed_data(args):
+    from django.contrib.auth.models import Group
+    from snippets.models import Snippet, UserProfile
+
+    owners = seed(users=args.users, snippets=args.snippets, code_lines=args.code_lines)
+    large_code = make_code(args.large_lines)
+    Snippet.objects.bulk_create([
+        Snippet(owner=owners[i % len(owners)], title='large %d' % i, code=large_code)
+        for i in range(args.large_snippets)
+    ])
+    Group.objects.bulk_create([Group(name='group %d' % i) for i in range(10)])
+    UserProfile.refresh([owner.pk for owner in owners])
+
+    # Los snippets de las rutas de detalle se guardan con save() para que tengan su resaltado
+    small = Snippet.objects.exclude(title__startswith='large').order_by('pk').first()
+    large = Snippet.objects.filter(title__startswith='large').order_by('pk').first()
+    targets = {'normal': small}
+    if large is not None:
+        targets['grande'] = large
+    for snippet in targets.values():
+        snippet.save()
+    return owners[0], Group.objects.order_by('pk').first(), targets
+
+
+def request_once(client, path, match):
+    """
+    Hace la petición y devuelve (estado, bytes). Las rutas tapadas (con
+    `match`, su ResolverMatch) llaman a la vista directamente.
+    """
+    if match is None:
+        response = client.get(path)
+    else:
+        from rest_framework.test import APIRequestFactory
+        request = APIRequestFactory().get(path)
+        request.resolver_match = match
+        response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+    return response.status_code, len(content)
+
+
+def compare(results, previous_path):
+    with open(previous_path) as previous_file:
+        previous = {key(item): item for item in json.load(previous_file)['routes']}
+    print()
+    print('comparado con %s' % previous_path)
+    print('%-52s %10s %10s %8s' % ('ruta', 'antes ms', 'ahora ms', 'cambio'))
+    for item in results:
+        before = previous.get(key(item))
+        if before is None or 'p50_ms' not in item or 'p50_ms' not in before:
+            continue
+        print('%-52s %10.2f %10.2f %+7.1f%%' % (
+            label(item), before['p50_ms'], item['p50_ms'], (item['p50_ms'] / before['p50_ms'] - 1) * 100))
+
+
+def key(item):
+    return item['source'], item['route'], item.get('variant')
+
+
+def label(item):
+    prefix = 'quickstart: ' if item['source'] == 'quickstart' else ''
+    return prefix + item['route'] + (' [%s]' % item['variant'] if item.get('variant') else '')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', choices=DATABASE_CHOICES, default='auto')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--snippets', type=int, default=2000)
+    parser.add_argument('--code-lines', type=int, default=5)
+    parser.add_argument('--large-snippets', type=int, default=20)
+    parser.add_argument('--large-lines', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--routes', help='expresión regular para filtrar las rutas')
+    parser.add_argument('--output', default='endpoints.json')
+    parser.add_argument('--compare', help='JSON de una ejecución anterior')
+    args = parser.parse_args()
+
+    setup_django(args.database)
+    # Los 404/405/500 de las rutas se anotan en el resultado; sin sus trazas en la salida
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    import django
+    import rest_framework
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import Resolver404, resolve
+
+    results = []
+    with test_database():
+        print('creando datos (%s)...' % connection.vendor)
+        user, group, snippets = seed_data(args)
+        client = Client()
+        seen = set()
+        print('%-52s %6s %9s %9s %9s %9s %8s' % ('ruta', 'estado', 'bytes', 'p50 ms', 'p99 ms', 'req/s', 'queries'))
+        for source, route, pattern in route_patterns():
+            if args.routes and not re.search(args.routes, route):
+                continue
+            kind = 'group' if route.startswith('groups') else 'user' if route.startswith('users') else 'snippet'
+            variants = snippets.items() if kind == 'snippet' and 'pk' in PARAMETERS.sub(
+                lambda match: match.group(1) or match.group(2), route) else [(None, None)]
+            for variant, snippet in variants:
+                pk = {'snippet': snippet, 'user': user, 'group': group}[kind]
+                path = build_path(route, {'pk': pk.pk if pk else '', 'style': 'friendly'})
+                if path is None or (source, path, variant) in seen:
+                    continue
+                seen.add((source, path, variant))
+                item = {'source': source, 'route': '/' + route, 'name': pattern.name, 'variant': variant,
+                        'path': path, 'view': pattern.callback.__name__}
+
+                # Rutas del router de quickstart tapadas por otra anterior con la misma URL
+                try:
+                    match = resolve(path)
+                except Resolver404:
+                    match = None
+                if match is not None and match.func is pattern.callback:
+                    match = None
+                else:
+                    match = pattern.resolve(path.lstrip('/'))
+                    item['shadowed'] = True
+
+                try:
+                    with CaptureQueriesContext(connection) as queries:
+                        status, size = request_once(client, path, match)
+                except Exception as exc:
+                    # El cliente de pruebas relanza las excepciones de la vista
+                    item.update(status=500, error='%s: %s' % (type(exc).__name__, exc))
+                    results.append(item)
+                    print('%-52s %6d %s' % (label(item), 500, item['error']))
+                    continue
+                item.update(status=status, bytes=size, queries=len(queries))
+                if status == 405:
+                    # Sin GET (p.ej. /snippets/bulk/)
+                    results.append(item)
+                    print('%-52s %6d' % (label(item), status))
+                    continue
+                start = time.perf_counter()
+                timings = measure(lambda: request_once(client, path, match), repeat=args.repeat)
+                elapsed = time.perf_counter() - start
+                item.update(summary(timings), requests_per_second=len(timings) / sum(timings),
+                            wall_seconds=elapsed)
+                results.append(item)
+                print('%-52s %6d %9d %9.2f %9.2f %9.1f %8d' % (
+                    label(item), status, size, item['p50_ms'], item['p99_ms'], item['requests_per_second'],
+                    item['queries']))
+        vendor = connection.vendor
+
+    output = {
+        'commit': git_commit(),
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'rest_framework': rest_framework.VERSION,
+        'database': vendor,
+        'parameters': {name: value for name, value in vars(args).items() if name not in ('output', 'compare')},
+        'routes': results,
+    }
+    with open(args.output, 'w') as output_file:
+        json.dump(output, output_file, indent=2)
+    print('resultados en %s' % args.output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Memoria máxima al volcar todos los snippets: listado del tutorial 1
+(JsonResponse con toda la tabla) frente a la exportación en streaming.
+
+Uso: python benchmarks/export.py [--rows 10000 50000 200000]
+"""
+import argparse
+import time
+import tracemalloc
+
+from utils import seed, setup_django, test_database
+
+
+def peak(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak_bytes / 2 ** 20, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000, 200000])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.test import RequestFactory
+    from rest_framework.test import force_authenticate
+    from snippets.views import SnippetExport, snippet_list_t1
+
+    factory = RequestFactory()
+    snippet_export = SnippetExport.as_view()
+
+    def list_t1():
+        snippet_list_t1(factory.get('/snippets/t1/list/'))
+
+    def export():
+        request = factory.get('/snippets/export/')
+        force_authenticate(request, User(username='staff', is_staff=True))
+        for _ in snippet_export(request).streaming_content:
+            pass
+
+    with test_database():
+        print('%-8s %-8s %10s %10s' % ('filas', 'vista', 'pico MB', 'segundos'))
+        for rows in args.rows:
+            User.objects.all().delete()
+            seed(users=10, snippets=rows, code_lines=5)
+            for name, func in (('t1', list_t1), ('export', export)):
+                memory, elapsed = peak(func)
+                print('%-8d %-8s %10.1f %10.2f' % (rows, name, memory, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Coste de MetricsMiddleware: las mismas peticiones por el stack completo de
+Django (cliente de pruebas) con y sin el middleware, y con Server-Timing.
+Como esa diferencia queda cerca del ruido, también se mide el middleware
+aislado, alrededor de una vista que devuelve una respuesta ya hecha.
+
+Uso: python benchmarks/metrics.py [--rows 1000] [--repeat 1000] [--rounds 10]
+"""
+import argparse
+
+from utils import measure, seed, setup_django, summary, test_database
+
+
+MIDDLEWARE = 'snippets.metrics.MetricsMiddleware'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.http import HttpResponse
+    from django.test import Client, RequestFactory
+    from django.urls import resolve
+    from snippets.metrics import MetricsMiddleware, registry
+    from snippets.models import Snippet
+
+    base = [name for name in settings.MIDDLEWARE if name != MIDDLEWARE]
+    variants = (
+        ('sin métricas', base, False),
+        ('métricas', [MIDDLEWARE] + base, False),
+        ('server-timing', [MIDDLEWARE] + base, True),
+    )
+
+    with test_database():
+        seed(snippets=args.rows, highlighted='<div></div>')
+        pk = Snippet.objects.order_by('pk').values_list('pk', flat=True).first()
+        paths = (
+            ('estilo (304)', '/snippets/styles/friendly.css', {'HTTP_IF_NONE_MATCH': '*'}),
+            ('detalle', '/snippets/%d/' % pk, {}),
+            ('listado 100', '/snippets/?page_size=100', {}),
+        )
+        print('%-14s %-14s %10s %10s %12s' % ('petición', 'variante', 'p50 ms', 'p99 ms', 'coste µs'))
+        for name, path, headers in paths:
+            # Las variantes se alternan por rondas para repartir el ruido de la máquina
+            timings = {variant: [] for variant, _, _ in variants}
+            for _ in range(args.rounds):
+                for variant, middleware, timing in variants:
+                    settings.MIDDLEWARE = middleware
+                    settings.SNIPPETS = dict(settings.SNIPPETS, METRICS_ENABLED=True, METRICS_SERVER_TIMING=timing)
+                    client = Client()
+                    timings[variant].extend(measure(lambda: client.get(path, **headers),
+                                                    repeat=args.repeat // args.rounds, warmup=10))
+            baseline = summary(timings[variants[0][0]])['p50_ms']
+            for variant, _, _ in variants:
+                result = summary(timings[variant])
+                print('%-14s %-14s %10.3f %10.3f %12.1f' % (
+                    name, variant, result['p50_ms'], result['p99_ms'], (result['p50_ms'] - baseline) * 1000))
+
+        request = RequestFactory().get('/snippets/%d/' % pk)
+        request.resolver_match = resolve(request.path)
+        response = HttpResponse(b'x' * 1000)
+        for timing in (False, True):
+            settings.SNIPPETS = dict(settings.SNIPPETS, METRICS_ENABLED=True, METRICS_SERVER_TIMING=timing)
+            middleware = MetricsMiddleware(lambda request: response)
+            result = summary(measure(lambda: middleware(request), repeat=args.repeat * 10, warmup=100))
+            print('%-14s %-14s %10.4f %10.4f' % ('aislado', 'server-timing' if timing else 'métricas',
+                                                  result['p50_ms'], result['p99_ms']))
+        registry.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Latencia de páginas profundas: PageNumberPagination (COUNT + OFFSET) frente a
+KeysetPagination por (created, id) en el listado de SnippetViewSetT6.
+
+Uso: python benchmarks/pagination.py [--rows 1000000] [--repeat 20]
+"""
+import argparse
+
+from utils import measure, seed, setup_django, summary, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--page-size', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.pagination import PageNumberPagination
+    from rest_framework.test import APIRequestFactory
+    from snippets.models import Snippet
+    from snippets.pagination import KeysetPagination
+    from snippets.views import SnippetViewSetT6
+
+    class PageNumber(PageNumberPagination):
+        page_size = args.page_size
+
+    factory = APIRequestFactory()
+    page_view = SnippetViewSetT6.as_view({'get': 'list'}, pagination_class=PageNumber)
+    keyset_view = SnippetViewSetT6.as_view({'get': 'list'}, pagination_class=KeysetPagination)
+
+    with test_database():
+        print('creando %d snippets...' % args.rows)
+        seed(users=100, snippets=args.rows, code_lines=2)
+
+        print('%-8s %-8s %10s %10s' % ('modo', 'posición', 'p50 ms', 'p99 ms'))
+        for depth in (0.0, 0.5, 0.99):
+            offset = int(args.rows * depth)
+            page = offset // args.page_size + 1
+            page_request = factory.get('/snippets/', {'page': page})
+
+            cursor = ''
+            if offset:
+                row = Snippet.objects.order_by('created', 'pk').values_list('created', 'pk')[offset - 1]
+                cursor = KeysetPagination().encode_cursor(list(row), False)
+            keyset_request = factory.get('/snippets/', {'cursor': cursor, 'page_size': args.page_size})
+
+            for name, view, request in (('page', page_view, page_request),
+                                        ('keyset', keyset_view, keyset_request)):
+                result = summary(measure(lambda: view(request).render(), repeat=args.repeat))
+                print('%-8s %-8s %10.2f %10.2f' % (name, '%d%%' % (depth * 100),
+                                                     result['p50_ms'], result['p99_ms']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Volver a resaltar todos los snippets: save() de uno en uno frente a
+`manage.py rehighlight` con distinto número de procesos.
+
+Se crean los snippets con códigos distintos y, antes de cada forma, se marcan
+como obsoletos (`highlight_key` vacío) y se vacía la caché de resaltado.
+
+Uso: python benchmarks/rehighlight.py [--snippets 1000] [--code-lines 60] [--workers 1,2,4] [--chunk-size 500]
+"""
+import argparse
+import time
+from io import StringIO
+
+from utils import seed, setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--snippets', type=int, default=1000)
+    parser.add_argument('--code-lines', type=int, default=60)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--chunk-size', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+    from snippets.highlighting import highlight_cache
+    from snippets.models import Snippet
+
+    settings.SNIPPETS = dict(settings.SNIPPETS, HIGHLIGHT_EXECUTOR='process', HIGHLIGHT_MODE='sync')
+
+    def save_each():
+        for snippet in Snippet.objects.all():
+            snippet.save()
+
+    forms = [('save()', save_each)]
+    for workers in [int(value) for value in args.workers.split(',')]:
+        forms.append(('rehighlight %d' % workers,
+                      lambda workers=workers: call_command('rehighlight', workers=workers,
+                                                           chunk_size=args.chunk_size, stdout=StringIO())))
+
+    print('%-16s %10s %12s' % ('forma', 'total s', 'snippets/s'))
+    with test_database():
+        seed(snippets=args.snippets, code_lines=args.code_lines, distinct=True)
+        for name, func in forms:
+            Snippet.objects.update(highlight_key='')
+            highlight_cache.clear()
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            assert not Snippet.objects.filter(highlight_key='').exists()
+            print('%-16s %10.2f %12.1f' % (name, elapsed, args.snippets / elapsed))
+
+
+if __name__ == '__main__':
+    main()
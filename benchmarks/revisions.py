@@ -0,0 +1,68 @@
+"""
+Historial de revisiones: espacio ocupado y latencia de reconstrucción en
+cadenas largas de ediciones, para varios REVISION_KEYFRAME_INTERVAL.
+
+Cada edición cambia unas pocas líneas del código (y a veces añade alguna),
+como un usuario que corrige un snippet. Se compara el tamaño de guardar el
+código completo en cada revisión con el de los deltas y keyframes, y se mide
+reconstruct() de revisiones al azar.
+
+Uso: python benchmarks/revisions.py [--edits 500] [--code-lines 200] [--intervals 1,10,20,50] [--reads 200]
+"""
+import argparse
+import random
+
+from utils import make_code, measure, setup_django, summary, test_database
+
+
+def edit(code, rng):
+    lines = code.splitlines(True)
+    for _ in range(rng.randint(1, 3)):
+        i = rng.randrange(len(lines))
+        lines[i] = '    value_%d = %d  # editado\n' % (i, rng.randint(0, 10 ** 6))
+    if rng.random() < 0.2:
+        lines.insert(rng.randrange(len(lines)), '    extra = %d\n' % rng.randint(0, 10 ** 6))
+    return ''.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--edits', type=int, default=500)
+    parser.add_argument('--code-lines', type=int, default=200)
+    parser.add_argument('--intervals', default='1,10,20,50')
+    parser.add_argument('--reads', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from snippets.models import Snippet, SnippetRevision
+    from snippets.revisions import reconstruct
+
+    print('%-10s %12s %12s %8s %9s %9s' % ('intervalo', 'completo KB', 'guardado KB', 'ratio', 'p50 ms', 'p99 ms'))
+    with test_database():
+        user = User.objects.create(username='bench')
+        for interval in [int(value) for value in args.intervals.split(',')]:
+            settings.SNIPPETS = dict(settings.SNIPPETS, REVISION_KEYFRAME_INTERVAL=interval)
+            # La misma cadena de ediciones para cada intervalo
+            rng = random.Random(0)
+            snippet = Snippet.objects.create(owner=user, code=make_code(args.code_lines))
+            for _ in range(args.edits):
+                snippet.code = edit(snippet.code, rng)
+                snippet.save()
+
+            revisions = SnippetRevision.objects.filter(snippet=snippet)
+            full = sum(revisions.values_list('size', flat=True))
+            stored = sum(len(data) for data in revisions.values_list('data', flat=True))
+            numbers = [rng.randint(1, args.edits + 1) for _ in range(args.reads)]
+            timings = []
+            for number in numbers:
+                timings.extend(measure(lambda: reconstruct(snippet.pk, number), repeat=1, warmup=0))
+            result = summary(timings)
+            print('%-10d %12.1f %12.1f %8.2f %9.3f %9.3f' % (
+                interval, full / 1024, stored / 1024, stored / full, result['p50_ms'], result['p99_ms']))
+            snippet.delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Búsqueda de snippets (`?search=`) con el índice de snippets.search frente a
+un LIKE sobre título y código, en un corpus sintético.
+
+Uso: python benchmarks/search.py [--rows 1000000] [--repeat 20]
+"""
+import argparse
+import random
+
+from utils import measure, seed, setup_django, summary, test_database
+
+
+def words(count):
+    return ['w%05d' % i for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--vocabulary', type=int, default=50000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Q
+    from rest_framework.test import APIRequestFactory
+    from snippets.models import Snippet
+    from snippets.search import index_snippets, search
+    from snippets.views import SnippetViewSetT6
+
+    vocabulary = words(args.vocabulary)
+    rng = random.Random(0)
+    # Distribución de Zipf aproximada: unas pocas palabras muy frecuentes y muchas raras
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+
+    factory = APIRequestFactory()
+    view = SnippetViewSetT6.as_view({'get': 'list'})
+
+    with test_database():
+        owners = seed(users=100, snippets=0)
+        print('creando %d snippets...' % args.rows)
+        for offset in range(0, args.rows, args.batch_size):
+            batch = Snippet.objects.bulk_create([
+                Snippet(owner=owners[i % len(owners)], title=' '.join(rng.choices(vocabulary, weights, k=3)),
+                        code=' '.join(rng.choices(vocabulary, weights, k=40)),
+                        language=rng.choice(['python', 'python3', 'js', 'c']))
+                for i in range(offset, min(offset + args.batch_size, args.rows))
+            ])
+            if batch[0].pk is None:
+                # Sin RETURNING (SQLite) los pk se leen de vuelta para indexar
+                batch = Snippet.objects.order_by('-pk')[:len(batch)]
+            index_snippets(batch, created=True)
+
+        queries = (
+            ('frecuente', vocabulary[0]),
+            ('media', vocabulary[100]),
+            ('rara', vocabulary[-1]),
+            ('dos palabras', '%s %s' % (vocabulary[1], vocabulary[50])),
+        )
+        print('%-14s %-9s %10s %10s' % ('búsqueda', 'modo', 'p50 ms', 'p99 ms'))
+        for name, text in queries:
+            page = Snippet.objects.filter(language='python').order_by('created', 'pk')
+
+            def indexed():
+                list(search(page, text).values_list('pk', flat=True)[:20])
+
+            def like():
+                condition = Q()
+                for word in text.split():
+                    condition &= Q(title__icontains=word) | Q(code__icontains=word)
+                list(page.filter(condition).values_list('pk', flat=True)[:20])
+
+            request = factory.get('/snippets/', {'search': text, 'language': 'python'})
+            for mode, func in (('índice', indexed), ('like', like),
+                               ('endpoint', lambda: view(request).render())):
+                result = summary(measure(func, repeat=args.repeat))
+                print('%-14s %-9s %10.2f %10.2f' % (name, mode, result['p50_ms'], result['p99_ms']))
+
+
+if __name__ == '__main__':
+    main()
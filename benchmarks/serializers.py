@@ -0,0 +1,57 @@
+"""
+Listados por el serializer de DRF frente al camino rápido de snippets.fastpath
+(.values() + accesos precompilados + FastJSONRenderer) según el tamaño de página.
+
+Uso: python benchmarks/serializers.py [--page-sizes 10 100 1000] [--repeat 20]
+"""
+import argparse
+from unittest import mock
+
+from utils import measure, seed, setup_django, summary, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--page-sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test.utils import override_settings
+    from rest_framework.test import APIRequestFactory
+    from snippets.views import SnippetViewSetT6, UserViewSetT6
+
+    factory = APIRequestFactory()
+    views = (
+        ('snippets', SnippetViewSetT6.as_view({'get': 'list'})),
+        ('users', UserViewSetT6.as_view({'get': 'list'})),
+    )
+    max_page_size = max(args.page_sizes)
+
+    with test_database(), override_settings(SNIPPETS={'PAGINATION_MAX_PAGE_SIZE': max_page_size}):
+        seed(users=max_page_size, snippets=max_page_size * 5, code_lines=5)
+
+        print('%-9s %6s %-6s %10s %10s %12s' % ('listado', 'filas', 'modo', 'p50 ms', 'p99 ms', 'filas/s'))
+        for name, view in views:
+            for page_size in args.page_sizes:
+                request = factory.get('/', {'page_size': page_size})
+                for mode in ('drf', 'rápido'):
+                    if mode == 'drf':
+                        patches = (mock.patch('snippets.fastpath.values_plan', return_value=None),
+                                   mock.patch('snippets.fastpath.orjson', None))
+                    else:
+                        patches = ()
+                    for patch in patches:
+                        patch.start()
+                    try:
+                        result = summary(measure(lambda: view(request).render(), repeat=args.repeat))
+                    finally:
+                        for patch in patches:
+                            patch.stop()
+                    print('%-9s %6d %-6s %10.2f %10.2f %12.0f' % (
+                        name, page_size, mode, result['p50_ms'], result['p99_ms'],
+                        page_size / result['p50_ms'] * 1000))
+
+
+if __name__ == '__main__':
+    main()
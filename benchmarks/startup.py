@@ -0,0 +1,79 @@
+"""
+Benchmark de arranque en frío de un worker (gunicorn tutorial.wsgi).
+
+Lanza N procesos nuevos que cargan la aplicación WSGI y el URLconf, como hace
+un worker antes de su primera petición, y compara el catálogo precalculado
+(snippets/catalog.json) con construirlo desde los registros de pygments.
+Además del tiempo total se mide, con `-X importtime`, lo que tarda en
+importarse snippets.catalog, que es la parte que cambia entre los dos modos
+(la búsqueda de plugins crece con el número de paquetes instalados).
+
+Uso: python benchmarks/startup.py [--runs 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = '''
+import os, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutorial.settings')
+from django.conf import settings
+if {live!r}:
+    settings.SNIPPETS = dict(settings.SNIPPETS, CATALOG_PATH=None)
+from tutorial.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - start)
+'''
+
+
+def catalog_import_time(stderr):
+    # Formato de -X importtime: "import time: self [us] | cumulative | módulo"
+    for line in stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == 'snippets.catalog':
+            return int(parts[1]) / 1e6
+    return 0.0
+
+
+def measure(live, runs):
+    totals, catalog = [], []
+    for _ in range(runs):
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', WORKER.format(live=live)],
+                                 cwd=BASE_DIR, env=os.environ.copy(), check=True,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 universal_newlines=True)
+        totals.append(float(process.stdout.strip().splitlines()[-1]))
+        catalog.append(catalog_import_time(process.stderr))
+    return totals, catalog
+
+
+def report(name, timings):
+    print('%-24s mediana %7.1f ms  min %7.1f ms  max %7.1f ms' % (
+        name, statistics.median(timings) * 1000, min(timings) * 1000, max(timings) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    results = {
+        'catalog.json': measure(False, args.runs),
+        'pygments': measure(True, args.runs),
+    }
+    for name, (totals, catalog) in results.items():
+        report('%s (worker)' % name, totals)
+        report('%s (catálogo)' % name, catalog)
+    gain = statistics.median(results['pygments'][1]) - statistics.median(results['catalog.json'][1])
+    print('mejora en el arranque: %.1f ms por worker' % (gain * 1000))
+
+
+if __name__ == '__main__':
+    main()
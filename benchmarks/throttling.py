@@ -0,0 +1,77 @@
+"""
+Coste de cada decisión del límite de peticiones: los token buckets de
+snippets.throttling ('local' y 'sqlite') frente a ScopedRateThrottle de DRF,
+que guarda en la caché la lista de instantes de cada cliente y la recorre.
+
+Para cada tasa (peticiones permitidas por minuto) se hacen las decisiones
+repartidas entre `--clients` clientes y se mide el p50 y p99 de cada una.
+
+Uso: python benchmarks/throttling.py [--decisions 20000] [--clients 100] [--rates 60,1000,10000]
+"""
+import argparse
+import os
+import tempfile
+
+from utils import measure, setup_django, summary
+
+
+class View:
+    throttle_scope = 'bench'
+    action = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--decisions', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--rates', default='60,1000,10000')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import AnonymousUser
+    from django.core.cache import cache
+    from rest_framework.request import Request
+    from rest_framework.settings import api_settings
+    from rest_framework.test import APIRequestFactory
+    from rest_framework.throttling import ScopedRateThrottle
+    from snippets.throttling import TokenBucketThrottle, get_store
+
+    path = os.path.join(tempfile.mkdtemp(), 'throttle.sqlite3')
+    requests = []
+    for i in range(args.clients):
+        request = Request(APIRequestFactory().get('/snippets/', REMOTE_ADDR='10.0.%d.%d' % (i // 256, i % 256)))
+        request.user = AnonymousUser()
+        requests.append(request)
+
+    forms = [('local', TokenBucketThrottle, {'THROTTLE_STORE': 'local'}),
+             ('sqlite', TokenBucketThrottle, {'THROTTLE_STORE': 'sqlite', 'THROTTLE_SQLITE_PATH': path}),
+             ('DRF scoped', ScopedRateThrottle, {})]
+    print('%-12s %8s %9s %9s %10s' % ('almacén', 'tasa/min', 'p50 us', 'p99 us', 'denegadas'))
+    base = dict(settings.SNIPPETS)
+    for rate in [int(value) for value in args.rates.split(',')]:
+        settings.REST_FRAMEWORK = dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'bench': '%d/min' % rate})
+        api_settings.reload()
+        # SimpleRateThrottle copia las tasas al importarse
+        ScopedRateThrottle.THROTTLE_RATES = api_settings.DEFAULT_THROTTLE_RATES
+        for name, throttle_class, options in forms:
+            settings.SNIPPETS = dict(base, **options)
+            cache.clear()
+            if throttle_class is TokenBucketThrottle:
+                get_store().clear()
+            denied = 0
+            timings = []
+            for i in range(args.decisions):
+                request = requests[i % len(requests)]
+                throttle = throttle_class()
+                result = []
+                timings.extend(measure(lambda: result.append(throttle.allow_request(request, View())),
+                                       repeat=1, warmup=0))
+                denied += not result[0]
+            result = summary(timings)
+            print('%-12s %8d %9.1f %9.1f %10d' % (
+                name, rate, result['p50_ms'] * 1000, result['p99_ms'] * 1000, denied))
+
+
+if __name__ == '__main__':
+    main()
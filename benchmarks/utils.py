@@ -0,0 +1,144 @@
+"""
+Utilidades comunes de los benchmarks: arranque de Django, base de datos
+de prueba desechable y datos sintéticos.
+
+Se usa la configuración de DJANGO_SETTINGS_MODULE (tutorial.settings por
+defecto); la base de datos de prueba se crea y se destruye en cada ejecución.
+"""
+import datetime
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+DATABASE_CHOICES = ('settings', 'auto', 'sqlite', 'postgres')
+
+
+def postgres_available(database):
+    try:
+        import psycopg2
+    except ImportError:
+        return False
+    try:
+        psycopg2.connect(dbname=database.get('NAME') or 'postgres', user=database.get('USER') or None,
+                         password=database.get('PASSWORD') or None, host=database.get('HOST') or None,
+                         port=database.get('PORT') or None, connect_timeout=2).close()
+    except psycopg2.Error:
+        return False
+    return True
+
+
+def configure_database(settings, database):
+    """
+    `database`: 'settings' usa DATABASES tal cual; 'sqlite' una base SQLite
+    en memoria; 'postgres' el PostgreSQL de settings o de las variables PG*;
+    'auto' PostgreSQL si responde y si no SQLite.
+    """
+    default = settings.DATABASES['default']
+    if database in ('postgres', 'auto'):
+        if 'postgresql' not in default['ENGINE']:
+            default = {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'tutorial'}
+        default = dict(default, **{key: os.environ[env] for key, env in (
+            ('NAME', 'PGDATABASE'), ('USER', 'PGUSER'), ('PASSWORD', 'PGPASSWORD'),
+            ('HOST', 'PGHOST'), ('PORT', 'PGPORT')) if env in os.environ})
+        if database == 'auto' and not postgres_available(default):
+            database = 'sqlite'
+    if database == 'sqlite':
+        default = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+    if database != 'settings':
+        settings.DATABASES = dict(settings.DATABASES, default=default)
+
+
+def setup_django(database='settings'):
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutorial.settings')
+    from django.conf import settings
+    configure_database(settings, database)
+    import django
+    django.setup()
+
+    # Se miden las vistas, no la caché de respuestas de los listados ni el límite de peticiones
+    settings.SNIPPETS = dict(getattr(settings, 'SNIPPETS', {}), RESPONSE_CACHE_ALIAS=None)
+    from rest_framework.settings import api_settings
+    settings.REST_FRAMEWORK = dict(getattr(settings, 'REST_FRAMEWORK', {}), DEFAULT_THROTTLE_RATES={})
+    api_settings.reload()
+
+
+@contextmanager
+def test_database():
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+CODE_LINE = 'def function_%d(value):\n    return [item * 2 for item in range(value)]  # comentario\n'
+
+
+def make_code(lines):
+    return ''.join(CODE_LINE % i for i in range(lines))
+
+
+def seed(users=10, snippets=1000, code_lines=5, batch_size=5000, highlighted='', distinct=False):
+    """
+    Crea usuarios y snippets con bulk_create (sin pasar por Snippet.save(),
+    así que no se resaltan) con `created` creciente y distinto por fila.
+    Todos tienen el mismo código, salvo con `distinct`.
+    """
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+    from snippets.renderings import attach_renderings
+    from snippets.models import Snippet
+
+    User.objects.bulk_create(
+        [User(username='bench%d' % i) for i in range(users)])
+    owners = list(User.objects.filter(username__startswith='bench').order_by('pk'))
+    code = make_code(code_lines)
+    start = timezone.now() - datetime.timedelta(seconds=snippets)
+    created = Snippet._meta.get_field('created')
+    created.auto_now_add = False
+    try:
+        for offset in range(0, snippets, batch_size):
+            batch = [
+                Snippet(owner=owners[i % len(owners)], title='snippet %d' % i,
+                        code=code + ('# %d\n' % i if distinct else ''),
+                        highlighted=highlighted, created=start + datetime.timedelta(seconds=i))
+                for i in range(offset, min(offset + batch_size, snippets))
+            ]
+            attach_renderings(batch)
+            Snippet.objects.bulk_create(batch)
+    finally:
+        created.auto_now_add = True
+    return owners
+
+
+def measure(func, repeat=20, warmup=2):
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summary(timings):
+    ordered = sorted(timings)
+    return {
+        'p50_ms': statistics.median(ordered) * 1000,
+        'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+        'mean_ms': statistics.mean(ordered) * 1000,
+    }
@@ -0,0 +1,66 @@
+"""
+Cambiar de tema un highlight: PATCH del snippet (escribe la fila y vuelve a
+resaltar) frente a ?style=&linenos= (variante en `variant_cache`).
+
+Para cada forma se mide la primera petición de cada snippet (fría) y las
+siguientes (caliente), con HIGHLIGHT_STORAGE 'fragment' y 'full'.
+
+Uso: python benchmarks/variants.py [--snippets 50] [--code-lines 200]
+"""
+import argparse
+import json
+
+from utils import make_code, measure, setup_django, summary, test_database
+
+
+STYLE = 'monokai'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--snippets', type=int, default=50)
+    parser.add_argument('--code-lines', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+    from snippets.highlighting import highlight_cache, variant_cache
+    from snippets.models import Snippet
+
+    code = make_code(args.code_lines)
+    with test_database():
+        user = User.objects.create(username='bench')
+        client = APIClient()
+        client.force_authenticate(user)
+        print('%-10s %-24s %10s %10s' % ('storage', 'forma', 'fría ms', 'caliente ms'))
+        for storage in ('fragment', 'full'):
+            settings.SNIPPETS = dict(settings.SNIPPETS, HIGHLIGHT_STORAGE=storage)
+
+            def patch(pk, style, linenos):
+                client.patch('/snippets/%d/' % pk, json.dumps({'style': style, 'linenos': linenos}),
+                             content_type='application/json')
+                return client.get('/snippets/%d/highlight/' % pk)
+
+            def variant(pk, style, linenos):
+                return client.get('/snippets/%d/highlight/?style=%s&linenos=%s' % (pk, style, linenos))
+
+            for name, request in (('PATCH', patch), ('?style=', variant)):
+                for linenos in ('false', 'true'):
+                    # Snippets nuevos (friendly, sin números de línea) para cada medida
+                    Snippet.objects.all().delete()
+                    pks = [Snippet.objects.create(owner=user, title='s%d' % i, code=code).pk
+                           for i in range(args.snippets)]
+                    highlight_cache.clear()
+                    variant_cache.clear()
+                    cold = [measure(lambda: request(pk, STYLE, linenos), repeat=1, warmup=0)[0] for pk in pks]
+                    # Caliente: el mismo tema otra vez
+                    warm = [t for pk in pks
+                            for t in measure(lambda: request(pk, STYLE, linenos), repeat=3, warmup=0)]
+                    print('%-10s %-24s %10.2f %10.2f' % (storage, '%s linenos=%s' % (name, linenos),
+                                                         summary(cold)['p50_ms'], summary(warm)['p50_ms']))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,15 +3,16 @@ Los Serializers se usan para nuestras representaciones de datos.
 """
 from django.contrib.auth.models import User, Group
 from rest_framework import serializers
+from snippets.metrics import TimedSerializerMixin
 
 
-class UserSerializer(serializers.HyperlinkedModelSerializer):  #Utilizando relaciones con hipervínculos en este caso
+class UserSerializer(TimedSerializerMixin, serializers.HyperlinkedModelSerializer):  #Utilizando relaciones con hipervínculos en este caso
     class Meta:
         model = User
         fields = ('url', 'username', 'email', 'groups')
 
 
-class GroupSerializer(serializers.HyperlinkedModelSerializer):
+class GroupSerializer(TimedSerializerMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Group
         fields = ('url', 'name')
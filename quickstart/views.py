@@ -1,19 +1,26 @@
 from django.contrib.auth.models import User, Group
 from rest_framework import viewsets
 from quickstart.serializers import UserSerializer, GroupSerializer
+from snippets.profiles import CompactUserMixin
+from snippets.querysets import EagerLoadingMixin
+from snippets.response_cache import ResponseCacheMixin
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ResponseCacheMixin, CompactUserMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     """
     #Punto final de API que permite a los usuarios ver o editar.
+    #Con ?compact=1 devuelve el resumen de sus snippets.
     """
     queryset = User.objects.all().order_by('-date_joined')
     serializer_class = UserSerializer
+    # 'snippet' por la representación compacta
+    cache_dependencies = ('user', 'group', 'snippet')
 
 
-class GroupViewSet(viewsets.ModelViewSet):
+class GroupViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
     """
     #Punto final de API que permite ver o editar grupos.
     """
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
+    cache_dependencies = ('group',)
@@ -3,3 +3,24 @@ from django.apps import AppConfig
 
 class SnippetsConfig(AppConfig):
     name = 'snippets'
+
+    def ready(self):
+        from django.contrib.auth.models import Group, User
+        from django.db.models.signals import m2m_changed, post_delete, post_save
+        from snippets.renderings import snippet_deleted as release_snippet_renderings
+        from snippets.models import Snippet
+        from snippets.profiles import snippet_deleted, user_saved
+        from snippets.response_cache import invalidate_m2m, invalidate_model
+
+        # Invalidación de la caché de respuestas de los listados
+        for model in (Snippet, User, Group):
+            post_save.connect(invalidate_model, sender=model, dispatch_uid='response-cache-save')
+            post_delete.connect(invalidate_model, sender=model, dispatch_uid='response-cache-delete')
+        m2m_changed.connect(invalidate_m2m, sender=User.groups.through, dispatch_uid='response-cache-groups')
+
+        # Contadores de UserProfile
+        post_save.connect(user_saved, sender=User, dispatch_uid='snippet-profile-user')
+        post_delete.connect(snippet_deleted, sender=Snippet, dispatch_uid='snippet-profile-delete')
+
+        # Referencias a SnippetRendering
+        post_delete.connect(release_snippet_renderings, sender=Snippet, dispatch_uid='snippet-renderings-delete')
@@ -0,0 +1,259 @@
+"""
+Vistas asíncronas de solo lectura para el despliegue ASGI (tutorial/asgi.py),
+bajo `/async/`: listado y detalle de snippets, highlight, y listado y detalle
+de usuarios.
+
+Devuelven lo mismo que las vistas del router (SnippetViewSetT6 y
+UserViewSetT6 con el renderer JSON y SNIPPETS['PAGINATION_CLASS'] =
+KeysetPagination): el camino rápido de snippets.fastpath, la paginación por
+clave (siempre, sea cual sea PAGINATION_CLASS), el ETag de snippets.conditional y
+el límite de peticiones de DEFAULT_THROTTLE_CLASSES. Las filas se leen
+con el ORM asíncrono (Django 4.1+; antes, con sync_to_async) y el resaltado
+de pygments con los métodos de Snippet en el hilo de sync_to_async, fuera
+del bucle de eventos.
+
+Requieren Django 3.1 o posterior; snippets/urls.py solo las registra entonces.
+"""
+from functools import wraps
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db.models.query import QuerySet
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.exceptions import NotFound, Throttled
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from snippets.conditional import ConditionalGetMixin, _etag, highlight_etag
+from snippets.conf import snippets_setting
+from snippets.db.routers import read_from_replica
+from snippets.fastpath import FastJSONRenderer, values_plan
+from snippets.highlighting import full_document, is_full_document, variant_options, variant_stats
+from snippets.metrics import timed
+from snippets.models import HIGHLIGHT_FAILED_DETAIL, Snippet
+from snippets.pagination import KeysetPagination, approximate_count
+from snippets.querysets import EagerLoadingMixin, _serializer_plans
+from snippets.response_cache import version_cache, versions
+from snippets.serializers import SnippetModelSerializer, UserSerializerNotOwner
+
+
+JSON_CONTENT_TYPE = 'application/json'
+HIGHLIGHT_COLUMNS = ('pk', 'updated', 'highlight_key', 'highlight_status', 'style', 'linenos')
+
+
+def require_safe(view):
+    # El de django.views.decorators.http no admite vistas asíncronas hasta Django 5.0.
+    # Como son de solo lectura, leen de las réplicas (snippets.db.routers).
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        with read_from_replica():
+            return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def throttle(scope='default', cost=None):
+    """
+    Los DEFAULT_THROTTLE_CLASSES de DRF, como en APIView.check_throttles(),
+    con el ámbito y el coste (THROTTLE_COSTS) de la vista síncrona equivalente.
+    """
+    view = SimpleNamespace(throttle_scope=scope, throttle_cost=cost, action=None)
+
+    def throttled(request):
+        # En un hilo: request.user puede leer la sesión de la base de datos
+        waits = [throttle.wait() for throttle in (cls() for cls in api_settings.DEFAULT_THROTTLE_CLASSES)
+                 if not throttle.allow_request(request, view)]
+        if waits:
+            return Throttled(max((wait for wait in waits if wait is not None), default=None))
+        return None
+
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            exc = await sync_to_async(throttled)(request)
+            if exc is not None:
+                response = json_response({'detail': exc.detail}, status=exc.status_code)
+                if exc.wait is not None:
+                    response['Retry-After'] = '%d' % exc.wait
+                return response
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def fetch(queryset):
+    if hasattr(QuerySet, '__aiter__'):
+        return [row async for row in queryset]
+    return await sync_to_async(list)(queryset)
+
+
+async def fetch_one(queryset):
+    rows = await fetch(queryset[:1])
+    return rows[0] if rows else None
+
+
+async def related_pks(plan, rows):
+    related = {}
+    for name, queryset in plan.related_queries(rows):
+        related[name] = plan.group_related(await fetch(queryset) if queryset is not None else ())
+    return related
+
+
+async def serialize(plan, rows):
+    related = await related_pks(plan, rows) if plan.many else {}
+    with timed('serializer'):
+        return plan.serialize(rows, related)
+
+
+def plan_for(request, serializer_class, model):
+    # ?fields= como EagerLoadingMixin.get_sparse_fields()
+    param = request.GET.get(EagerLoadingMixin.sparse_fields_param)
+    fields = param and {name.strip() for name in param.split(',')} & set(_serializer_plans(serializer_class, model))
+    return values_plan(serializer_class, model, fields or None)
+
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type=JSON_CONTENT_TYPE)
+
+
+def not_modified(request, etag, last_modified=None):
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        response['ETag'] = etag
+    return response
+
+
+async def etag_versions():
+    return await sync_to_async(versions, thread_sensitive=False)(
+        version_cache(), ConditionalGetMixin.etag_dependencies)
+
+
+def detail_etag(request, row, dependencies):
+    # El mismo que ConditionalGetMixin con el renderer JSON
+    return _etag(row['pk'], row['updated'].isoformat(), 'json', request.GET.urlencode(), *dependencies)
+
+
+def page_etag(request, count, rows, dependencies):
+    # El mismo que ConditionalGetMixin.list() con el renderer JSON
+    return _etag(count, *['%s@%s' % (row['pk'], row['updated'].isoformat()) for row in rows] + [
+        'json', request.GET.urlencode()] + dependencies)
+
+
+async def list_response(request, serializer_class, queryset, conditional=False):
+    plan = plan_for(request, serializer_class, queryset.model)
+    extra_columns = ('updated',) if conditional else ()
+    paginator = KeysetPagination()
+    try:
+        page_queryset = paginator.page_queryset(plan.values_queryset(queryset, extra_columns), Request(request))
+    except NotFound as exc:
+        return json_response({'detail': exc.detail}, status=exc.status_code)
+    if paginator.count_query_param in request.GET:
+        paginator.count = await sync_to_async(approximate_count)(queryset)
+    rows = paginator.set_page(await fetch(page_queryset))
+    if conditional:
+        etag = page_etag(request, paginator.count, rows, await etag_versions())
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+    response = json_response(paginator.get_paginated_data(await serialize(plan, rows)))
+    if conditional:
+        response['ETag'] = etag
+    return response
+
+
+async def detail_response(request, serializer_class, queryset, pk, conditional=False):
+    plan = plan_for(request, serializer_class, queryset.model)
+    extra_columns = ('updated',) if conditional else ()
+    row = await fetch_one(plan.values_queryset(queryset.filter(pk=pk), extra_columns))
+    if row is None:
+        raise Http404
+    if conditional:
+        etag = detail_etag(request, row, await etag_versions())
+        response = not_modified(request, etag, int(row['updated'].timestamp()))
+        if response is not None:
+            return response
+    data = (await serialize(plan, [row]))[0]
+    response = json_response(data)
+    if conditional:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(int(row['updated'].timestamp()))
+    return response
+
+
+@require_safe
+@throttle('snippets')
+async def snippet_list(request):
+    return await list_response(request, SnippetModelSerializer, Snippet.objects.all(), conditional=True)
+
+
+@require_safe
+@throttle('snippets')
+async def snippet_detail(request, pk):
+    return await detail_response(request, SnippetModelSerializer, Snippet.objects.all(), pk, conditional=True)
+
+
+@require_safe
+@throttle()
+async def user_list(request):
+    return await list_response(request, UserSerializerNotOwner, User.objects.all())
+
+
+@require_safe
+@throttle()
+async def user_detail(request, pk):
+    return await detail_response(request, UserSerializerNotOwner, User.objects.all(), pk)
+
+
+@require_safe
+@throttle('snippets', cost='highlight')
+async def snippet_highlight(request, pk):
+    try:
+        style, linenos = variant_options(request.GET)
+    except ValueError as exc:
+        return json_response({'detail': str(exc)}, status=400)
+    queryset = Snippet.objects.filter(pk=pk)
+    if 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META:
+        # 304 sin leer el código ni el HTML
+        values = await fetch_one(queryset.values(*HIGHLIGHT_COLUMNS))
+        if values is None:
+            raise Http404
+        etag = highlight_etag(values, style, linenos)
+        if etag is not None:
+            response = not_modified(request, etag, int(values['updated'].timestamp()))
+            if response is not None:
+                return response
+
+    # El código solo hace falta si hay que resaltar: se lee entonces (render_variant/render_highlighted)
+    snippet = await fetch_one(queryset.select_related('rendering').defer('code'))
+    if snippet is None:
+        raise Http404
+    # Como views.highlight_response(); pygments va en el hilo de sync_to_async, fuera del bucle
+    if snippet.highlight_status == Snippet.HIGHLIGHT_FAILED:
+        return json_response({'detail': HIGHLIGHT_FAILED_DETAIL}, status=422)
+    if snippet.is_variant(style, linenos):
+        css_style = style or snippet.style
+        variant_stats.record(css_style, snippet.linenos if linenos is None else linenos)
+        html = await sync_to_async(snippet.render_variant)(style, linenos)
+    elif snippet.highlight_status == Snippet.HIGHLIGHT_PENDING and \
+            snippets_setting('HIGHLIGHT_PENDING_RESPONSE') == 'accepted':
+        response = HttpResponse('', status=202)
+        response['Retry-After'] = '1'
+        return response
+    else:
+        css_style = snippet.style
+        html = await sync_to_async(snippet.render_highlighted)()
+    if not is_full_document(html):
+        css_url = reverse('snippet-style-css', kwargs={'style': css_style})
+        html = full_document(html, snippet.title, css_url)
+
+    response = HttpResponse(html, content_type='text/html; charset=utf-8')
+    etag = highlight_etag({name: getattr(snippet, name) for name in HIGHLIGHT_COLUMNS}, style, linenos)
+    if etag is not None:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(int(snippet.updated.timestamp()))
+    return response
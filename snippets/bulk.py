@@ -0,0 +1,183 @@
+"""
+Alta, modificación y borrado de snippets por lotes (`/snippets/bulk/`).
+
+El cuerpo es una lista JSON o NDJSON. POST crea, PUT/PATCH modifican (cada
+elemento con su `id`) y DELETE borra (lista de ids u objetos con `id`). Cada
+elemento se valida y se comprueban los permisos de objeto por separado; el
+resaltado de todo el lote se hace de una vez (`Snippet.prepare_highlights`)
+y se escribe con bulk_create/bulk_update en una sola transacción.
+
+La respuesta tiene un resultado por elemento, en el mismo orden:
+{"status": 201, "data": {...}} o {"status": 400, "errors": {...}}.
+"""
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+
+from snippets.conf import snippets_setting
+from snippets.models import UserProfile
+from snippets.parsers import NDJSONParser
+from snippets.renderings import attach_renderings, release_renderings
+from snippets.response_cache import invalidate
+from snippets.revisions import record_revisions
+from snippets.search import index_snippets
+
+
+def _item_id(item):
+    value = item.get('id') if isinstance(item, dict) else item
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+class BulkMixin:
+    """
+    Para SnippetViewSetT6: acción `bulk` con las escrituras por lotes.
+    """
+    # Campos que se escriben en bulk_update
+    bulk_update_fields = ('title', 'code', 'linenos', 'language', 'style',
+                          'rendering', 'highlight_status', 'highlight_key', 'updated')
+
+    @action(detail=False, methods=['post', 'put', 'patch', 'delete'],
+            parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list):
+            raise ParseError('Se esperaba una lista de snippets (JSON o NDJSON)')
+        max_items = snippets_setting('BULK_MAX_ITEMS')
+        if len(items) > max_items:
+            raise ParseError('Como máximo %d elementos por petición' % max_items)
+
+        if request.method == 'POST':
+            results = self.bulk_create(items)
+        elif request.method == 'DELETE':
+            results = self.bulk_destroy(items)
+        else:
+            results = self.bulk_update(items, partial=request.method == 'PATCH')
+        return Response({'results': results})
+
+    def has_bulk_permission(self, obj):
+        request = self.request
+        return all(permission.has_object_permission(request, self, obj)
+                   for permission in self.get_permissions())
+
+    def get_bulk_instances(self, items, results):
+        """
+        Carga los snippets a los que se refieren `items` con una consulta.
+        Devuelve {índice: instancia} y anota en `results` los que fallan.
+        """
+        ids = [_item_id(item) for item in items]
+        queryset = self.queryset.model._default_manager.select_related('owner')
+        found = queryset.in_bulk([pk for pk in ids if pk is not None])
+        instances, seen = {}, set()
+        for index, pk in enumerate(ids):
+            if pk is None:
+                results[index] = {'status': status.HTTP_400_BAD_REQUEST, 'errors': {'id': ['Falta el id']}}
+            elif pk in seen:
+                results[index] = {'status': status.HTTP_400_BAD_REQUEST, 'errors': {'id': ['id repetido']}}
+            elif pk not in found:
+                results[index] = {'status': status.HTTP_404_NOT_FOUND, 'errors': {'id': ['No existe']}}
+            elif not self.has_bulk_permission(found[pk]):
+                results[index] = {'status': status.HTTP_403_FORBIDDEN,
+                                  'errors': {'detail': 'No tiene permiso para modificar este snippet'}}
+            else:
+                instances[index] = found[pk]
+            seen.add(pk)
+        return instances
+
+    def validate_bulk(self, items, indexes, results, **kwargs):
+        """
+        Valida los `items` de `indexes` con el serializer (many=True). Devuelve
+        {índice: datos validados} de los válidos y anota en `results` los errores.
+        """
+        # Como perform_create: el dueño es siempre el usuario de la petición
+        owner = self.request.user.pk
+        data = [dict(items[index], owner=owner) if isinstance(items[index], dict) else items[index]
+                for index in indexes]
+        serializer = self.get_serializer(data=data, many=True, **kwargs)
+        serializer.is_valid(raise_exception=True)
+        valid = {}
+        for index, data, errors in zip(indexes, serializer.validated_data, serializer.item_errors):
+            if errors is None:
+                valid[index] = data
+            else:
+                results[index] = {'status': status.HTTP_400_BAD_REQUEST, 'errors': errors}
+        return valid
+
+    def bulk_results(self, results, saved, item_status):
+        data = self.get_serializer(list(saved.values()), many=True).data
+        for index, item in zip(saved, data):
+            results[index] = {'status': item_status, 'data': item}
+        return results
+
+    def bulk_create(self, items):
+        model = self.queryset.model
+        results = [None] * len(items)
+        valid = self.validate_bulk(items, range(len(items)), results)
+        objs = {index: model(**data) for index, data in valid.items()}
+        db = router.db_for_write(model)
+        pending = model.prepare_highlights(objs.values(), using=db)
+
+        with transaction.atomic(using=db):
+            attach_renderings(objs.values(), using=db)
+            features = connections[db].features
+            if features.can_return_rows_from_bulk_insert:
+                model._default_manager.bulk_create(objs.values())
+            else:
+                # Sin RETURNING, bulk_create no asigna los pk: un INSERT por fila
+                # (el resaltado ya está hecho, así que no pasa por Snippet.save)
+                for obj in objs.values():
+                    models.Model.save(obj, force_insert=True, using=db)
+            index_snippets(objs.values(), using=db, created=True)
+            record_revisions([(obj, None) for obj in objs.values()], using=db, created=True)
+            UserProfile.refresh({obj.owner_id for obj in objs.values()})
+            # bulk_create/bulk_update no envían post_save
+            invalidate('snippet')
+            for snippet, inputs in pending:
+                snippet.schedule_highlight(inputs)
+        for obj in objs.values():
+            obj._loaded_render_inputs = obj.render_inputs()
+        return self.bulk_results(results, objs, status.HTTP_201_CREATED)
+
+    def bulk_update(self, items, partial=False):
+        model = self.queryset.model
+        results = [None] * len(items)
+        instances = self.get_bulk_instances(items, results)
+        valid = self.validate_bulk(items, sorted(instances), results, partial=partial)
+        objs = {}
+        for index, data in valid.items():
+            obj = instances[index]
+            for attr, value in data.items():
+                setattr(obj, attr, value)
+            objs[index] = obj
+        db = router.db_for_write(model)
+        pending = model.prepare_highlights(objs.values(), using=db)
+
+        now = timezone.now()
+        for obj in objs.values():
+            obj.updated = now
+        with transaction.atomic(using=db):
+            released = attach_renderings(objs.values(), using=db)
+            model._default_manager.bulk_update(objs.values(), self.bulk_update_fields)
+            release_renderings(released, using=db)
+            index_snippets(objs.values(), using=db)
+            record_revisions([(obj, obj._loaded_value(obj._loaded_render_inputs, 'code'))
+                              for obj in objs.values()], using=db)
+            invalidate('snippet')
+            for snippet, inputs in pending:
+                snippet.schedule_highlight(inputs)
+        for obj in objs.values():
+            obj._loaded_render_inputs = obj.render_inputs()
+        return self.bulk_results(results, objs, status.HTTP_200_OK)
+
+    def bulk_destroy(self, items):
+        results = [None] * len(items)
+        instances = self.get_bulk_instances(items, results)
+        with transaction.atomic(using=router.db_for_write(self.queryset.model)):
+            self.queryset.model._default_manager.filter(
+                pk__in=[obj.pk for obj in instances.values()]).delete()
+        for index in instances:
+            results[index] = {'status': status.HTTP_204_NO_CONTENT}
+        return results
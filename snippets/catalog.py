@@ -0,0 +1,66 @@
+"""
+Catálogo de lenguajes y estilos de `pygments` para las choices de Snippet.
+
+Recorrer `get_all_lexers()` y `get_all_styles()` busca plugins en los entry
+points de todos los paquetes instalados, lo que hacía lento el arranque de
+cada worker y de cada `manage.py`. El catálogo se precalcula con
+`manage.py build_catalog` en catalog.json y solo se vuelve a construir desde
+`pygments` si el fichero falta o corresponde a otra versión de `pygments`
+(los plugins instalados después de generarlo no se detectan).
+"""
+import json
+import os
+
+import pygments
+from django.conf import settings
+
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.json')
+
+
+def catalog_path():
+    # SNIPPETS['CATALOG_PATH'] = None fuerza a construirlo desde pygments
+    return getattr(settings, 'SNIPPETS', {}).get('CATALOG_PATH', CATALOG_PATH)
+
+
+def build_catalog():
+    """
+    Construye el catálogo recorriendo los registros de `pygments`.
+    """
+    from pygments.lexers import get_all_lexers
+    from pygments.styles import get_all_styles
+
+    lexers = [item for item in get_all_lexers() if item[1]]
+    return {
+        'pygments': pygments.__version__,
+        'languages': sorted([item[1][0], item[0]] for item in lexers),
+        'styles': sorted(get_all_styles()),
+    }
+
+
+def write_catalog(path=CATALOG_PATH):
+    catalog = build_catalog()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(catalog, f, indent=1, sort_keys=True)
+        f.write('\n')
+    return catalog
+
+
+def load_catalog():
+    path = catalog_path()
+    if path:
+        try:
+            with open(path, encoding='utf-8') as f:
+                catalog = json.load(f)
+        except (OSError, ValueError):
+            catalog = None
+        if catalog and catalog.get('pygments') == pygments.__version__:
+            return catalog
+    return build_catalog()
+
+
+_catalog = load_catalog()
+
+LANGUAGE_CHOICES = [tuple(item) for item in _catalog['languages']]
+STYLE_CHOICES = [(item, item) for item in _catalog['styles']]
+STYLE_NAMES = frozenset(_catalog['styles'])
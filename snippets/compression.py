@@ -0,0 +1,126 @@
+"""
+Compresión de columnas de texto grandes (`Snippet.code` y `SnippetRendering.html`).
+
+`CompressedTextField` es un TextField: la columna sigue siendo de texto y los
+valores de menos de COMPRESSION_THRESHOLD caracteres se guardan tal cual. Los
+demás se guardan como PREFIX + códec + base64 de los datos comprimidos, solo
+si así ocupan menos. Se comprime con zstd si está instalado `zstandard` y si
+no con zlib (COMPRESSION_CODEC); el códec va en cada valor, así que cambiarlo
+no obliga a reescribir las filas.
+
+Al leer la columna (también con .values()/.values_list()) se descomprime; las
+vistas ya difieren (.only()/.defer()) las columnas que no usan, y esas no se
+leen ni se descomprimen hasta que se accede a ellas.
+
+Un texto que empiece por PREFIX se guarda siempre comprimido, para no
+confundirlo con un valor comprimido.
+"""
+import base64
+import zlib
+
+from django.db import models
+
+from snippets.conf import snippets_setting
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Carácter de control que no aparece al principio de un código normal (PostgreSQL no admite '\x00')
+PREFIX = '\x01'
+
+
+class ZlibCodec:
+    name = 'zlib'
+    tag = 'z'
+
+    def compress(self, data, level):
+        return zlib.compress(data, level if level is not None else 6)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class ZstdCodec:
+    name = 'zstd'
+    tag = 's'
+
+    def compress(self, data, level):
+        return zstandard.ZstdCompressor(level=level if level is not None else 3).compress(data)
+
+    def decompress(self, data):
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+CODECS = {codec.name: codec for codec in (ZlibCodec(), ZstdCodec())}
+_by_tag = {codec.tag: codec for codec in CODECS.values()}
+
+
+def get_codec(name=None):
+    name = name or snippets_setting('COMPRESSION_CODEC')
+    if name == 'auto':
+        name = 'zstd' if zstandard is not None else 'zlib'
+    if name == 'zstd' and zstandard is None:
+        raise ImportError("COMPRESSION_CODEC 'zstd' necesita el paquete zstandard")
+    return CODECS[name]
+
+
+def is_compressed(value):
+    return isinstance(value, str) and value[:1] == PREFIX
+
+
+def compress(text, threshold=None, codec=None, level=None):
+    """
+    Valor a guardar en la columna para `text`: el propio texto si es corto o
+    no se reduce, o el texto comprimido.
+    """
+    if not isinstance(text, str):
+        return text
+    threshold = snippets_setting('COMPRESSION_THRESHOLD') if threshold is None else threshold
+    forced = is_compressed(text)
+    if len(text) < threshold and not forced:
+        return text
+    codec = codec or get_codec()
+    level = snippets_setting('COMPRESSION_LEVEL') if level is None else level
+    data = codec.compress(text.encode('utf-8'), level)
+    value = PREFIX + codec.tag + base64.b64encode(data).decode('ascii')
+    return value if forced or len(value) < len(text) else text
+
+
+def decompress(value):
+    if not is_compressed(value):
+        return value
+    codec = _by_tag[value[1:2]]
+    if codec.name == 'zstd' and zstandard is None:
+        raise ImportError('Hay valores comprimidos con zstd: hace falta el paquete zstandard')
+    return codec.decompress(base64.b64decode(value[2:])).decode('utf-8')
+
+
+class CompressedTextField(models.TextField):
+    """
+    TextField que comprime los valores grandes (ver arriba). En las bases de
+    datos de `plain_vendors` se guarda sin comprimir.
+    """
+
+    def __init__(self, *args, plain_vendors=(), **kwargs):
+        self.plain_vendors = tuple(plain_vendors)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.plain_vendors:
+            kwargs['plain_vendors'] = self.plain_vendors
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if connection.vendor in self.plain_vendors:
+            return value
+        return decompress(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if connection.vendor in self.plain_vendors:
+            return value
+        return compress(value)
@@ -0,0 +1,165 @@
+"""
+GET condicional (ETag / Last-Modified) para los snippets.
+
+Las validaciones se calculan con valores baratos de la fila (`updated` y
+`highlight_key`, el hash de lo que determina el HTML) y la versión de los
+usuarios de snippets.response_cache, que cambia al renombrar el owner. Si el cliente manda
+If-None-Match o If-Modified-Since se comprueban con una consulta por pk antes
+de cargar el objeto, así que un 304 no lee `code` ni `highlighted`.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
+
+from snippets.highlighting import variant_options
+from snippets.response_cache import version_cache, versions
+
+
+def _etag(*parts):
+    return quote_etag(hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest())
+
+
+def highlight_etag(values, style=None, linenos=None):
+    """
+    ETag del highlight de una fila (o de su variante `style`/`linenos`); None si
+    aún no está resaltado.
+    """
+    if values['highlight_status'] != 'ready' or not values['highlight_key']:
+        return None
+    style = style or values['style']
+    linenos = values['linenos'] if linenos is None else linenos
+    if (style, linenos) == (values['style'], values['linenos']):
+        return _etag('highlight', values['highlight_key'])
+    return _etag('highlight', values['highlight_key'], style, linenos)
+
+
+class ConditionalGetMixin:
+    """
+    Para vistas de Snippet: `list` y `retrieve` con ETag, y `conditional()`
+    para respuestas propias como el highlight.
+    """
+    last_modified_field = 'updated'
+    # Columnas que EagerLoadingMixin añade al only() de los listados
+    extra_columns = ('updated',)
+
+    # Modelos de snippets.response_cache que también salen en el cuerpo (owner.username)
+    etag_dependencies = ('user',)
+
+    def representation_key(self):
+        # La misma fila da cuerpos distintos según el renderer y los parámetros (?fields=),
+        # y cambia sin tocar `updated` si se renombra el usuario
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        return (getattr(renderer, 'format', ''), self.request.GET.urlencode(),
+                *versions(version_cache(), self.etag_dependencies))
+
+    def highlight_variant(self):
+        """
+        (style, linenos) de ?style=&linenos= del highlight; None los que no vienen.
+        """
+        if not hasattr(self, '_highlight_variant'):
+            try:
+                self._highlight_variant = variant_options(self.request.query_params)
+            except ValueError as exc:
+                raise ParseError(str(exc))
+        return self._highlight_variant
+
+    def validators(self, values, kind):
+        """
+        Devuelve (etag, last_modified) de una fila; None si no se puede cachear.
+        """
+        updated = values[self.last_modified_field]
+        if kind == 'highlight':
+            etag = highlight_etag(values, *self.highlight_variant())
+            if etag is None:
+                return None
+        else:
+            etag = _etag(values['pk'], updated.isoformat(), *self.representation_key())
+        return etag, int(updated.timestamp())
+
+    def instance_values(self, instance, kind):
+        values = {'pk': instance.pk, self.last_modified_field: getattr(instance, self.last_modified_field)}
+        if kind == 'highlight':
+            for name in ('highlight_key', 'highlight_status', 'style', 'linenos'):
+                values[name] = getattr(instance, name)
+        return values
+
+    def row_version(self, row):
+        # Las filas son instancias o, por el camino rápido de los listados, dicts de .values()
+        if isinstance(row, dict):
+            return row['pk'], row[self.last_modified_field]
+        return row.pk, getattr(row, self.last_modified_field)
+
+    def has_preconditions(self):
+        meta = self.request.META
+        return 'HTTP_IF_NONE_MATCH' in meta or 'HTTP_IF_MODIFIED_SINCE' in meta
+
+    def not_modified(self, etag, last_modified=None):
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            response['ETag'] = etag
+        return response
+
+    def precondition_response(self, kind):
+        """
+        304 a partir de una consulta ligera por pk, antes de get_object().
+        """
+        if not self.has_preconditions():
+            return None
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.queryset.model._default_manager.filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        values = queryset.values('pk', self.last_modified_field, 'highlight_key', 'highlight_status',
+                                 'style', 'linenos').first()
+        validators = values and self.validators(values, kind)
+        if not validators:
+            return None
+        return self.not_modified(*validators)
+
+    def conditional(self, render, kind='detail'):
+        """
+        Devuelve `render(instance)` con ETag y Last-Modified, o un 304.
+        """
+        response = self.precondition_response(kind)
+        if response is not None:
+            return response
+        instance = self.get_object()
+        response = render(instance)
+        if response.status_code == 200:
+            validators = self.validators(self.instance_values(instance, kind), kind)
+            if validators:
+                response['ETag'] = validators[0]
+                response['Last-Modified'] = http_date(validators[1])
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(lambda instance: Response(self.get_serializer(instance).data))
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else list(queryset)
+
+        # ETag de la página: filas (pk, updated) y total si la paginación lo muestra
+        count = None
+        if page is not None:
+            count = getattr(self.paginator, 'count', None)
+            django_page = getattr(self.paginator, 'page', None)
+            if count is None and hasattr(django_page, 'paginator'):
+                count = django_page.paginator.count
+        etag = _etag(count, *[
+            '%s@%s' % (pk, updated.isoformat()) for pk, updated in map(self.row_version, rows)
+        ] + list(self.representation_key()))
+        response = self.not_modified(etag)
+        if response is not None:
+            return response
+
+        serializer = self.get_serializer(rows, many=True)
+        if page is not None:
+            response = self.get_paginated_response(serializer.data)
+        else:
+            response = Response(serializer.data)
+        response['ETag'] = etag
+        return response
@@ -0,0 +1,71 @@
+"""
+Configuración de la app snippets.
+
+Se lee del diccionario `SNIPPETS` de settings.py (igual que `REST_FRAMEWORK`),
+usando los valores de DEFAULTS para las claves que no estén definidas.
+"""
+from django.conf import settings
+
+
+DEFAULTS = {
+    # Cache de resaltado: nivel LRU en memoria del proceso (número de entradas)
+    'HIGHLIGHT_CACHE_SIZE': 256,
+    # Alias de CACHES para el nivel compartido (None lo desactiva)
+    'HIGHLIGHT_CACHE_ALIAS': None,
+    'HIGHLIGHT_CACHE_TIMEOUT': 60 * 60 * 24,
+    # Variantes de ?style=&linenos= del highlight guardadas en memoria del proceso
+    'HIGHLIGHT_VARIANT_CACHE_SIZE': 256,
+    # Variantes más pedidas que se resaltan en segundo plano al guardar un snippet (0 ninguna)
+    'HIGHLIGHT_PRECOMPUTE_VARIANTS': 0,
+    # 'sync' resalta dentro de Snippet.save(); 'deferred' lo hace en segundo plano
+    'HIGHLIGHT_MODE': 'sync',
+    # Pool del modo 'deferred' y de los lotes de /snippets/bulk/: 'process' o 'thread'
+    'HIGHLIGHT_EXECUTOR': 'process',
+    'HIGHLIGHT_WORKERS': None,
+    # Reintentos de un resaltado en segundo plano que falla antes de marcarlo 'failed'
+    'HIGHLIGHT_RETRIES': 2,
+    # Respuesta del highlight mientras está pendiente: 'accepted' (202) o 'render'
+    'HIGHLIGHT_PENDING_RESPONSE': 'accepted',
+    # 'fragment' guarda solo el HTML resaltado; 'full' el documento con su CSS
+    'HIGHLIGHT_STORAGE': 'fragment',
+    # Paginación de SnippetViewSetT6/UserViewSetT6 ('snippets.pagination.KeysetPagination' para paginar por clave)
+    'PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'PAGINATION_MAX_PAGE_SIZE': 100,
+    # Máximo de filas que cuenta `?count=` cuando no hay estimación de la base de datos
+    'PAGINATION_COUNT_LIMIT': 10000,
+    # Compresión de `code` y del HTML resaltado (snippets.compression): 'auto' (zstd si está instalado), 'zstd' o 'zlib'
+    'COMPRESSION_CODEC': 'auto',
+    # Los valores con menos caracteres se guardan sin comprimir
+    'COMPRESSION_THRESHOLD': 512,
+    # Nivel del códec (None: 6 en zlib, 3 en zstd)
+    'COMPRESSION_LEVEL': None,
+    # Cada cuántas revisiones del código se guarda una copia completa (snippets.revisions)
+    'REVISION_KEYFRAME_INTERVAL': 20,
+    # Máximo de elementos por petición a /snippets/bulk/
+    'BULK_MAX_ITEMS': 1000,
+    # Filas que lee cada vuelta del cursor en la exportación completa
+    'EXPORT_CHUNK_SIZE': 2000,
+    # Snippets por lote de `manage.py rehighlight` (se resaltan en paralelo y se guardan en una transacción)
+    'REHIGHLIGHT_CHUNK_SIZE': 500,
+    # Alias de CACHES para la caché de respuestas de los listados (None la desactiva)
+    'RESPONSE_CACHE_ALIAS': None,
+    'RESPONSE_CACHE_TIMEOUT': 60 * 60,
+    # MetricsMiddleware y /metrics; la cabecera Server-Timing es opcional
+    'METRICS_ENABLED': False,
+    # IPs que pueden leer /metrics (el scraper de Prometheus); el resto recibe 404
+    'METRICS_ALLOWED_IPS': ('127.0.0.1', '::1'),
+    'METRICS_SERVER_TIMING': False,
+    # Cubos de snippets.throttling: 'local' (memoria del proceso) o 'sqlite' (fichero compartido)
+    'THROTTLE_STORE': 'local',
+    'THROTTLE_MAX_ENTRIES': 10000,
+    # Fichero de 'sqlite' (None: snippets_throttle.sqlite3 en el directorio temporal)
+    'THROTTLE_SQLITE_PATH': None,
+    # Fichas que gasta cada petición: por acción/`throttle_cost` de la vista o por método
+    'THROTTLE_COSTS': {'read': 1, 'write': 5, 'highlight': 10, 'bulk': 50},
+    # Alias de DATABASES donde leen las vistas de solo lectura (snippets.db.routers)
+    'DATABASE_REPLICAS': (),
+}
+
+
+def snippets_setting(name):
+    return getattr(settings, 'SNIPPETS', {}).get(name, DEFAULTS[name])
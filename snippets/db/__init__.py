@@ -0,0 +1,6 @@
+"""
+Conexiones a la base de datos: backends con pool de conexiones por proceso
+(`snippets.db.postgresql`, `snippets.db.sqlite3`, ver snippets.db.pool) y el
+router que manda las lecturas de las vistas de solo lectura a las réplicas
+(snippets.db.routers).
+"""
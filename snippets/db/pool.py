@@ -0,0 +1,262 @@
+"""
+Pool de conexiones por proceso para los backends de snippets.db.
+
+Django abre una conexión por hilo y la cierra al acabar la petición (o la
+reutiliza en ese hilo durante CONN_MAX_AGE segundos). Con los backends
+`snippets.db.postgresql` y `snippets.db.sqlite3` cerrar la conexión la
+devuelve al pool del proceso y la siguiente petición, de cualquier hilo, la
+vuelve a usar sin pagar la conexión y la autenticación.
+
+Se configura con la clave 'POOL' de la base de datos en DATABASES:
+
+    'POOL': {
+        'SIZE': 10,                    # conexiones abiertas como máximo por proceso
+        'TIMEOUT': 30,                 # segundos esperando una libre antes de fallar
+        'HEALTH_CHECK_INTERVAL': 30,   # comprobar con SELECT 1 las que lleven más tiempo sin usarse
+        'MAX_LIFETIME': 3600,          # cerrar las que tengan más de estos segundos
+    }
+
+con 'CONN_MAX_AGE': 0, para que cada petición la devuelva al terminar.
+
+Cada proceso tiene su pool (se crea después del fork de los workers de
+gunicorn o uvicorn), así que nunca se comparte un socket entre procesos.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+
+POOL_DEFAULTS = {
+    'SIZE': 10,
+    'TIMEOUT': 30,
+    'HEALTH_CHECK_INTERVAL': 30,
+    'MAX_LIFETIME': 3600,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class _Entry:
+    __slots__ = ('connection', 'created', 'used')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = self.used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Conexiones DB-API abiertas, como máximo `size`. Las libres se reparten
+    la última devuelta primero (LIFO), así las que sobran envejecen y se cierran.
+    """
+
+    def __init__(self, size=10, timeout=30, health_check_interval=30, max_lifetime=3600):
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+        self._idle = deque()
+        self._in_use = {}
+        self._open = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.waits = 0
+
+    @classmethod
+    def from_settings(cls, options):
+        options = dict(POOL_DEFAULTS, **(options or {}))
+        return cls(size=options['SIZE'], timeout=options['TIMEOUT'],
+                   health_check_interval=options['HEALTH_CHECK_INTERVAL'],
+                   max_lifetime=options['MAX_LIFETIME'])
+
+    def acquire(self, connect, check):
+        """
+        Devuelve una conexión libre que pase `check(connection)` si lleva más
+        de health_check_interval sin usarse, o una nueva de `connect()`.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                if not self._idle and self._open >= self.size:
+                    self.waits += 1
+                while not self._idle and self._open >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout('Sin conexiones libres en el pool tras %ss' % self.timeout)
+                    self._condition.wait(remaining)
+                entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    self._open += 1
+
+            if entry is None:
+                try:
+                    entry = _Entry(connect())
+                except BaseException:
+                    self._forget()
+                    raise
+                with self._condition:
+                    self.created += 1
+                    self._in_use[id(entry.connection)] = entry
+                return entry.connection
+
+            # Fuera del lock: la comprobación es una consulta
+            now = time.monotonic()
+            if self._expired(entry, now) or (now - entry.used >= self.health_check_interval
+                                             and not _safe(check, entry.connection)):
+                self._discard(entry)
+                continue
+            with self._condition:
+                self.reused += 1
+                self._in_use[id(entry.connection)] = entry
+            return entry.connection
+
+    def release(self, connection, reset):
+        """
+        Devuelve `connection` al pool si `reset(connection)` la deja lista
+        (sin transacción abierta); si no, o si ha caducado, la cierra.
+        """
+        with self._condition:
+            entry = self._in_use.pop(id(connection), None)
+        if entry is None:
+            # No es de este pool (p.ej. abierta antes de un fork)
+            _close(connection)
+            return
+        if self._closed or self._expired(entry, time.monotonic()) or not _safe(reset, connection):
+            self._discard(entry)
+            return
+        entry.used = time.monotonic()
+        with self._condition:
+            self._idle.append(entry)
+            self._condition.notify()
+
+    def close(self):
+        """
+        Cierra las conexiones libres; las que están en uso se cierran al devolverlas.
+        """
+        with self._condition:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for entry in idle:
+            self._discard(entry)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+                'waits': self.waits,
+            }
+
+    def _expired(self, entry, now):
+        return self.max_lifetime is not None and now - entry.created >= self.max_lifetime
+
+    def _discard(self, entry):
+        _close(entry.connection)
+        with self._condition:
+            self.discarded += 1
+        self._forget()
+
+    def _forget(self):
+        with self._condition:
+            self._open -= 1
+            self._condition.notify()
+
+
+def _safe(func, connection):
+    try:
+        return func(connection) is not False
+    except Exception:
+        return False
+
+
+def _close(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def get_pool(alias, options):
+    """
+    Pool de la base de datos `alias` en este proceso.
+    """
+    key = (os.getpid(), alias)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool.from_settings(options)
+        return pool
+
+
+def close_pools():
+    """
+    Cierra los pools de este proceso (p.ej. al terminar los tests).
+    """
+    pid = os.getpid()
+    with _pools_lock:
+        pools = [pool for (owner, _), pool in _pools.items() if owner == pid]
+        for key in [key for key in _pools if key[0] == pid]:
+            del _pools[key]
+    for pool in pools:
+        pool.close()
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Para el DatabaseWrapper de un backend: connect() toma la conexión del
+    pool y close() la devuelve. Sin 'POOL' en la configuración, o con una
+    base SQLite en memoria (cada conexión es una base distinta), se comporta
+    como el backend original.
+    """
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL')
+        if options is None or self.is_in_memory():
+            return None
+        return get_pool(self.alias, options)
+
+    def is_in_memory(self):
+        return False
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            return pool.acquire(lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params),
+                                self.check_pooled_connection)
+        except PoolTimeout as exc:
+            raise self.Database.OperationalError(str(exc))
+
+    def _close(self):
+        pool = self.pool
+        if pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.release(self.connection, self.reset_pooled_connection)
+
+    def check_pooled_connection(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+
+    def reset_pooled_connection(self, connection):
+        # Deshace lo que haya quedado sin confirmar (p.ej. al cerrar dentro de atomic())
+        connection.rollback()
@@ -0,0 +1,19 @@
+"""
+Backend de PostgreSQL con pool de conexiones (ENGINE 'snippets.db.postgresql').
+"""
+from django.db.backends.postgresql import base
+
+from snippets.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+
+    def check_pooled_connection(self, connection):
+        if connection.closed:
+            return False
+        return super().check_pooled_connection(connection)
+
+    def reset_pooled_connection(self, connection):
+        if connection.closed:
+            return False
+        return super().reset_pooled_connection(connection)
@@ -0,0 +1,74 @@
+"""
+Lecturas en réplicas para las vistas de solo lectura.
+
+`ReplicaRouter` (en DATABASE_ROUTERS) manda las lecturas a una de las bases
+de SNIPPETS['DATABASE_REPLICAS'] solo dentro de `read_from_replica()`, que
+usan `ReplicaReadMixin` (vistas GET de DRF) y las vistas de /async/. El resto
+de consultas, y todas las escrituras, van a 'default', así que una vista que
+escribe nunca lee datos atrasados de una réplica.
+
+Cada petición usa una sola réplica, elegida al azar al empezar. En los tests
+las réplicas se declaran con 'TEST': {'MIRROR': 'default'}.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+from snippets.conf import snippets_setting
+
+
+_replica = ContextVar('snippets_replica', default=None)
+
+
+def replicas():
+    return tuple(snippets_setting('DATABASE_REPLICAS'))
+
+
+@contextmanager
+def read_from_replica():
+    aliases = replicas()
+    token = _replica.set(random.choice(aliases) if aliases else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        # Las instancias leídas de una réplica se guardan en 'default'
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in replicas():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = (DEFAULT_DB_ALIAS,) + replicas()
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema por replicación
+        if db in replicas():
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Para vistas de DRF: las peticiones GET/HEAD leen de una réplica.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with read_from_replica():
+            return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,13 @@
+"""
+Backend de SQLite con pool de conexiones (ENGINE 'snippets.db.sqlite3'),
+para probar el pool sin PostgreSQL. Con bases en memoria no hay pool.
+"""
+from django.db.backends.sqlite3 import base
+
+from snippets.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+
+    def is_in_memory(self):
+        return self.is_in_memory_db()
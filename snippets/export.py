@@ -0,0 +1,64 @@
+"""
+Exportación completa de los snippets en streaming (NDJSON o JSON).
+
+Las filas se leen con `.iterator(chunk_size)` (cursor de servidor en
+PostgreSQL) y se codifican por bloques, así que la memoria no crece con el
+tamaño de la tabla. La usan la vista /snippets/export/ y el comando
+`manage.py export_snippets`.
+"""
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from snippets.conf import snippets_setting
+from snippets.models import Snippet
+from snippets.querysets import eager_load
+from snippets.serializers import SnippetModelSerializer
+
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def _encode(data):
+    # Mismo formato compacto que JSONRenderer
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def export_queryset():
+    return eager_load(Snippet.objects.order_by('pk'), SnippetModelSerializer, only=True)
+
+
+def _encoded_chunks(queryset, chunk_size):
+    serializer = SnippetModelSerializer()
+    chunk = []
+    for snippet in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(_encode(serializer.to_representation(snippet)))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export_snippets(fmt='ndjson', queryset=None, chunk_size=None):
+    """
+    Genera el texto de la exportación por bloques de `chunk_size` snippets.
+    """
+    if fmt not in FORMATS:
+        raise ValueError('Formato de exportación desconocido: %r' % fmt)
+    queryset = export_queryset() if queryset is None else queryset
+    chunk_size = chunk_size or snippets_setting('EXPORT_CHUNK_SIZE')
+    chunks = _encoded_chunks(queryset, chunk_size)
+    if fmt == 'ndjson':
+        for chunk in chunks:
+            yield '\n'.join(chunk) + '\n'
+        return
+
+    separator = '['
+    for chunk in chunks:
+        yield separator + ','.join(chunk)
+        separator = ','
+    yield ']' if separator == ',' else '[]'
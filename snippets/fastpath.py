@@ -0,0 +1,263 @@
+"""
+Camino rápido de solo lectura para los listados de snippets y usuarios.
+
+En lugar de instanciar modelos y pasar cada campo por su `to_representation`,
+el listado lee filas de `.values()` y las convierte con accesos precompilados
+a partir de los campos del serializer (una vez por clase). Las relaciones
+many=True por pk se resuelven con una consulta más, como el prefetch.
+
+La salida es idéntica a la del serializer de DRF; si el serializer tiene
+algún campo que aquí no se sabe reproducir (hipervínculos, serializers
+anidados, SerializerMethodField...) se usa el camino normal.
+
+`FastJSONRenderer` codifica con orjson si está instalado y da los mismos
+bytes que JSONRenderer con la configuración por defecto de DRF.
+"""
+from operator import itemgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from snippets.metrics import timed
+from snippets.querysets import _walk, eager_load
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+_plans = {}
+
+# Campos de DRF cuyo to_representation no cambia el valor que da la base de datos
+_IDENTITY = (
+    (serializers.IntegerField, (models.AutoField, models.IntegerField)),
+    (serializers.CharField, (models.CharField, models.TextField)),
+    (serializers.ChoiceField, (models.CharField,)),
+    (serializers.BooleanField, (models.BooleanField,)),
+)
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _accessor(field, model):
+    """
+    Devuelve (lookup de .values(), conversión o None) de un campo simple.
+    """
+    relations, rest = _walk(model, field.source)
+    if isinstance(field, PrimaryKeyRelatedField):
+        if field.pk_field is not None or rest or len(relations) != 1 or not relations[0].concrete:
+            raise Unsupported(field)
+        return relations[0].name, None
+    if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField,
+                          serializers.RelatedField, ManyRelatedField)) or field.source == '*':
+        raise Unsupported(field)
+    if any(f.many_to_many or f.one_to_many for f in relations) or len(rest) != 1:
+        raise Unsupported(field)
+    target = relations[-1].related_model if relations else model
+    try:
+        model_field = target._meta.get_field(rest[0])
+    except FieldDoesNotExist:
+        raise Unsupported(field)
+    if not model_field.concrete or model_field.is_relation:
+        raise Unsupported(field)
+    lookup = '__'.join([f.name for f in relations] + rest)
+    if isinstance(field, serializers.ReadOnlyField):
+        return lookup, None
+    for drf_class, model_classes in _IDENTITY:
+        if type(field) is drf_class and isinstance(model_field, model_classes):
+            return lookup, None
+    return lookup, field.to_representation
+
+
+def _many_accessor(field, model):
+    """
+    Para un ManyRelatedField de pks: (modelo relacionado, lookup de vuelta a `model`).
+    """
+    child = field.child_relation
+    if type(child) is not PrimaryKeyRelatedField or child.pk_field is not None:
+        raise Unsupported(field)
+    relations, rest = _walk(model, field.source)
+    if len(relations) != 1 or rest:
+        raise Unsupported(field)
+    relation = relations[0]
+    if relation.one_to_many:
+        return relation.related_model, relation.field.name
+    if relation.many_to_many and relation.concrete:
+        return relation.related_model, relation.related_query_name()
+    raise Unsupported(field)
+
+
+class ValuesPlan:
+    """
+    Serialización de filas de `.values()` equivalente a `serializer_class(many=True)`.
+    """
+
+    def __init__(self, serializer_class, model, fields=None):
+        self.names, self.lookups, self.converters, self.many = [], ['pk'], [], []
+        keys = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only or (fields is not None and name not in fields):
+                continue
+            if isinstance(field, ManyRelatedField):
+                # De momento el pk de la fila; se sustituye por la lista en serialize()
+                self.many.append((name,) + _many_accessor(field, model))
+                key = 'pk'
+            else:
+                key, convert = _accessor(field, model)
+                if convert is not None:
+                    self.converters.append((name, convert))
+                if key not in self.lookups:
+                    self.lookups.append(key)
+            self.names.append(name)
+            keys.append(key)
+        getter = itemgetter(*keys) if keys else (lambda row: ())
+        self.getter = getter if len(keys) != 1 else (lambda row: (getter(row),))
+
+    def values_queryset(self, queryset, extra_columns=()):
+        lookups = self.lookups + [name for name in extra_columns if name not in self.lookups]
+        return queryset.prefetch_related(None).values(*lookups)
+
+    def related_queries(self, rows):
+        """
+        (campo, queryset de pares (fila, pk relacionado)) de cada relación
+        many=True; el queryset es None si no hay filas.
+        """
+        pks = [row['pk'] for row in rows]
+        for name, model, lookup in self.many:
+            queryset = model._default_manager.filter(**{lookup + '__in': pks}).values_list(lookup, 'pk')
+            yield name, queryset if pks else None
+
+    @staticmethod
+    def group_related(pairs):
+        by_owner = {}
+        for owner, pk in pairs:
+            by_owner.setdefault(owner, []).append(pk)
+        return by_owner
+
+    def related_pks(self, rows):
+        return {name: self.group_related(queryset or ()) for name, queryset in self.related_queries(rows)}
+
+    def serialize(self, rows, related=None):
+        """
+        `related` son los pks de las relaciones many=True (related_pks());
+        si no se pasan se consultan aquí.
+        """
+        names, getter, converters = self.names, self.getter, self.converters
+        if related is None:
+            related = self.related_pks(rows) if self.many else {}
+        data = []
+        for row in rows:
+            item = dict(zip(names, getter(row)))
+            for name, convert in converters:
+                value = item[name]
+                if value is not None:
+                    item[name] = convert(value)
+            for name, pks in related.items():
+                item[name] = pks.get(item[name], [])
+            data.append(item)
+        return data
+
+
+def values_plan(serializer_class, model, fields=None):
+    """
+    Plan de `serializer_class` (o de sus `fields`), o None si no tiene camino rápido.
+    """
+    key = (serializer_class, model, fields and frozenset(fields))
+    if key not in _plans:
+        try:
+            _plans[key] = ValuesPlan(serializer_class, model, fields)
+        except Unsupported:
+            _plans[key] = None
+    return _plans[key]
+
+
+def list_data(serializer_class, queryset):
+    """
+    `serializer_class(queryset, many=True).data` por el camino rápido si se puede.
+    """
+    plan = values_plan(serializer_class, queryset.model)
+    if plan is None:
+        return serializer_class(eager_load(queryset, serializer_class, only=True), many=True).data
+    rows = list(plan.values_queryset(queryset))
+    with timed('serializer'):
+        return plan.serialize(rows)
+
+
+class FastListSerializer:
+    """
+    Lo que devuelve get_serializer(rows, many=True) en el camino rápido: solo `.data`.
+    """
+
+    def __init__(self, plan, rows):
+        self.plan, self.rows = plan, rows
+
+    @property
+    def data(self):
+        if not hasattr(self, '_data'):
+            with timed('serializer'):
+                self._data = self.plan.serialize(self.rows)
+        return self._data
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer con orjson si está instalado. Solo se usa con la
+    configuración por defecto (compacto, UTF-8, estricto), donde da los
+    mismos bytes; los tipos que orjson no conoce pasan por el encoder de DRF.
+    Los float con exponente se escriben distinto, pero aquí no hay ninguno.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None
+                or self.get_indent(accepted_media_type, renderer_context or {})
+                or not (api_settings.COMPACT_JSON and api_settings.UNICODE_JSON and api_settings.STRICT_JSON)):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default,
+                               option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            # Enteros de más de 64 bits, claves que no son str, surrogates...
+            return super().render(data, accepted_media_type, renderer_context)
+        # Como JSONRenderer: U+2028/U+2029 escapados para poder incrustarlo en JS
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastReadMixin:
+    """
+    Para vistas de listado: con el renderer JSON, el listado lee `.values()`
+    y serializa con ValuesPlan. Va delante de EagerLoadingMixin.
+    """
+
+    def get_renderers(self):
+        # Los de la vista (DEFAULT_RENDERER_CLASSES) con FastJSONRenderer en lugar de JSONRenderer
+        return [(FastJSONRenderer if renderer is JSONRenderer else renderer)() for renderer in self.renderer_classes]
+
+    def get_values_plan(self):
+        if not hasattr(self, '_values_plan'):
+            self._values_plan = None
+            request = self.request
+            if (request.method in ('GET', 'HEAD') and getattr(self, 'action', 'list') == 'list'
+                    and isinstance(getattr(request, 'accepted_renderer', None), JSONRenderer)):
+                self._values_plan = values_plan(self.get_serializer_class(), self.queryset.model,
+                                                self.get_sparse_fields())
+        return self._values_plan
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        plan = self.get_values_plan()
+        if plan is None:
+            return queryset
+        return plan.values_queryset(queryset, getattr(self, 'extra_columns', ()))
+
+    def get_serializer(self, *args, **kwargs):
+        plan = self.get_values_plan()
+        if plan is not None and kwargs.get('many'):
+            return FastListSerializer(plan, args[0])
+        return super().get_serializer(*args, **kwargs)
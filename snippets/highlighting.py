@@ -0,0 +1,253 @@
+"""
+Resaltado de código con `pygments` y su cache.
+
+El HTML resultante depende solo de (code, language, style, linenos, title)
+y de la versión de pygments, así que se guarda con una clave hash de esos
+valores en dos niveles: un LRU en memoria del proceso y, opcionalmente, una
+cache compartida de Django. Al actualizar pygments cambian las claves y los
+resaltados guardados quedan obsoletos (ver `manage.py rehighlight`).
+
+Con HIGHLIGHT_STORAGE = 'fragment' solo se guarda el fragmento resaltado;
+el documento completo se monta al servirlo con `full_document`, enlazando
+la hoja de estilos de su `style`, que se sirve una sola vez (ver `style_css`).
+
+Las variantes con otro `style` o `linenos` (?style=&linenos= del highlight)
+no se guardan en la fila: se resaltan al pedirlas y se guardan en
+`variant_cache` con la versión del snippet (`highlight_key`) y las opciones.
+El fragmento solo usa clases CSS, así que no depende del estilo: con
+'fragment' cambiar de estilo es enlazar otra hoja de estilos.
+"""
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from functools import lru_cache
+
+from django.core.cache import caches
+from django.utils.html import escape
+from pygments import __version__ as PYGMENTS_VERSION, highlight  # Biblioteca de resaltado de códigos
+from pygments.formatters.html import (CSSFILE_TEMPLATE, DOC_FOOTER,
+                                      DOC_HEADER_EXTERNALCSS, HtmlFormatter)
+from pygments.lexers import get_lexer_by_name
+
+from snippets.catalog import STYLE_NAMES
+from snippets.conf import snippets_setting
+from snippets.metrics import timed
+
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+FALSE_VALUES = ('0', 'false', 'no', 'off')
+
+
+def stores_full_document():
+    return snippets_setting('HIGHLIGHT_STORAGE') == 'full'
+
+
+def render_key(code, language, style, linenos, title, full=True):
+    """
+    Devuelve la clave hash de los valores que determinan el HTML.
+    """
+    digest = hashlib.sha256((b'full:' if full else b'fragment:') + PYGMENTS_VERSION.encode('ascii'))
+    for value in (code, language, style, '1' if linenos else '0', title or ''):
+        data = value.encode('utf-8')
+        # Se antepone la longitud para que ('ab', 'c') y ('a', 'bc') no coincidan
+        digest.update(str(len(data)).encode('ascii') + b':' + data)
+    return digest.hexdigest()
+
+
+def variant_key(version, style, linenos, full=True):
+    """
+    Clave de la variante (`style`, `linenos`) del snippet cuyo `highlight_key` es `version`.
+    """
+    # El fragmento es el mismo con cualquier estilo
+    parts = (version, 'full' if full else 'fragment', style if full else '', '1' if linenos else '0')
+    return hashlib.sha256(':'.join(parts).encode('utf-8')).hexdigest()
+
+
+def variant_options(params):
+    """
+    (style, linenos) de ?style=&linenos=, con None los que no vienen.
+    Lanza ValueError si alguno no es válido.
+    """
+    style = params.get('style') or None
+    if style is not None and style not in STYLE_NAMES:
+        raise ValueError('style: estilo desconocido %r' % style)
+    linenos = params.get('linenos')
+    if linenos:
+        if linenos.lower() not in TRUE_VALUES + FALSE_VALUES:
+            raise ValueError('linenos: se esperaba true o false')
+        linenos = linenos.lower() in TRUE_VALUES
+    else:
+        linenos = None
+    return style, linenos
+
+
+def render(code, language, style, linenos, title, full=True):
+    """
+    Use the `pygments` library to create a highlighted HTML
+    representation of the code snippet.
+    """
+    lexer = get_lexer_by_name(language)
+    linenos = 'table' if linenos else False
+    options = {'title': title} if title else {}
+    formatter = HtmlFormatter(style=style, linenos=linenos,
+                              full=full, **options)
+    with timed('highlight'):
+        return highlight(code, lexer, formatter)
+
+
+def is_full_document(html):
+    return html.lstrip().startswith('<!DOCTYPE')
+
+
+def full_document(fragment, title, css_url):
+    """
+    Monta el documento HTML de un fragmento enlazando su hoja de estilos.
+    """
+    header = DOC_HEADER_EXTERNALCSS % {
+        'title': escape(title),
+        'cssfile': escape(css_url),
+        'encoding': 'utf-8',
+    }
+    return header + fragment + DOC_FOOTER
+
+
+@lru_cache(maxsize=None)
+def style_css(style):
+    """
+    Devuelve (css, etag) de un estilo, con los mismos selectores que usa
+    el documento completo de `pygments`.
+    """
+    css = CSSFILE_TEMPLATE % {'styledefs': HtmlFormatter(style=style).get_style_defs('body')}
+    etag = '"%s"' % hashlib.sha256(css.encode('utf-8')).hexdigest()[:32]
+    return css, etag
+
+
+class HighlightCache:
+    """
+    Cache de HTML resaltado con un nivel LRU local y uno compartido opcional.
+    """
+    key_prefix = 'snippets:highlight:'
+
+    def __init__(self, maxsize=None, key_prefix=None, size_setting='HIGHLIGHT_CACHE_SIZE'):
+        self._maxsize = maxsize
+        self.size_setting = size_setting
+        if key_prefix is not None:
+            self.key_prefix = key_prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        # Guardados en los que no hizo falta volver a resaltar
+        self.skips = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is not None:
+            return self._maxsize
+        return snippets_setting(self.size_setting)
+
+    def _shared(self):
+        alias = snippets_setting('HIGHLIGHT_CACHE_ALIAS')
+        return caches[alias] if alias else None
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+
+        shared = self._shared()
+        if shared is not None:
+            html = shared.get(self.key_prefix + key)
+            if html is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                self._store_local(key, html)
+                return html
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, html):
+        self._store_local(key, html)
+        shared = self._shared()
+        if shared is not None:
+            shared.set(self.key_prefix + key, html,
+                       snippets_setting('HIGHLIGHT_CACHE_TIMEOUT'))
+
+    def _store_local(self, key, html):
+        maxsize = self.maxsize
+        if maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.shared_hits = self.misses = self.skips = 0
+
+    def record_skip(self):
+        with self._lock:
+            self.skips += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'skips': self.skips,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+
+highlight_cache = HighlightCache()
+# Variantes de ?style=&linenos=
+variant_cache = HighlightCache(key_prefix='snippets:variant:', size_setting='HIGHLIGHT_VARIANT_CACHE_SIZE')
+
+
+class VariantStats:
+    """
+    Cuántas veces se ha pedido cada variante (style, linenos) en este proceso,
+    para resaltar de antemano las más pedidas (HIGHLIGHT_PRECOMPUTE_VARIANTS).
+    """
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, style, linenos):
+        with self._lock:
+            self._counts[style, linenos] += 1
+
+    def most_common(self, n):
+        with self._lock:
+            return [variant for variant, _ in self._counts.most_common(n)]
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+variant_stats = VariantStats()
+
+
+def cached_render(code, language, style, linenos, title, full=True):
+    """
+    Igual que `render` pero pasando por `highlight_cache`.
+    """
+    key = render_key(code, language, style, linenos, title, full=full)
+    html = highlight_cache.get(key)
+    if html is None:
+        html = render(code, language, style, linenos, title, full=full)
+        highlight_cache.set(key, html)
+    return html
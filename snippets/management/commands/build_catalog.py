@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from snippets.catalog import CATALOG_PATH, write_catalog
+
+
+class Command(BaseCommand):
+    help = 'Precalcula el catálogo de lenguajes y estilos de pygments (snippets/catalog.json).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=CATALOG_PATH,
+                            help='Fichero de salida (por defecto %s)' % CATALOG_PATH)
+
+    def handle(self, *args, **options):
+        catalog = write_catalog(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            '%d lenguajes y %d estilos de pygments %s en %s' % (
+                len(catalog['languages']), len(catalog['styles']),
+                catalog['pygments'], options['output'])))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from snippets.conf import snippets_setting
+from snippets.export import FORMATS, export_snippets
+
+
+class Command(BaseCommand):
+    help = 'Exporta todos los snippets en NDJSON o JSON sin cargarlos en memoria.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument('--output', help='Fichero de salida (por defecto la salida estándar)')
+        parser.add_argument('--chunk-size', type=int, default=snippets_setting('EXPORT_CHUNK_SIZE'),
+                            help='Filas por lectura del cursor')
+
+    def handle(self, *args, **options):
+        chunks = export_snippets(options['format'], chunk_size=options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            for chunk in chunks:
+                output.write(chunk)
@@ -0,0 +1,86 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from snippets.conf import snippets_setting
+from snippets.highlighting import variant_cache
+from snippets.models import Snippet
+from snippets.rehighlight import rehighlight
+from snippets.tasks import create_executor
+
+
+class Command(BaseCommand):
+    help = ('Vuelve a resaltar los snippets guardados por lotes en un pool de procesos '
+            '(tras actualizar pygments o los estilos).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--language', action='append', help='Solo los de este lenguaje (se puede repetir)')
+        parser.add_argument('--style', action='append', help='Solo los de este estilo (se puede repetir)')
+        parser.add_argument('--owner', action='append', help='Solo los de este usuario (se puede repetir)')
+        parser.add_argument('--all', action='store_true', dest='force',
+                            help='Todos, no solo los que tienen el resaltado obsoleto')
+        parser.add_argument('--chunk-size', type=int, default=snippets_setting('REHIGHLIGHT_CHUNK_SIZE'),
+                            help='Snippets por lote')
+        parser.add_argument('--workers', type=int, default=snippets_setting('HIGHLIGHT_WORKERS'),
+                            help='Procesos del pool (por defecto uno por CPU)')
+        parser.add_argument('--checkpoint',
+                            help='Fichero con el último lote guardado; si existe se continúa desde él '
+                                 'y se borra al terminar')
+
+    def handle(self, *args, **options):
+        filters = {name: sorted(options[name]) for name in ('language', 'style', 'owner') if options[name]}
+        queryset = Snippet.objects.all()
+        if 'language' in filters:
+            queryset = queryset.filter(language__in=filters['language'])
+        if 'style' in filters:
+            queryset = queryset.filter(style__in=filters['style'])
+        if 'owner' in filters:
+            queryset = queryset.filter(owner__username__in=filters['owner'])
+
+        checkpoint = options['checkpoint']
+        state = {'filters': filters, 'force': options['force'], 'last_pk': 0, 'done': 0}
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint, encoding='utf-8') as f:
+                saved = json.load(f)
+            if (saved.get('filters'), saved.get('force')) != (filters, options['force']):
+                raise CommandError('El checkpoint %s es de otros filtros: %s' % (checkpoint, saved.get('filters')))
+            state = saved
+            self.stdout.write('Se continúa desde el snippet %d' % state['last_pk'])
+
+        total = state['done'] + queryset.filter(pk__gt=state['last_pk']).count()
+        read = rendered = updated = 0
+        start = time.perf_counter()
+        executor = create_executor(options['workers'])
+        try:
+            for chunk in rehighlight(queryset, chunk_size=options['chunk_size'], after=state['last_pk'],
+                                     force=options['force'], executor=executor):
+                state['last_pk'] = chunk['last_pk']
+                state['done'] += chunk['read']
+                read += chunk['read']
+                rendered += chunk['rendered']
+                updated += chunk['updated']
+                if checkpoint:
+                    write_checkpoint(checkpoint, state)
+                rate = read / (time.perf_counter() - start)
+                self.stdout.write('%d/%d snippets (%.0f%%), %d resaltados, %.1f snippets/s, quedan %.0f s' % (
+                    state['done'], total, 100.0 * state['done'] / max(total, 1), rendered, rate,
+                    (total - state['done']) / rate))
+        finally:
+            executor.shutdown()
+        # Las variantes de ?style=&linenos= de este proceso ya no valen
+        variant_cache.clear()
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS('%d snippets guardados con %d resaltados en %.1f s' % (
+            updated, rendered, elapsed)))
+
+
+def write_checkpoint(path, state):
+    # Se escribe aparte y se renombra para no dejar un fichero a medias
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
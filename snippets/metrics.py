@@ -0,0 +1,287 @@
+"""
+Métricas de rendimiento por petición, en formato de texto de Prometheus (`/metrics`).
+
+`MetricsMiddleware` mide cada petición y lo acumula por vista:
+
+- duración total (histograma) y número de peticiones por código de estado,
+- consultas a la base de datos y su tiempo (`connection.execute_wrapper`),
+- tiempo de serialización (serializers con `TimedSerializerMixin` y el
+  camino rápido de los listados),
+- tiempo de resaltado con pygments (`highlighting.render`, p.ej. desde Snippet.save()),
+- tamaño de la respuesta.
+
+Está desactivado por defecto (SNIPPETS['METRICS_ENABLED']) y `/metrics` solo
+responde a las IPs de SNIPPETS['METRICS_ALLOWED_IPS']. Con
+SNIPPETS['METRICS_SERVER_TIMING'] además añade la cabecera `Server-Timing`
+con los tiempos de la petición.
+
+Los valores se guardan en memoria del proceso: con varios procesos (gunicorn)
+cada uno expone los suyos. En las respuestas en streaming la duración y el
+tamaño son los de la vista, sin contar el envío del cuerpo.
+
+La petición en curso se guarda en un ContextVar, así que el middleware sirve
+igual con WSGI (un hilo por petición) que con ASGI (tutorial/asgi.py), donde
+las consultas de las vistas asíncronas pasan por sync_to_async, que copia el
+contexto al hilo que las ejecuta.
+"""
+import asyncio
+import threading
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from snippets.conf import snippets_setting
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# nombre: (tipo, ayuda, buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Peticiones por vista, método y estado', None),
+    'http_request_duration_seconds': ('histogram', 'Duración de las peticiones', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('histogram', 'Tamaño de las respuestas (sin streaming)', SIZE_BUCKETS),
+    'db_queries_per_request': ('histogram', 'Consultas a la base de datos por petición', QUERY_BUCKETS),
+    'db_query_duration_seconds': ('histogram', 'Tiempo en la base de datos por petición', LATENCY_BUCKETS),
+    'serializer_duration_seconds': ('histogram', 'Tiempo de serialización por petición', LATENCY_BUCKETS),
+    'highlight_duration_seconds': ('histogram', 'Tiempo de resaltado con pygments por petición',
+                                   LATENCY_BUCKETS),
+}
+
+_current = ContextVar('snippets_metrics', default=None)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Un contador por bucket y el último para +Inf (sin acumular)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """
+    Valores de METRICS por (nombre, etiquetas).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {name: {} for name in METRICS}
+
+    def record(self, samples):
+        """
+        Registra varias muestras (nombre, etiquetas, valor) con un solo lock.
+        """
+        with self._lock:
+            for name, labels, value in samples:
+                kind, _, buckets = METRICS[name]
+                values = self._values[name]
+                if kind == 'counter':
+                    values[labels] = values.get(labels, 0) + value
+                else:
+                    histogram = values.get(labels)
+                    if histogram is None:
+                        histogram = values[labels] = Histogram(buckets)
+                    histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            for values in self._values.values():
+                values.clear()
+
+    def exposition(self):
+        """
+        Texto en el formato de exposición de Prometheus (versión 0.0.4).
+        """
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, buckets) in METRICS.items():
+                lines.append('# HELP %s %s' % (name, help_text))
+                lines.append('# TYPE %s %s' % (name, kind))
+                for labels, value in sorted(self._values[name].items()):
+                    if kind == 'counter':
+                        lines.append('%s%s %s' % (name, _labels(labels), _number(value)))
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets + ('+Inf',), value.counts):
+                        cumulative += count
+                        lines.append('%s_bucket%s %d' % (
+                            name, _labels(labels + (('le', _number(bound)),)), cumulative))
+                    lines.append('%s_sum%s %s' % (name, _labels(labels), _number(value.sum)))
+                    lines.append('%s_count%s %d' % (name, _labels(labels), value.count))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _number(value):
+    return value if isinstance(value, str) else repr(value)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = ('%s="%s"' % (key, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+               for key, value in labels)
+    return '{%s}' % ','.join(escaped)
+
+
+class RequestMetrics:
+    """
+    Lo medido durante una petición (en el hilo que la atiende).
+    """
+    __slots__ = ('queries', 'db_time', 'phases', 'active')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.phases = {}
+        self.active = set()
+
+    def execute(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - start
+            self.queries += 1
+
+
+class timed:
+    """
+    Suma la duración del bloque a la fase `phase` de la petición en curso.
+    Los bloques anidados de una misma fase (serializers anidados) cuentan una vez.
+    """
+    __slots__ = ('phase', 'metrics', 'start')
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        metrics = _current.get()
+        if metrics is None or self.phase in metrics.active:
+            self.metrics = None
+            return
+        self.metrics = metrics
+        metrics.active.add(self.phase)
+        self.start = perf_counter()
+
+    def __exit__(self, *exc_info):
+        metrics = self.metrics
+        if metrics is not None:
+            phases = metrics.phases
+            phases[self.phase] = phases.get(self.phase, 0.0) + perf_counter() - self.start
+            metrics.active.discard(self.phase)
+
+
+class TimedSerializerMixin:
+    """
+    Para los serializers: cuenta su `to_representation` como tiempo de serialización.
+    """
+
+    def to_representation(self, instance):
+        with timed('serializer'):
+            return super().to_representation(instance)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    func = match.func
+    label = '%s.%s' % (func.__module__, getattr(func, '__name__', type(func).__name__))
+    return '%s:%s' % (label, match.url_name) if match.url_name else label
+
+
+def server_timing(metrics, duration):
+    parts = ['db;dur=%.2f;desc="%d queries"' % (metrics.db_time * 1000, metrics.queries)]
+    parts.extend('%s;dur=%.2f' % (phase, value * 1000) for phase, value in sorted(metrics.phases.items()))
+    parts.append('total;dur=%.2f' % (duration * 1000))
+    return ', '.join(parts)
+
+
+def _wrap_connections(metrics):
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(metrics.execute))
+    return stack
+
+
+class MetricsMiddleware:
+    """
+    Mide cada petición y la registra en `registry`. Va la primera de MIDDLEWARE.
+    Admite la cadena síncrona (WSGI) y la asíncrona (ASGI, Django 3.1+).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not snippets_setting('METRICS_ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = snippets_setting('METRICS_SERVER_TIMING')
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Para que Django trate la instancia como asíncrona (como MiddlewareMixin)
+            try:
+                from asgiref.sync import markcoroutinefunction
+            except ImportError:
+                self._is_coroutine = asyncio.coroutines._is_coroutine
+            else:
+                markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = perf_counter()
+        try:
+            with _wrap_connections(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, metrics, perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = perf_counter()
+        try:
+            with _wrap_connections(metrics):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, metrics, perf_counter() - start)
+
+    def record(self, request, response, metrics, duration):
+        view = (('view', view_label(request)),)
+        samples = [
+            ('http_requests_total', view + (('method', request.method), ('status', response.status_code)), 1),
+            ('http_request_duration_seconds', view, duration),
+            ('db_queries_per_request', view, metrics.queries),
+            ('db_query_duration_seconds', view, metrics.db_time),
+        ]
+        if not response.streaming:
+            samples.append(('http_response_size_bytes', view, len(response.content)))
+        for phase, value in metrics.phases.items():
+            samples.append(('%s_duration_seconds' % phase, view, value))
+        registry.record(samples)
+
+        if self.server_timing:
+            response['Server-Timing'] = server_timing(metrics, duration)
+        return response
@@ -0,0 +1,62 @@
+import hashlib
+
+from django.conf import settings
+from django.db import migrations
+from pygments import highlight
+from pygments.formatters.html import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+
+
+RENDER_FIELDS = ('code', 'language', 'style', 'linenos', 'title')
+
+
+# Copias de snippets.highlighting tal como estaban en esta migración: el
+# código de la aplicación puede cambiar y la migración tiene que dar lo mismo
+def stores_full_document():
+    return getattr(settings, 'SNIPPETS', {}).get('HIGHLIGHT_STORAGE', 'fragment') == 'full'
+
+
+def render_key(code, language, style, linenos, title, full=True):
+    digest = hashlib.sha256(b'full' if full else b'fragment')
+    for value in (code, language, style, '1' if linenos else '0', title or ''):
+        data = value.encode('utf-8')
+        digest.update(str(len(data)).encode('ascii') + b':' + data)
+    return digest.hexdigest()
+
+
+def render(code, language, style, linenos, title, full=True):
+    options = {'title': title} if title else {}
+    formatter = HtmlFormatter(style=style, linenos='table' if linenos else False, full=full, **options)
+    return highlight(code, get_lexer_by_name(language), formatter)
+
+
+def rewrite_highlighted(apps, full):
+    # Vuelve a generar `highlighted` de todas las filas como fragmento o documento completo
+    Snippet = apps.get_model('snippets', 'Snippet')
+    rows = Snippet.objects.values_list('pk', *RENDER_FIELDS)
+    for row in rows.iterator():
+        pk, inputs = row[0], row[1:]
+        Snippet.objects.filter(pk=pk).update(
+            highlighted=render(*inputs, full=full),
+            highlight_key=render_key(*inputs, full=full),
+            highlight_status='ready',
+        )
+
+
+def forwards(apps, schema_editor):
+    rewrite_highlighted(apps, full=stores_full_document())
+
+
+def backwards(apps, schema_editor):
+    rewrite_highlighted(apps, full=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0003_snippet_highlight_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations, models
+
+
+INDEXES = [
+    models.Index(fields=['created', 'id'], name='snippet_created_id_idx'),
+    models.Index(fields=['owner', 'created'], name='snippet_owner_created_idx'),
+    models.Index(fields=['language', 'created'], name='snippet_language_created_idx'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    # En PostgreSQL se crean con CONCURRENTLY para no bloquear las escrituras
+    Snippet = apps.get_model('snippets', 'Snippet')
+    for index in INDEXES:
+        if schema_editor.connection.vendor == 'postgresql':
+            sql = str(index.create_sql(Snippet, schema_editor))
+            sql = sql.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS', 1)
+            schema_editor.execute(sql)
+        else:
+            schema_editor.add_index(Snippet, index)
+
+
+def drop_indexes(apps, schema_editor):
+    Snippet = apps.get_model('snippets', 'Snippet')
+    for index in INDEXES:
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % schema_editor.quote_name(index.name))
+        else:
+            schema_editor.remove_index(Snippet, index)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('snippets', '0004_highlighted_fragments'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_indexes, drop_indexes, atomic=False),
+            ],
+            state_operations=[
+                migrations.AddIndex(model_name='snippet', index=index) for index in INDEXES
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def copy_created(apps, schema_editor):
+    # Las filas existentes no se han modificado desde que se crearon (que se sepa)
+    Snippet = apps.get_model('snippets', 'Snippet')
+    Snippet.objects.update(updated=models.F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0005_snippet_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_created, migrations.RunPython.noop),
+    ]
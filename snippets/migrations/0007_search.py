@@ -0,0 +1,79 @@
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+STYLE_INDEX = models.Index(fields=['style', 'created'], name='snippet_style_created_idx')
+
+# Copias de snippets.search tal como estaban en esta migración
+TOKEN_RE = re.compile(r'\w+')
+MAX_TOKEN_LENGTH = 64
+SEARCH_INDEX_SQL = ("CREATE INDEX CONCURRENTLY IF NOT EXISTS snippet_search_idx ON %(table)s "
+                    "USING GIN (to_tsvector('simple'::regconfig, title || ' ' || code))")
+
+
+def tokenize(text):
+    return {token for token in TOKEN_RE.findall(text.lower()) if len(token) <= MAX_TOKEN_LENGTH}
+
+
+def create_search_index(apps, schema_editor):
+    Snippet = apps.get_model('snippets', 'Snippet')
+    SearchToken = apps.get_model('snippets', 'SearchToken')
+    if schema_editor.connection.vendor == 'postgresql':
+        # Índice GIN de texto completo; CONCURRENTLY para no bloquear las escrituras
+        sql = str(STYLE_INDEX.create_sql(Snippet, schema_editor))
+        schema_editor.execute(sql.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS', 1))
+        schema_editor.execute(SEARCH_INDEX_SQL % {'table': schema_editor.quote_name(Snippet._meta.db_table)})
+        return
+
+    schema_editor.add_index(Snippet, STYLE_INDEX)
+    # Índice invertido de las filas existentes
+    batch = []
+    for pk, title, code in Snippet.objects.values_list('pk', 'title', 'code').iterator():
+        batch.extend(SearchToken(token=token, snippet_id=pk) for token in tokenize('%s %s' % (title, code)))
+        if len(batch) >= 5000:
+            SearchToken.objects.bulk_create(batch)
+            batch = []
+    SearchToken.objects.bulk_create(batch)
+
+
+def drop_search_index(apps, schema_editor):
+    Snippet = apps.get_model('snippets', 'Snippet')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS snippet_search_idx')
+        schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % schema_editor.quote_name(STYLE_INDEX.name))
+    else:
+        schema_editor.remove_index(Snippet, STYLE_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('snippets', '0006_snippet_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('snippet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='snippets.Snippet')),
+            ],
+            options={
+                'unique_together': {('token', 'snippet')},
+            },
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_search_index, drop_search_index, atomic=False),
+            ],
+            state_operations=[
+                migrations.AddIndex(model_name='snippet', index=STYLE_INDEX),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def create_profiles(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    Snippet = apps.get_model('snippets', 'Snippet')
+    UserProfile = apps.get_model('snippets', 'UserProfile')
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=pk) for pk in User.objects.values_list('pk', flat=True).iterator()],
+        batch_size=1000)
+    snippets = Snippet.objects.filter(owner=OuterRef('user'))
+    UserProfile.objects.update(
+        snippet_count=Coalesce(Subquery(
+            snippets.order_by().values('owner').annotate(count=Count('pk')).values('count')), 0),
+        latest_snippet=Subquery(snippets.order_by('-created', '-pk').values('pk')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('snippets', '0007_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProfile',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snippet_profile', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('snippet_count', models.PositiveIntegerField(default=0)),
+                ('latest_snippet', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='snippets.Snippet')),
+            ],
+        ),
+        migrations.RunPython(create_profiles, migrations.RunPython.noop),
+    ]
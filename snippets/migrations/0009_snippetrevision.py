@@ -0,0 +1,49 @@
+import hashlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_keyframes(apps, schema_editor):
+    # La versión actual de cada snippet como primera revisión
+    Snippet = apps.get_model('snippets', 'Snippet')
+    SnippetRevision = apps.get_model('snippets', 'SnippetRevision')
+    revisions = []
+    for pk, code in Snippet.objects.values_list('pk', 'code').iterator():
+        revisions.append(SnippetRevision(snippet_id=pk, number=1, keyframe=1, data=code, size=len(code),
+                                         digest=hashlib.sha1(code.encode('utf-8')).hexdigest()))
+        if len(revisions) >= 1000:
+            SnippetRevision.objects.bulk_create(revisions)
+            revisions = []
+    SnippetRevision.objects.bulk_create(revisions)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0008_userprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnippetRevision',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('keyframe', models.PositiveIntegerField()),
+                ('data', models.TextField()),
+                ('digest', models.CharField(max_length=40)),
+                ('size', models.PositiveIntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('snippet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='snippets.Snippet')),
+            ],
+            options={
+                'ordering': ('number',),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='snippetrevision',
+            unique_together={('snippet', 'number')},
+        ),
+        migrations.RunPython(create_keyframes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.db import migrations, models
+
+import snippets.compression
+
+
+BATCH_SIZE = 500
+
+
+# Copias de snippets.compression y snippets.conf tal como estaban en esta migración
+def is_compressed(value):
+    return isinstance(value, str) and value[:1] == '\x01'
+
+
+def compression_threshold():
+    return getattr(settings, 'SNIPPETS', {}).get('COMPRESSION_THRESHOLD', 512)
+
+
+def rewrite_rows(apps, schema_editor, plain):
+    # Vuelve a escribir las filas grandes: el campo las comprime al guardar,
+    # salvo con `plain`, que las escribe como texto sin pasar por el campo
+    Snippet = apps.get_model('snippets', 'Snippet')
+    queryset = Snippet.objects.using(schema_editor.connection.alias)
+    threshold = compression_threshold()
+    pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pks), BATCH_SIZE):
+        rows = queryset.filter(pk__in=pks[start:start + BATCH_SIZE]).values_list('pk', 'code', 'highlighted')
+        for pk, code, highlighted in rows:
+            values = {name: value for name, value in (('code', code), ('highlighted', highlighted))
+                      if len(value) >= threshold or is_compressed(value)}
+            if plain:
+                values = {name: models.Value(value, output_field=models.TextField())
+                          for name, value in values.items()}
+            if values:
+                queryset.filter(pk=pk).update(**values)
+
+
+def compress_rows(apps, schema_editor):
+    rewrite_rows(apps, schema_editor, plain=False)
+
+
+def decompress_rows(apps, schema_editor):
+    rewrite_rows(apps, schema_editor, plain=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0009_snippetrevision'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='snippet',
+            name='code',
+            field=snippets.compression.CompressedTextField(plain_vendors=('postgresql',)),
+        ),
+        migrations.AlterField(
+            model_name='snippet',
+            name='highlighted',
+            field=snippets.compression.CompressedTextField(),
+        ),
+        migrations.RunPython(compress_rows, decompress_rows),
+    ]
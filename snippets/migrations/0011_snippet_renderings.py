@@ -0,0 +1,107 @@
+import hashlib
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+import snippets.compression
+
+
+BATCH_SIZE = 500
+
+
+# Copias de snippets.revisions, snippets.renderings y snippets.highlighting
+# tal como estaban en esta migración
+def code_digest(code):
+    return hashlib.sha1(code.encode('utf-8')).hexdigest()
+
+
+def rendering_options(language, style, linenos, title, full):
+    if not full:
+        style, title = '', ''
+    return {'language': language, 'style': style, 'linenos': bool(linenos), 'full': full, 'title': title or ''}
+
+
+def is_full_document(html):
+    return html.lstrip().startswith('<!DOCTYPE')
+
+
+def share_renderings(apps, schema_editor):
+    # Un SnippetRendering por HTML distinto, con sus referencias
+    Snippet = apps.get_model('snippets', 'Snippet')
+    SnippetRendering = apps.get_model('snippets', 'SnippetRendering')
+    alias = schema_editor.connection.alias
+    snippets = Snippet.objects.using(alias)
+    renderings, refs = {}, Counter()
+    pks = list(snippets.filter(highlight_status='ready').order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pks), BATCH_SIZE):
+        rows = snippets.filter(pk__in=pks[start:start + BATCH_SIZE]).values_list(
+            'pk', 'code', 'language', 'style', 'linenos', 'title', 'highlighted')
+        for pk, code, language, style, linenos, title, html in rows:
+            if not html:
+                continue
+            options = rendering_options(language, style, linenos, title, is_full_document(html))
+            key = (code_digest(code),) + tuple(sorted(options.items()))
+            if key not in renderings:
+                renderings[key] = SnippetRendering.objects.using(alias).create(
+                    digest=key[0], html=html, **options).pk
+            refs[renderings[key]] += 1
+            snippets.filter(pk=pk).update(rendering_id=renderings[key])
+    by_count = defaultdict(list)
+    for pk, count in refs.items():
+        by_count[count].append(pk)
+    for count, group in by_count.items():
+        for offset in range(0, len(group), BATCH_SIZE):
+            SnippetRendering.objects.using(alias).filter(pk__in=group[offset:offset + BATCH_SIZE]).update(
+                refcount=count)
+
+
+def unshare_renderings(apps, schema_editor):
+    Snippet = apps.get_model('snippets', 'Snippet')
+    snippets = Snippet.objects.using(schema_editor.connection.alias)
+    for pk, html in snippets.filter(rendering__isnull=False).values_list('pk', 'rendering__html').iterator():
+        snippets.filter(pk=pk).update(highlighted=html)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0010_compressed_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnippetRendering',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=40)),
+                ('language', models.CharField(max_length=100)),
+                ('style', models.CharField(blank=True, default='', max_length=100)),
+                ('title', models.CharField(blank=True, default='', max_length=100)),
+                ('linenos', models.BooleanField(default=False)),
+                ('full', models.BooleanField(default=False)),
+                ('html', snippets.compression.CompressedTextField()),
+                ('refcount', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='snippetrendering',
+            unique_together={('digest', 'language', 'style', 'linenos', 'full', 'title')},
+        ),
+        migrations.AddField(
+            model_name='snippet',
+            name='rendering',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='snippets', to='snippets.SnippetRendering'),
+        ),
+        # Con valor por defecto para poder volver a añadirla al deshacer la migración
+        migrations.AlterField(
+            model_name='snippet',
+            name='highlighted',
+            field=snippets.compression.CompressedTextField(blank=True, default=''),
+        ),
+        migrations.RunPython(share_renderings, unshare_renderings),
+        migrations.RemoveField(
+            model_name='snippet',
+            name='highlighted',
+        ),
+    ]
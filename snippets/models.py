@@ -1,40 +1,410 @@
-from django.db import models
-from pygments.lexers import get_all_lexers, get_lexer_by_name
-from pygments.styles import get_all_styles
-from pygments.formatters.html import HtmlFormatter
-from pygments import highlight  # Biblioteca de resaltado de códigos
+from collections import OrderedDict
 
+from django.db import models, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
 
-LEXERS = [item for item in get_all_lexers() if item[1]]
-LANGUAGE_CHOICES = sorted([(item[1][0], item[0]) for item in LEXERS])
-STYLE_CHOICES = sorted((item, item) for item in get_all_styles())
+from snippets.catalog import LANGUAGE_CHOICES, STYLE_CHOICES
+from snippets.compression import CompressedTextField
+from snippets.conf import snippets_setting
+from snippets.highlighting import highlight_cache, render, render_key, stores_full_document, variant_cache, \
+    variant_key, variant_stats
+from snippets.renderings import acquire, attach_renderings, release, release_renderings, rendering_lookup, \
+    shared_highlights
+from snippets.revisions import record_revision
+from snippets.search import index_snippet
+
+
+# Respuesta del highlight de un snippet con highlight_status 'failed'
+HIGHLIGHT_FAILED_DETAIL = 'No se ha podido resaltar el snippet.'
 
 
 class Snippet(models.Model):
+    HIGHLIGHT_PENDING = 'pending'
+    HIGHLIGHT_READY = 'ready'
+    HIGHLIGHT_FAILED = 'failed'
+    HIGHLIGHT_STATUS_CHOICES = (
+        (HIGHLIGHT_PENDING, 'pending'),
+        (HIGHLIGHT_READY, 'ready'),
+        (HIGHLIGHT_FAILED, 'failed'),
+    )
+
     created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
     title = models.CharField(max_length=100, blank=True, default='')
-    code = models.TextField()
+    # En PostgreSQL el índice de búsqueda lee la columna (y TOAST ya comprime los valores grandes)
+    code = CompressedTextField(plain_vendors=('postgresql',))
     linenos = models.BooleanField(default=False, help_text='numero de lineas del snippets')
     language = models.CharField(choices=LANGUAGE_CHOICES, default='python', max_length=100)
     style = models.CharField(choices=STYLE_CHOICES, default='friendly', max_length=100)
     owner = models.ForeignKey('auth.User', related_name='snippets', on_delete=models.CASCADE)
-    highlighted = models.TextField()
+    # HTML resaltado compartido con los snippets iguales (snippets.renderings).
+    # Las filas las borra el recuento de referencias, no la base de datos.
+    rendering = models.ForeignKey('SnippetRendering', related_name='snippets', null=True, blank=True,
+                                  editable=False, on_delete=models.DO_NOTHING)
+    highlight_status = models.CharField(choices=HIGHLIGHT_STATUS_CHOICES, default=HIGHLIGHT_READY,
+                                        max_length=10)
+    # Hash de RENDER_FIELDS con el que se generó (o se está generando) `highlighted`
+    highlight_key = models.CharField(max_length=64, blank=True, default='')
+
+    # Campos de los que depende el HTML de `highlighted`
+    RENDER_FIELDS = ('code', 'language', 'style', 'linenos', 'title')
+    # Campos que entran en la búsqueda (snippets.search)
+    SEARCH_FIELDS = ('title', 'code')
+
+    # HTML asignado y aún sin guardar en `rendering` (ver `highlighted`)
+    _highlighted = None
+    _highlighted_changed = False
 
     class Meta:
         ordering = ('created',)
+        # Índices según las consultas: listado paginado por (created, id),
+        # snippets de un usuario y filtrado por lenguaje, ambos ordenados por fecha.
+        indexes = [
+            models.Index(fields=['created', 'id'], name='snippet_created_id_idx'),
+            models.Index(fields=['owner', 'created'], name='snippet_owner_created_idx'),
+            models.Index(fields=['language', 'created'], name='snippet_language_created_idx'),
+            models.Index(fields=['style', 'created'], name='snippet_style_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Snippet, cls).from_db(db, field_names, values)
+        # Recuerda los valores cargados para saber si hay que volver a resaltar
+        instance._loaded_render_inputs = instance.render_inputs()
+        instance._loaded_owner_id = instance.__dict__.get('owner_id')
+        return instance
+
+    @property
+    def highlighted(self):
+        """
+        HTML resaltado, de su SnippetRendering ('' si no tiene).
+        """
+        if self._highlighted is not None:
+            return self._highlighted
+        if self.rendering_id is None:
+            return ''
+        return self.rendering.html
+
+    @highlighted.setter
+    def highlighted(self, html):
+        self._highlighted = html
+        self._highlighted_changed = True
+
+    def highlighted_changed(self):
+        return self._highlighted_changed
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._highlighted, self._highlighted_changed = None, False
+
+    def render_values(self):
+        return tuple(getattr(self, name) for name in self.RENDER_FIELDS)
+
+    def render_inputs(self):
+        # Con campos diferidos (.only()/.defer()) no se puede comparar
+        loaded = self.__dict__
+        if any(name not in loaded for name in self.RENDER_FIELDS):
+            return None
+        return tuple(loaded[name] for name in self.RENDER_FIELDS)
+
+    def prepare_highlight(self):
+        """
+        Actualiza `highlight_key` y, si el HTML está en la caché, `highlighted`.
+        Devuelve los valores de RENDER_FIELDS si falta resaltarlo, o None.
+        """
+        inputs = self.render_inputs()
+        loaded = getattr(self, '_loaded_render_inputs', None)
+        if (inputs is not None and inputs == loaded and self.highlight_key
+                and self.highlight_status != self.HIGHLIGHT_FAILED):
+            # Nada de lo que afecta al resaltado ha cambiado (si falló, se reintenta)
+            highlight_cache.record_skip()
+            return None
+        inputs = inputs or tuple(getattr(self, name) for name in self.RENDER_FIELDS)
+        self.highlight_key = render_key(*inputs, full=stores_full_document())
+        html = highlight_cache.get(self.highlight_key)
+        if html is not None:
+            self.set_highlighted(html)
+            return None
+        return inputs
+
+    def set_highlighted(self, html):
+        self.highlighted = html
+        self.highlight_status = self.HIGHLIGHT_READY
+
+    def mark_pending(self):
+        self.highlighted = ''
+        self.highlight_status = self.HIGHLIGHT_PENDING
+
+    def schedule_highlight(self, inputs):
+        """
+        Encola el resaltado en segundo plano para cuando se confirme la transacción.
+        """
+        from snippets.tasks import schedule_render
+        model, pk, key, full = type(self), self.pk, self.highlight_key, stores_full_document()
+        transaction.on_commit(lambda: schedule_render(model, pk, key, inputs, full=full))
 
     def save(self, *args, **kwargs):
         """
         Use the `pygments` library to create a highlighted HTML
         representation of the code snippet.
         """
-        lexer = get_lexer_by_name(self.language)
-        linenos = 'table' if self.linenos else False
-        options = {'title': self.title} if self.title else {}
-        formatter = HtmlFormatter(style=self.style, linenos=linenos,
-                                  full=True, **options)
-        self.highlighted = highlight(self.code, lexer, formatter)
-        super(Snippet, self).save(*args, **kwargs)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        loaded_key = self.highlight_key
+        inputs = self.prepare_highlight()
+        if inputs is not None:
+            # Otro snippet con el mismo código y opciones ya está resaltado
+            html = shared_highlights([inputs], stores_full_document(), using=using).get(self.highlight_key)
+            if html is not None:
+                highlight_cache.set(self.highlight_key, html)
+                self.set_highlighted(html)
+                inputs = None
+        deferred = inputs is not None and snippets_setting('HIGHLIGHT_MODE') == 'deferred'
+        if deferred:
+            self.mark_pending()
+        elif inputs is not None:
+            html = render(*inputs, full=stores_full_document())
+            highlight_cache.set(self.highlight_key, html)
+            self.set_highlighted(html)
+        loaded = getattr(self, '_loaded_render_inputs', None)
+        loaded_owner_id = getattr(self, '_loaded_owner_id', None)
+        adding = self._state.adding
+        with transaction.atomic(using=using):
+            released = attach_renderings([self], using=using)
+            super(Snippet, self).save(*args, **kwargs)
+            release_renderings(released, using=using)
+            self._loaded_render_inputs = self.render_inputs()
+            if adding or self._search_values(loaded) != self._search_values(self._loaded_render_inputs):
+                index_snippet(self, using=self._state.db, created=adding)
+            if adding or loaded is None or self._loaded_value(loaded, 'code') != self.code:
+                record_revision(self, self._loaded_value(loaded, 'code'), using=self._state.db, created=adding)
+            # Contadores de UserProfile
+            if adding:
+                UserProfile.snippet_added(self)
+            elif loaded_owner_id is not None and loaded_owner_id != self.owner_id:
+                UserProfile.refresh([loaded_owner_id, self.owner_id])
+            self._loaded_owner_id = self.owner_id
+        if deferred:
+            self.schedule_highlight(inputs)
+        if self.highlight_key != loaded_key:
+            self.schedule_variants()
 
+    def schedule_variants(self):
+        """
+        Encola el resaltado de las HIGHLIGHT_PRECOMPUTE_VARIANTS variantes más
+        pedidas (ver render_variant) para cuando se confirme la transacción.
+        """
+        count = snippets_setting('HIGHLIGHT_PRECOMPUTE_VARIANTS')
+        if not count:
+            return
+        from snippets.tasks import precompute_variants
+        inputs = self.render_values()
+        key, full, variants = self.highlight_key, stores_full_document(), variant_stats.most_common(count)
+        transaction.on_commit(lambda: precompute_variants(inputs, key, variants, full=full))
 
+    def _loaded_value(self, inputs, name):
+        return None if inputs is None else inputs[self.RENDER_FIELDS.index(name)]
 
+    def _search_values(self, inputs):
+        if inputs is None:
+            return None
+        values = dict(zip(self.RENDER_FIELDS, inputs))
+        return tuple(values[name] for name in self.SEARCH_FIELDS)
+
+    def search_text(self):
+        return ' '.join(getattr(self, name) for name in self.SEARCH_FIELDS)
+
+    @classmethod
+    def prepare_highlights(cls, snippets, using='default'):
+        """
+        Como save() para snippets que se van a guardar con bulk_create/bulk_update:
+        los que no están en la caché se resaltan en lote en el pool de
+        snippets.tasks. En modo deferred los deja pendientes y devuelve
+        [(snippet, inputs)] para llamar a schedule_highlight() tras guardarlos.
+        """
+        missing = []
+        for snippet in snippets:
+            inputs = snippet.prepare_highlight()
+            if inputs is not None:
+                missing.append((snippet, inputs))
+        # Los que ya están resaltados para otro snippet igual
+        shared = shared_highlights([inputs for _, inputs in missing], stores_full_document(), using=using)
+        for key, html in shared.items():
+            highlight_cache.set(key, html)
+        for snippet, _ in missing:
+            if snippet.highlight_key in shared:
+                snippet.set_highlighted(shared[snippet.highlight_key])
+        missing = [(snippet, inputs) for snippet, inputs in missing if snippet.highlight_key not in shared]
+        if snippets_setting('HIGHLIGHT_MODE') == 'deferred':
+            for snippet, _ in missing:
+                snippet.mark_pending()
+            return missing
+
+        from snippets.tasks import render_many
+        # Snippets idénticos se resaltan una sola vez
+        pending = OrderedDict((snippet.highlight_key, inputs) for snippet, inputs in missing)
+        rendered = dict(zip(pending, render_many(list(pending.values()), full=stores_full_document())))
+        for key, html in rendered.items():
+            highlight_cache.set(key, html)
+        for snippet, _ in missing:
+            snippet.set_highlighted(rendered[snippet.highlight_key])
+        return []
+
+    @classmethod
+    def store_highlight(cls, pk, key, html, full, using='default'):
+        """
+        Guarda el HTML de un resaltado en segundo plano si la fila sigue
+        teniendo `highlight_key` = `key`. Devuelve si se ha guardado.
+        """
+        snippets = cls.objects.using(using).filter(pk=pk, highlight_key=key)
+        with transaction.atomic(using=using):
+            row = snippets.values('rendering_id', *cls.RENDER_FIELDS).first()
+            if row is None:
+                return False
+            inputs = tuple(row[name] for name in cls.RENDER_FIELDS)
+            rendering_id, = acquire(SnippetRendering, [rendering_lookup(inputs, full, html)],
+                                    using=using)
+            updated = snippets.update(rendering_id=rendering_id, highlight_status=cls.HIGHLIGHT_READY)
+            release(SnippetRendering, [row['rendering_id'] if updated else rendering_id], using=using)
+        return bool(updated)
+
+    def render_highlighted(self):
+        """
+        Devuelve el HTML resaltado tal como se guarda (fragmento o documento
+        completo), generándolo en el momento si aún no está listo.
+        """
+        if self.highlight_status == self.HIGHLIGHT_READY:
+            return self.highlighted
+        inputs = tuple(getattr(self, name) for name in self.RENDER_FIELDS)
+        full = stores_full_document()
+        key = render_key(*inputs, full=full)
+        html = highlight_cache.get(key)
+        if html is None:
+            html = render(*inputs, full=full)
+            highlight_cache.set(key, html)
+        return html
+
+    def is_variant(self, style=None, linenos=None):
+        return (style is not None and style != self.style) or (linenos is not None and linenos != self.linenos)
+
+    def render_variant(self, style=None, linenos=None):
+        """
+        Como render_highlighted() con otro `style` o `linenos`, sin tocar la
+        fila: se resalta la primera vez y se guarda en `variant_cache`.
+        """
+        style = style or self.style
+        linenos = self.linenos if linenos is None else linenos
+        full = stores_full_document()
+        if not full and linenos == self.linenos and self.highlight_status == self.HIGHLIGHT_READY:
+            # El fragmento guardado sirve para cualquier estilo
+            return self.highlighted
+        inputs = (self.code, self.language, style, linenos, self.title)
+        version = self.highlight_key or render_key(*(getattr(self, name) for name in self.RENDER_FIELDS), full=full)
+        key = variant_key(version, style, linenos, full)
+        html = variant_cache.get(key)
+        if html is None:
+            html = render(*inputs, full=full)
+            variant_cache.set(key, html)
+        return html
+
+
+class SnippetRendering(models.Model):
+    """
+    HTML resaltado de un código con unas opciones, compartido por los
+    snippets que tienen ese código y esas opciones.
+    """
+    # sha1 del código (snippets.revisions.code_digest)
+    digest = models.CharField(max_length=40)
+    language = models.CharField(max_length=100)
+    # Vacíos en los fragmentos, que no dependen del estilo ni del título
+    style = models.CharField(max_length=100, blank=True, default='')
+    title = models.CharField(max_length=100, blank=True, default='')
+    linenos = models.BooleanField(default=False)
+    # Documento completo (HIGHLIGHT_STORAGE 'full') o fragmento
+    full = models.BooleanField(default=False)
+    html = CompressedTextField()
+    # Snippets que lo usan; se borra al llegar a 0
+    refcount = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('digest', 'language', 'style', 'linenos', 'full', 'title'),)
+
+
+class SearchToken(models.Model):
+    """
+    Índice invertido de la búsqueda en bases de datos sin texto completo
+    (SQLite): una fila por palabra distinta de cada snippet.
+    """
+    token = models.CharField(max_length=64)
+    snippet = models.ForeignKey(Snippet, related_name='search_tokens', on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = (('token', 'snippet'),)
+
+
+class SnippetRevision(models.Model):
+    """
+    Una versión del `code` de un snippet: completa (keyframe) o como delta
+    respecto a la anterior (ver snippets.revisions).
+    """
+    snippet = models.ForeignKey(Snippet, related_name='revisions', on_delete=models.CASCADE)
+    number = models.PositiveIntegerField()
+    # Número del keyframe desde el que se reconstruye (el propio si es keyframe)
+    keyframe = models.PositiveIntegerField()
+    data = models.TextField()
+    # sha1 del código y su longitud
+    digest = models.CharField(max_length=40)
+    size = models.PositiveIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('number',)
+        unique_together = (('snippet', 'number'),)
+
+    @property
+    def is_keyframe(self):
+        return self.number == self.keyframe
+
+
+class UserProfile(models.Model):
+    """
+    Resumen de los snippets de cada usuario, para no listar todos sus pks:
+    número de snippets y el último creado. Se actualiza en la misma
+    transacción que crea (Snippet.save) o borra (post_delete) el snippet.
+    """
+    user = models.OneToOneField('auth.User', related_name='snippet_profile', on_delete=models.CASCADE,
+                                primary_key=True)
+    snippet_count = models.PositiveIntegerField(default=0)
+    latest_snippet = models.ForeignKey(Snippet, related_name='+', null=True, blank=True,
+                                       on_delete=models.SET_NULL)
+
+    @classmethod
+    def snippet_added(cls, snippet):
+        updated = cls.objects.filter(user_id=snippet.owner_id).update(
+            snippet_count=F('snippet_count') + 1, latest_snippet=snippet)
+        if not updated:
+            cls.refresh([snippet.owner_id])
+
+    @classmethod
+    def snippet_deleted(cls, snippet):
+        profiles = cls.objects.filter(user_id=snippet.owner_id)
+        profiles.update(snippet_count=Greatest(F('snippet_count') - 1, 0))
+        # El borrado ya ha puesto latest_snippet a NULL (SET_NULL) si era este
+        profiles.filter(latest_snippet__isnull=True).update(latest_snippet=Subquery(
+            Snippet.objects.filter(owner=OuterRef('user')).order_by('-created', '-pk').values('pk')[:1]))
+
+    @classmethod
+    def refresh(cls, user_ids):
+        """
+        Recalcula los perfiles de `user_ids` (creándolos si falta alguno),
+        p.ej. tras un bulk_create, que no pasa por Snippet.save().
+        """
+        user_ids = set(user_ids)
+        existing = set(cls.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+        cls.objects.bulk_create([cls(user_id=user_id) for user_id in user_ids - existing])
+        snippets = Snippet.objects.filter(owner=OuterRef('user'))
+        cls.objects.filter(user_id__in=user_ids).update(
+            snippet_count=Coalesce(Subquery(
+                snippets.order_by().values('owner').annotate(count=Count('pk')).values('count')), 0),
+            latest_snippet=Subquery(snippets.order_by('-created', '-pk').values('pk')[:1]),
+        )
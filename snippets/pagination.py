@@ -0,0 +1,204 @@
+"""
+Paginación por clave (keyset) para los listados de snippets y usuarios.
+
+En lugar de `COUNT(*)` + `OFFSET`, cada página filtra a partir de los valores
+de ordenación de la última fila de la anterior (p.ej. `(created, id)` para
+Snippet), así que el coste de una página no depende de su profundidad.
+El recuento total es opcional (`?count=approximate`) y aproximado.
+
+No es la paginación por defecto: cambia la respuesta (sin `count` ni
+`?page=N`), así que se activa con
+SNIPPETS['PAGINATION_CLASS'] = 'snippets.pagination.KeysetPagination'.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from snippets.conf import snippets_setting
+
+
+class PaginationSettingMixin:
+    """
+    `pagination_class` de SNIPPETS['PAGINATION_CLASS'], leído en cada
+    petición, salvo si se pasa otra a as_view().
+    """
+    _pagination_class = None
+
+    @property
+    def pagination_class(self):
+        return self._pagination_class or import_string(snippets_setting('PAGINATION_CLASS'))
+
+    @pagination_class.setter
+    def pagination_class(self, value):
+        self._pagination_class = value
+
+
+class KeysetPagination(BasePagination):
+    """
+    La ordenación es `view.keyset_ordering` o, si no hay, la `ordering` del
+    modelo más el pk como desempate: ('created', 'pk') para Snippet.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Cursor no válido'
+
+    @property
+    def max_page_size(self):
+        return snippets_setting('PAGINATION_MAX_PAGE_SIZE')
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE
+        if self.page_size_query_param in request.query_params:
+            try:
+                page_size = _positive_int(request.query_params[self.page_size_query_param],
+                                          strict=True, cutoff=self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return page_size
+
+    def get_ordering(self, queryset, view):
+        ordering = getattr(view, 'keyset_ordering', None)
+        if ordering is None:
+            ordering = tuple(queryset.model._meta.ordering) + ('pk',)
+        fields = []
+        for name in ordering:
+            if name.startswith('-') or '__' in name:
+                raise ValueError('KeysetPagination solo admite campos ascendentes del modelo: %r' % name)
+            field = queryset.model._meta.pk if name == 'pk' else queryset.model._meta.get_field(name)
+            if field not in fields:
+                fields.append(field)
+        return fields
+
+    def encode_cursor(self, values, reverse):
+        # isoformat() directo: DjangoJSONEncoder recorta los microsegundos
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+        data = json.dumps({'v': values, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if len(data['v']) != len(self.ordering):
+                raise ValueError
+            values = [field.to_python(value) for field, value in zip(self.ordering, data['v'])]
+            return values, bool(data['r'])
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def position_filter(self, values, reverse):
+        """
+        (a, b) > (x, y)  ==>  a >= x AND (a > x OR (a = x AND b > y)); al revés
+        con `lt`. El primer término redundante permite recorrer el índice
+        (created, id) como un rango en lugar de evaluar el OR en toda la tabla.
+        """
+        lookup = 'lt' if reverse else 'gt'
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            term = Q(**{'keyset_%d__%s' % (i, lookup): values[i]})
+            for j in range(i):
+                term &= Q(**{'keyset_%d' % j: values[j]})
+            condition |= term
+        if len(self.ordering) > 1:
+            condition &= Q(**{'keyset_0__%se' % lookup: values[0]})
+        return condition
+
+    count = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.count_query_param in request.query_params:
+            self.count = approximate_count(queryset)
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    def page_queryset(self, queryset, request, view=None):
+        """
+        Queryset de la página pedida, con una fila de más para saber si hay
+        otra; las filas se pasan después a set_page(). Por separado para
+        las vistas asíncronas, que leen las filas con el ORM asíncrono.
+        """
+        self.request = request
+        self.ordering = self.get_ordering(queryset, view)
+        self.page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(request)
+
+        # Las claves van como anotaciones para leerlas aunque el queryset use only()
+        queryset = queryset.annotate(**{
+            'keyset_%d' % i: F(field.attname) for i, field in enumerate(self.ordering)
+        })
+        order = ['%skeyset_%d' % ('-' if self.reverse else '', i) for i in range(len(self.ordering))]
+        queryset = queryset.order_by(*order)
+        if self.position is not None:
+            queryset = queryset.filter(self.position_filter(self.position, self.reverse))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        position, reverse = self.position, self.reverse
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = rows
+        return rows
+
+    def _link(self, row, reverse):
+        # Instancias o dicts de .values() (camino rápido de snippets.fastpath)
+        get = row.__getitem__ if isinstance(row, dict) else row.__getattribute__
+        values = [get('keyset_%d' % i) for i in range(len(self.ordering))]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self._link(self.page[0], True)
+
+    def get_paginated_data(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return response
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+
+def approximate_count(queryset):
+    """
+    Recuento barato: en PostgreSQL, sin filtros, la estimación de pg_class;
+    en otro caso un COUNT limitado a PAGINATION_COUNT_LIMIT filas.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+    limit = snippets_setting('PAGINATION_COUNT_LIMIT')
+    return queryset.order_by()[:limit].count()
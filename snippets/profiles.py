@@ -0,0 +1,48 @@
+"""
+Contadores de snippets por usuario (UserProfile) y representación compacta
+de los usuarios.
+
+Los serializers de usuario listan los pks de todos sus snippets, así que la
+respuesta y la consulta de la relación inversa crecen con cada snippet. Con
+`?compact=1` los listados y el detalle de usuarios devuelven en su lugar el
+número de snippets, el último y el enlace al listado paginado de snippets
+del usuario (`/snippets/?owner=<id>`).
+
+UserProfile se actualiza en la misma transacción que la escritura del
+snippet: al crearlo en Snippet.save(), al borrarlo con la señal post_delete
+y en /snippets/bulk/ con UserProfile.refresh().
+"""
+from snippets.serializers import UserSummarySerializer
+
+
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    from snippets.models import UserProfile
+
+    if created and not raw:
+        UserProfile.objects.get_or_create(user=instance)
+
+
+def snippet_deleted(sender, instance, **kwargs):
+    from snippets.models import UserProfile
+
+    UserProfile.snippet_deleted(instance)
+
+
+class CompactUserMixin:
+    """
+    Para las vistas de usuarios: `?compact=1` usa `compact_serializer_class`.
+    """
+    compact_serializer_class = UserSummarySerializer
+    compact_param = 'compact'
+    compact_actions = ('list', 'retrieve')
+
+    def is_compact(self):
+        request = getattr(self, 'request', None)
+        if request is None or getattr(self, 'action', None) not in self.compact_actions:
+            return False
+        return request.query_params.get(self.compact_param, '').lower() in ('1', 'true', 'yes')
+
+    def get_serializer_class(self):
+        if self.is_compact():
+            return self.compact_serializer_class
+        return super().get_serializer_class()
@@ -0,0 +1,218 @@
+"""
+Ajuste de los querysets a los campos que declara cada serializer.
+
+`eager_load` añade los select_related/prefetch_related que necesita un
+serializer para que los listados hagan siempre el mismo número de consultas,
+sea cual sea el tamaño de la página (p.ej. `owner.username` o la relación
+inversa `snippets` de los usuarios). Con `only=True` además limita las
+columnas a las que usa el serializer, para no leer `highlighted` (ni `code`,
+si se pide con `?fields=`) en los listados JSON.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import permissions, serializers
+from rest_framework.relations import HyperlinkedIdentityField, ManyRelatedField, RelatedField
+
+
+_cache = {}
+
+
+def _walk(model, source):
+    """
+    Recorre `source` (p.ej. 'owner.username') sobre el modelo y devuelve
+    la lista de campos de relación que atraviesa y el resto de la ruta.
+    """
+    relations = []
+    attrs = source.split('.')
+    for i, attr in enumerate(attrs):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return relations, attrs[i:]
+        if not field.is_relation:
+            return relations, attrs[i:]
+        relations.append(field)
+        model = field.related_model
+    return relations, []
+
+
+def _select_path(relations):
+    # Solo las relaciones directas (FK/OneToOne) se pueden traer con un JOIN
+    path = []
+    for field in relations:
+        if field.many_to_many or field.one_to_many:
+            break
+        path.append(field.name)
+    return '__'.join(path)
+
+
+def _column(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return name if field.concrete else None
+
+
+def _pk_only_queryset(relation):
+    """
+    Queryset mínimo para prefetch de una relación de la que solo se usa el pk.
+    """
+    model = relation.related_model
+    if relation.one_to_many:
+        # Relación inversa de una FK: hace falta la FK para repartir los objetos
+        return model._default_manager.only('pk', relation.field.name)
+    return model._default_manager.only('pk')
+
+
+def _nested_relations(serializer, model, select, prefetch, prefix):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        sub_select, sub_prefetch, _ = _field_plan(field, model, prefix)
+        select.update(sub_select)
+        for path, queryset in sub_prefetch.items():
+            prefetch.setdefault(path, queryset)
+
+
+def _field_plan(field, model, prefix=''):
+    """
+    Devuelve (select_related, prefetch_related, columnas) de un campo.
+    Columnas es None si no se puede saber qué atributos del modelo lee.
+    """
+    select, prefetch, columns = set(), {}, set()
+    if isinstance(field, HyperlinkedIdentityField):
+        return select, prefetch, {field.lookup_field}
+    if field.source == '*':
+        return select, prefetch, None
+
+    source = field.source
+    relations, rest = _walk(model, source)
+    if isinstance(field, serializers.ListSerializer):
+        if relations and not rest:
+            path = prefix + source.replace('.', '__')
+            prefetch.setdefault(path, None)
+            _nested_relations(field.child, relations[-1].related_model, select, prefetch, path + '__')
+        columns = None if rest else columns
+    elif isinstance(field, serializers.BaseSerializer):
+        path = _select_path(relations)
+        if path and not rest:
+            select.add(prefix + path)
+            _nested_relations(field, relations[-1].related_model, select, prefetch, prefix + path + '__')
+        columns = None
+    elif isinstance(field, ManyRelatedField):
+        if relations and not rest:
+            path = prefix + source.replace('.', '__')
+            queryset = None
+            if not prefix and field.child_relation.use_pk_only_optimization():
+                queryset = _pk_only_queryset(relations[-1])
+            prefetch.setdefault(path, queryset)
+        else:
+            columns = None
+    elif not relations:
+        column = _column(model, source) if not rest[1:] else None
+        columns = {column} if column else None
+    else:
+        path = _select_path(relations)
+        if path != '__'.join(f.name for f in relations):
+            # Atraviesa una relación múltiple fuera de un campo many=True
+            columns = None
+        elif isinstance(field, RelatedField) and field.use_pk_only_optimization() and not rest:
+            # Los PrimaryKeyRelatedField/Hyperlinked por pk usan `owner_id` sin consultar
+            columns = {path}
+        else:
+            select.add(prefix + path)
+            columns = {path}
+            if rest:
+                column = _column(relations[-1].related_model, rest[0])
+                if column and not rest[1:]:
+                    columns.add(path + '__' + column)
+    return select, prefetch, columns
+
+
+def _serializer_plans(serializer_class, model):
+    """
+    Plan de cada campo legible de `serializer_class`; se calcula una sola vez por clase.
+    """
+    key = (serializer_class, model)
+    if key not in _cache:
+        _cache[key] = {
+            name: _field_plan(field, model)
+            for name, field in serializer_class().fields.items()
+            if not field.write_only
+        }
+    return _cache[key]
+
+
+def serializer_relations(serializer_class, model, fields=None):
+    """
+    Devuelve (select_related, prefetch_related, columnas) para `serializer_class`,
+    limitado a los campos `fields` si se indican.
+    """
+    select, prefetch, columns = set(), {}, {'pk'}
+    for name, (field_select, field_prefetch, field_columns) in _serializer_plans(serializer_class, model).items():
+        if fields is not None and name not in fields:
+            continue
+        select.update(field_select)
+        for path, queryset in field_prefetch.items():
+            prefetch.setdefault(path, queryset)
+        if columns is not None and field_columns is not None:
+            columns.update(field_columns)
+        else:
+            columns = None
+    lookups = [Prefetch(path, queryset=queryset) if queryset is not None else path
+               for path, queryset in sorted(prefetch.items())]
+    return tuple(sorted(select)), tuple(lookups), columns and tuple(sorted(columns))
+
+
+def eager_load(queryset, serializer_class, fields=None, only=False, extra_columns=()):
+    select, prefetch, columns = serializer_relations(serializer_class, queryset.model, fields)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if only and columns:
+        queryset = queryset.only(*columns, *extra_columns)
+    return queryset
+
+
+class EagerLoadingMixin:
+    """
+    Para vistas genéricas/ViewSets: carga por adelantado las relaciones
+    que usa su serializer y, en las lecturas JSON (list/retrieve), solo
+    sus columnas. Admite `?fields=id,title` para pedir menos campos.
+    """
+    sparse_fields_param = 'fields'
+    # Columnas que la vista necesita además de las del serializer
+    extra_columns = ()
+    # Acciones de ViewSet que leen solo las columnas del serializer
+    column_restricted_actions = ('list', 'retrieve')
+
+    def restrict_columns(self):
+        if self.request.method not in permissions.SAFE_METHODS:
+            return False
+        action = getattr(self, 'action', None)
+        return action is None or action in self.column_restricted_actions
+
+    def get_sparse_fields(self):
+        if not self.restrict_columns():
+            return None
+        param = self.request.query_params.get(self.sparse_fields_param)
+        if not param:
+            return None
+        fields = {name.strip() for name in param.split(',')}
+        return fields & set(_serializer_plans(self.get_serializer_class(), self.queryset.model)) or None
+
+    def get_queryset(self):
+        return eager_load(super().get_queryset(), self.get_serializer_class(),
+                          fields=self.get_sparse_fields(), only=self.restrict_columns(),
+                          extra_columns=self.extra_columns)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            target = getattr(serializer, 'child', serializer)
+            for name in set(target.fields) - fields:
+                target.fields.pop(name)
+        return serializer
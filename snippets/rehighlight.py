@@ -0,0 +1,79 @@
+"""
+Resaltado en lote de los snippets guardados (`manage.py rehighlight`).
+
+Tras actualizar pygments (cambia `render_key`) o el catálogo de estilos, el
+HTML guardado queda obsoleto. En vez de guardar los snippets de uno en uno
+con save(), se leen por lotes de pk creciente, se resaltan en paralelo en un
+pool (un render por clave distinta del lote) y se guardan en una transacción
+por lote: el HTML nuevo en su SnippetRendering (compartido, se reescribe en
+su sitio) y `rendering`/`highlight_key`/`highlight_status` de los snippets
+con bulk_update. No cambia `updated`.
+
+Por defecto solo se resaltan los snippets cuyo `highlight_key` no coincide
+con el actual o que no están listos; con `force` todos.
+"""
+from django.db import router, transaction
+
+from snippets.highlighting import highlight_cache, render_key, stores_full_document
+from snippets.models import Snippet, SnippetRendering
+from snippets.renderings import attach_renderings, release_renderings
+from snippets.tasks import render_many
+
+
+UPDATE_FIELDS = ('rendering', 'highlight_key', 'highlight_status')
+
+
+def is_stale(snippet, key):
+    return (key != snippet.highlight_key or snippet.highlight_status != Snippet.HIGHLIGHT_READY
+            or snippet.rendering_id is None)
+
+
+def rehighlight(queryset=None, chunk_size=500, after=0, force=False, executor=None):
+    """
+    Resalta los snippets de `queryset` con pk mayor que `after`. Por cada lote
+    guardado devuelve un dict con `last_pk`, `read`, `rendered` (renders
+    hechos) y `updated` (snippets guardados); se puede retomar con
+    after=last_pk del último.
+    """
+    queryset = (Snippet.objects.all() if queryset is None else queryset).only(
+        'pk', *Snippet.RENDER_FIELDS, *UPDATE_FIELDS).order_by('pk')
+    full = stores_full_document()
+    while True:
+        snippets = list(queryset.filter(pk__gt=after)[:chunk_size])
+        if not snippets:
+            return
+        after = snippets[-1].pk
+        keys = {snippet.pk: render_key(*snippet.render_values(), full=full) for snippet in snippets}
+        stale = [snippet for snippet in snippets if force or is_stale(snippet, keys[snippet.pk])]
+        inputs = {keys[snippet.pk]: snippet.render_values() for snippet in stale}
+        html = dict(zip(inputs, render_many(list(inputs.values()), full=full, executor=executor)))
+        updated = save_chunk(stale, keys, html)
+        for key, value in html.items():
+            highlight_cache.set(key, value)
+        yield {'last_pk': after, 'read': len(snippets), 'rendered': len(html), 'updated': updated}
+
+
+def save_chunk(snippets, keys, html):
+    """
+    Guarda el HTML de `snippets` en una transacción. Los que han cambiado
+    desde que se leyeron se quedan como están (su save() ya los resalta).
+    """
+    if not snippets:
+        return 0
+    db = router.db_for_write(Snippet)
+    with transaction.atomic(using=db):
+        current = {row[0]: row[1:] for row in Snippet.objects.using(db).select_for_update().filter(
+            pk__in=[snippet.pk for snippet in snippets]).values_list('pk', *Snippet.RENDER_FIELDS)}
+        snippets = [snippet for snippet in snippets if current.get(snippet.pk) == snippet.render_values()]
+        for snippet in snippets:
+            snippet.highlight_key = keys[snippet.pk]
+            snippet.set_highlighted(html[snippet.highlight_key])
+        released = attach_renderings(snippets, using=db)
+        # Los SnippetRendering ya existentes conservan el HTML anterior
+        renderings = {snippet.rendering_id: SnippetRendering(pk=snippet.rendering_id, html=snippet.highlighted)
+                      for snippet in snippets}
+        SnippetRendering.objects.using(db).bulk_update(renderings.values(), ['html'])
+        Snippet.objects.using(db).bulk_update(snippets, UPDATE_FIELDS)
+        release_renderings(released, using=db)
+    return len(snippets)
+
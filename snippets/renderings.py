@@ -0,0 +1,198 @@
+"""
+HTML resaltado compartido entre snippets: uno por (hash del código,
+language, style, linenos) (SnippetRendering).
+
+Muchos snippets son el mismo código pegado varias veces. Cada Snippet apunta
+a su SnippetRendering, que cuenta cuántos snippets lo usan (`refcount`): se
+crea o se reutiliza al guardar el snippet y se borra cuando el último deja
+de usarlo, al cambiar su código u opciones o al borrarlo (señal
+post_delete). El HTML de un mismo código y opciones se resalta y se guarda
+una sola vez.
+
+Con HIGHLIGHT_STORAGE 'fragment' el HTML no depende del estilo ni del título
+(ver snippets.highlighting), así que se comparte entre ellos; con 'full' sí
+depende y forman parte de la clave.
+
+El código se queda en la fila del snippet: el índice de búsqueda de
+PostgreSQL, los serializers y los .values() de los listados lo leen como
+columna. Lo que ocupa es el HTML, varias veces más grande que el código.
+"""
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from snippets.revisions import code_digest
+
+
+# Máximo de valores en cada `__in` (SQLite admite 999 parámetros)
+BATCH_SIZE = 500
+# Intentos si otra transacción crea o borra a la vez la misma fila
+MAX_ATTEMPTS = 5
+
+
+def rendering_options(language, style, linenos, title, full):
+    """
+    Opciones de las que depende el HTML; las que no, vacías.
+    """
+    if not full:
+        style, title = '', ''
+    return {'language': language, 'style': style, 'linenos': bool(linenos), 'full': full, 'title': title or ''}
+
+
+def rendering_lookup(inputs, full, html):
+    code, language, style, linenos, title = inputs
+    return dict(digest=code_digest(code), **rendering_options(language, style, linenos, title, full)), {'html': html}
+
+
+def _batches(values):
+    values = list(values)
+    for start in range(0, len(values), BATCH_SIZE):
+        yield values[start:start + BATCH_SIZE]
+
+
+def _find(manager, keys):
+    """
+    {clave: pk} de las filas cuyas columnas coinciden con `keys` (tuplas
+    ordenadas de (columna, valor)). Filtra por la primera columna y compara
+    el resto aquí.
+    """
+    if not keys:
+        return {}
+    names = [name for name, _ in keys[0]]
+    wanted = set(keys)
+    found = {}
+    for batch in _batches({key[0][1] for key in keys}):
+        for row in manager.filter(**{names[0] + '__in': batch}).values_list(*names, 'pk'):
+            key = tuple(zip(names, row[:-1]))
+            if key in wanted:
+                found[key] = row[-1]
+    return found
+
+
+def _key(lookup):
+    return tuple(sorted(lookup.items()))
+
+
+def acquire(model, items, using='default'):
+    """
+    Suma una referencia por cada (lookup, defaults) de `items` a la fila de
+    `model` que cumple `lookup`, y la crea con `defaults` si no existe.
+    Devuelve los pks en el mismo orden que `items`.
+    """
+    if not items:
+        return []
+    manager = model._default_manager.using(using)
+    keys = [_key(lookup) for lookup, _ in items]
+    counts = Counter(keys)
+    defaults = {key: values for key, (_, values) in zip(keys, items)}
+    pks = {}
+    for _ in range(MAX_ATTEMPTS):
+        pending = [key for key in counts if key not in pks]
+        if not pending:
+            break
+        found = _find(manager, pending)
+        missing = [key for key in pending if key not in found]
+        if missing:
+            try:
+                with transaction.atomic(using=using):
+                    manager.bulk_create([model(refcount=counts[key], **dict(key, **defaults[key]))
+                                         for key in missing])
+            except IntegrityError:
+                # Otra transacción ha creado alguna: se vuelven a buscar
+                continue
+            # SQLite no devuelve los pks del bulk_create
+            pks.update(_find(manager, missing))
+
+        by_count = defaultdict(list)
+        for key in pending:
+            if key in found:
+                by_count[counts[key]].append(key)
+        for count, group in by_count.items():
+            group_pks = [found[key] for key in group]
+            updated = manager.filter(pk__in=group_pks).update(refcount=F('refcount') + count)
+            if updated != len(group_pks):
+                # Alguna se ha borrado entre la consulta y el UPDATE: se vuelven a crear
+                alive = set(manager.filter(pk__in=group_pks).values_list('pk', flat=True))
+                group = [key for key in group if found[key] in alive]
+            pks.update({key: found[key] for key in group})
+    else:
+        raise IntegrityError('No se han podido referenciar las filas de %s' % model.__name__)
+    return [pks[key] for key in keys]
+
+
+def release(model, pks, using='default'):
+    """
+    Resta una referencia por cada pk de `pks` y borra las filas que se quedan sin ninguna.
+    """
+    counts = Counter(pk for pk in pks if pk is not None)
+    if not counts:
+        return
+    manager = model._default_manager.using(using)
+    by_count = defaultdict(list)
+    for pk, count in counts.items():
+        by_count[count].append(pk)
+    for count, group in by_count.items():
+        manager.filter(pk__in=group).update(refcount=Greatest(F('refcount') - count, 0))
+    manager.filter(pk__in=list(counts), refcount=0).delete()
+
+
+def attach_renderings(snippets, using='default'):
+    """
+    Antes de guardar `snippets` (save() o /snippets/bulk/): apunta cada uno al
+    SnippetRendering de su `highlighted` si se le ha asignado, sumando
+    referencias. Devuelve los pks de SnippetRendering que dejan de usar, para
+    release_renderings() tras guardar.
+    """
+    from snippets.highlighting import stores_full_document
+    from snippets.models import Snippet, SnippetRendering
+
+    full = stores_full_document()
+    rendering_field = Snippet._meta.get_field('rendering')
+    rendered = [snippet for snippet in snippets if snippet.highlighted_changed()]
+    with_html = [snippet for snippet in rendered if snippet.highlighted]
+    pks = dict(zip(map(id, with_html), acquire(SnippetRendering, [
+        rendering_lookup(snippet.render_values(), full, snippet.highlighted) for snippet in with_html], using)))
+    released = []
+    for snippet in rendered:
+        released.append(snippet.rendering_id)
+        snippet.rendering_id = pks.get(id(snippet))
+        snippet._highlighted_changed = False
+        if rendering_field.is_cached(snippet):
+            rendering_field.delete_cached_value(snippet)
+    return released
+
+
+def release_renderings(released, using='default'):
+    from snippets.models import SnippetRendering
+
+    release(SnippetRendering, released, using)
+
+
+def shared_highlights(inputs, full, using='default'):
+    """
+    {render_key: html} de los `inputs` (RENDER_FIELDS) que ya tienen su HTML
+    en SnippetRendering, para no volver a resaltarlos. Una consulta.
+    """
+    from snippets.highlighting import render_key
+    from snippets.models import SnippetRendering
+
+    available = {}
+    for batch in _batches({code_digest(values[0]) for values in inputs}):
+        rows = SnippetRendering.objects.using(using).filter(digest__in=batch).values_list(
+            'digest', 'language', 'style', 'linenos', 'full', 'title', 'html')
+        available.update(((digest, language, style, linenos, row_full, title), html)
+                         for digest, language, style, linenos, row_full, title, html in rows)
+    found = {}
+    for values in inputs:
+        options = rendering_options(*values[1:], full=full)
+        key = (code_digest(values[0]), options['language'], options['style'], options['linenos'], full,
+               options['title'])
+        if key in available:
+            found[render_key(*values, full=full)] = available[key]
+    return found
+
+
+def snippet_deleted(sender, instance, using='default', **kwargs):
+    release_renderings([instance.rendering_id], using=using)
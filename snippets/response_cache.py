@@ -0,0 +1,150 @@
+"""
+Caché de respuestas de los listados y de la raíz de los routers.
+
+Solo se guardan GET anónimos con renderer JSON, con la clave formada por el
+host, la ruta, los parámetros (ordenados), el renderer, la autenticación y la
+versión de cada modelo del que depende la respuesta. Guardar o borrar un
+Snippet, User o Group cambia su versión (señales post_save/post_delete), así
+que las entradas antiguas dejan de usarse sin esperar a que caduquen.
+
+El backend es un alias de CACHES (SNIPPETS['RESPONSE_CACHE_ALIAS']):
+LocMemCache (LRU, por proceso) o FileBasedCache (compartida entre procesos).
+"""
+import hashlib
+import uuid
+from functools import partial
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.routers import APIRootView, DefaultRouter
+
+from snippets.conf import snippets_setting
+
+
+# Modelos que invalidan las respuestas, por el nombre que usan las vistas en cache_dependencies
+MODELS = {
+    'snippet': 'snippets.Snippet',
+    'user': 'auth.User',
+    'group': 'auth.Group',
+}
+
+
+def response_cache():
+    alias = snippets_setting('RESPONSE_CACHE_ALIAS')
+    return caches[alias] if alias else None
+
+
+def version_cache():
+    """
+    Dónde se guardan las versiones: la caché de respuestas o, sin ella, la
+    'default' (las usan también los ETag de snippets.conditional).
+    """
+    return response_cache() or caches[DEFAULT_CACHE_ALIAS]
+
+
+def _version_key(name):
+    return 'response-version:%s' % name
+
+
+def versions(cache, names):
+    """
+    Versión actual de cada modelo. Son tokens aleatorios y no contadores:
+    si el LRU descarta una versión, la nueva no coincide con ninguna anterior.
+    """
+    keys = [_version_key(name) for name in names]
+    current = cache.get_many(keys)
+    for key in keys:
+        if key not in current:
+            cache.add(key, uuid.uuid4().hex, None)
+            current[key] = cache.get(key)
+    return [current[key] for key in keys]
+
+
+def _bump(names):
+    version_cache().set_many({_version_key(name): uuid.uuid4().hex for name in names}, None)
+
+
+def invalidate(*names):
+    """
+    Invalida las respuestas que dependen de `names` ('snippet', 'user', 'group').
+    """
+    _bump(names)
+    # Y otra vez tras el commit, por si otra petición ha guardado mientras
+    # tanto la respuesta con los datos de antes de la transacción
+    transaction.on_commit(partial(_bump, names))
+
+
+def invalidate_model(sender, **kwargs):
+    invalidate(*[name for name, label in MODELS.items() if sender._meta.label == label])
+
+
+def invalidate_m2m(sender, instance, **kwargs):
+    # User.groups: cambia la representación de usuarios y grupos
+    invalidate('user', 'group')
+
+
+def _store(cache, key, response):
+    if response.cookies:
+        return
+    cache.set(key, (response.status_code, response.content, list(response.items())),
+              snippets_setting('RESPONSE_CACHE_TIMEOUT'))
+
+
+class ResponseCacheMixin:
+    """
+    Cachea las respuestas de `list` según `cache_dependencies`.
+    """
+    cache_dependencies = ('snippet', 'user')
+
+    def is_response_cacheable(self, request):
+        return (request.method in ('GET', 'HEAD')
+                and isinstance(getattr(request, 'accepted_renderer', None), JSONRenderer)
+                and not request.user.is_authenticated)
+
+    def response_cache_key(self, request, cache):
+        params = sorted((name, value) for name, values in request.GET.lists() for value in values)
+        authenticator = getattr(request, 'successful_authenticator', None)
+        parts = (request.scheme, request.get_host(), request.path, params, request.accepted_media_type,
+                 type(authenticator).__name__, versions(cache, self.cache_dependencies))
+        return 'response:%s' % hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        cache = response_cache()
+        if cache is None or not self.is_response_cacheable(request):
+            return handler(request, *args, **kwargs)
+
+        key = self.response_cache_key(request, cache)
+        cached = cache.get(key)
+        if cached is not None:
+            status, content, headers = cached
+            response = HttpResponse(content, status=status)
+            for header, value in headers:
+                response[header] = value
+            response['X-Cache'] = 'HIT'
+            etag = response.get('ETag')
+            return get_conditional_response(request, etag=etag, response=response) if etag else response
+
+        response = handler(request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200:
+            response.add_post_render_callback(partial(_store, cache, key))
+            response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+
+class CachedAPIRootView(ResponseCacheMixin, APIRootView):
+    # La raíz solo tiene enlaces: no depende de ningún modelo
+    cache_dependencies = ()
+
+    def get(self, request, *args, **kwargs):
+        return self.cached_response(super().get, request, *args, **kwargs)
+
+
+class CachedRouter(DefaultRouter):
+    APIRootView = CachedAPIRootView
@@ -0,0 +1,121 @@
+"""
+Historial del `code` de los snippets (SnippetRevision).
+
+Cada cambio del código se guarda como un delta por líneas respecto a la
+revisión anterior y, cada REVISION_KEYFRAME_INTERVAL revisiones, el código
+completo (keyframe). Reconstruir una revisión es leer su keyframe y los
+deltas hasta ella, en una consulta, y aplicarlos: como mucho
+REVISION_KEYFRAME_INTERVAL - 1 deltas.
+
+El delta es una lista JSON de operaciones sobre las líneas de la revisión
+anterior: un entero n > 0 copia n líneas, uno negativo se salta -n líneas y
+un texto se inserta tal cual. Cada revisión guarda el hash de su código; si
+el código anterior no coincide con el de la última revisión (p.ej. tras un
+queryset.update()), la nueva revisión es un keyframe.
+"""
+import hashlib
+import json
+from difflib import SequenceMatcher
+
+from django.db.models import OuterRef, Subquery
+
+from snippets.conf import snippets_setting
+
+
+def code_digest(code):
+    return hashlib.sha1(code.encode('utf-8')).hexdigest()
+
+
+def make_delta(old, new):
+    """
+    Delta (texto JSON) que convierte `old` en `new`.
+    """
+    old_lines, new_lines = old.splitlines(True), new.splitlines(True)
+    ops = []
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append(''.join(new_lines[j1:j2]))
+    return json.dumps(ops, ensure_ascii=False, separators=(',', ':'))
+
+
+def apply_delta(old, delta):
+    lines = old.splitlines(True)
+    position, parts = 0, []
+    for op in json.loads(delta):
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            parts.extend(lines[position:position + op])
+            position += op
+        else:
+            position -= op
+    return ''.join(parts)
+
+
+def latest_revisions(snippet_ids, using='default'):
+    """
+    {snippet_id: (number, keyframe, digest)} de la última revisión de cada snippet.
+    """
+    from snippets.models import SnippetRevision
+
+    revisions = SnippetRevision.objects.using(using)
+    last = revisions.filter(snippet=OuterRef('snippet')).order_by('-number').values('number')[:1]
+    rows = revisions.filter(snippet__in=snippet_ids, number=Subquery(last)).values_list(
+        'snippet_id', 'number', 'keyframe', 'digest')
+    return {row[0]: row[1:] for row in rows}
+
+
+def record_revisions(items, using='default', created=False):
+    """
+    Guarda una revisión de cada (snippet, código anterior o None) cuyo código
+    haya cambiado, con un bulk_create. `created`: snippets recién creados.
+    """
+    from snippets.models import SnippetRevision
+
+    items = [(snippet, previous) for snippet, previous in items if previous != snippet.code]
+    if not items:
+        return []
+    latest = {} if created else latest_revisions([snippet.pk for snippet, _ in items], using)
+    interval = snippets_setting('REVISION_KEYFRAME_INTERVAL')
+    revisions = []
+    for snippet, previous in items:
+        code, digest = snippet.code, code_digest(snippet.code)
+        number, keyframe, last_digest = latest.get(snippet.pk, (0, 0, None))
+        if digest == last_digest:
+            continue
+        number += 1
+        data = None
+        if previous is not None and last_digest == code_digest(previous) and number - keyframe < interval:
+            data = make_delta(previous, code)
+            if len(data) >= len(code):
+                data = None
+        if data is None:
+            data, keyframe = code, number
+        revisions.append(SnippetRevision(snippet=snippet, number=number, keyframe=keyframe, data=data,
+                                         digest=digest, size=len(code)))
+    return SnippetRevision.objects.using(using).bulk_create(revisions)
+
+
+def record_revision(snippet, previous=None, using='default', created=False):
+    return record_revisions([(snippet, previous)], using=using, created=created)
+
+
+def reconstruct(snippet_id, number, using='default'):
+    """
+    Código de la revisión `number`, o None si no existe. Una consulta.
+    """
+    from snippets.models import SnippetRevision
+
+    revisions = SnippetRevision.objects.using(using).filter(snippet_id=snippet_id)
+    keyframe = revisions.filter(number=number).values('keyframe')
+    rows = revisions.filter(number__lte=number, number__gte=Subquery(keyframe)).order_by('number')
+    code = None
+    for revision_number, data, revision_keyframe in rows.values_list('number', 'data', 'keyframe'):
+        code = data if revision_number == revision_keyframe else apply_delta(code, data)
+    return code
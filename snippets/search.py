@@ -0,0 +1,110 @@
+"""
+Búsqueda de snippets por título y código (`?search=`) y filtros por
+`language`, `style` y `owner`.
+
+En PostgreSQL se usa un índice GIN sobre
+`to_tsvector('simple', title || ' ' || code)` (migración 0007), que la base
+de datos mantiene sola. En el resto (SQLite) hay un índice invertido propio,
+la tabla SearchToken con un (token, snippet) por palabra distinta, que se
+actualiza en Snippet.save() con la diferencia de tokens; al borrar un snippet
+se borran sus filas en cascada.
+
+En los dos casos la búsqueda es de palabras completas, sin distinguir
+mayúsculas, y un snippet tiene que contener todas las del texto buscado.
+"""
+import re
+
+from django.db import connections
+from rest_framework.filters import BaseFilterBackend
+
+
+TOKEN_RE = re.compile(r'\w+')
+MAX_TOKEN_LENGTH = 64
+
+# La misma expresión que el índice GIN: si cambia, el índice deja de usarse
+SEARCH_VECTOR_SQL = "to_tsvector('simple'::regconfig, %(table)s.title || ' ' || %(table)s.code)"
+SEARCH_INDEX_SQL = ("CREATE INDEX CONCURRENTLY IF NOT EXISTS snippet_search_idx ON %(table)s "
+                    "USING GIN (to_tsvector('simple'::regconfig, title || ' ' || code))")
+
+
+def tokenize(text):
+    return {token for token in TOKEN_RE.findall(text.lower()) if len(token) <= MAX_TOKEN_LENGTH}
+
+
+def uses_token_index(using):
+    return connections[using].vendor != 'postgresql'
+
+
+def index_snippet(snippet, using='default', created=False):
+    """
+    Actualiza las filas de SearchToken de `snippet` con las palabras que han cambiado.
+    """
+    from snippets.models import SearchToken
+
+    if not uses_token_index(using):
+        return
+    tokens = tokenize(snippet.search_text())
+    tokens_qs = SearchToken.objects.using(using).filter(snippet=snippet)
+    current = set() if created else set(tokens_qs.values_list('token', flat=True))
+    if current - tokens:
+        tokens_qs.filter(token__in=current - tokens).delete()
+    SearchToken.objects.using(using).bulk_create(
+        [SearchToken(token=token, snippet=snippet) for token in tokens - current])
+
+
+def index_snippets(snippets, using='default', created=False):
+    """
+    Como index_snippet() para un lote (bulk_create/bulk_update).
+    """
+    from snippets.models import SearchToken
+
+    if not uses_token_index(using):
+        return
+    snippets = list(snippets)
+    if not created:
+        SearchToken.objects.using(using).filter(snippet__in=snippets).delete()
+    SearchToken.objects.using(using).bulk_create([
+        SearchToken(token=token, snippet=snippet)
+        for snippet in snippets for token in tokenize(snippet.search_text())
+    ])
+
+
+def search(queryset, text):
+    """
+    Filtra `queryset` a los snippets que contienen todas las palabras de `text`.
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return queryset
+    if not uses_token_index(queryset.db):
+        table = connections[queryset.db].ops.quote_name(queryset.model._meta.db_table)
+        condition = SEARCH_VECTOR_SQL % {'table': table} + " @@ plainto_tsquery('simple'::regconfig, %s)"
+        return queryset.extra(where=[condition], params=[' '.join(sorted(tokens))])
+
+    # Intersección de las listas de cada palabra: cada una es un rango del índice (token, snippet)
+    from snippets.models import SearchToken
+    tokens_qs = SearchToken.objects.using(queryset.db)
+    for token in sorted(tokens):
+        queryset = queryset.filter(pk__in=tokens_qs.filter(token=token).values('snippet'))
+    return queryset
+
+
+class SnippetSearchFilter(BaseFilterBackend):
+    """
+    `?search=palabras`, `?language=`, `?style=` y `?owner=` (id o username).
+    """
+    search_param = 'search'
+    filter_fields = ('language', 'style')
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        filters = {name: params[name] for name in self.filter_fields if params.get(name)}
+        owner = params.get('owner')
+        if owner:
+            filters['owner' if owner.isdigit() else 'owner__username'] = owner
+        if filters:
+            queryset = queryset.filter(**filters)
+        text = params.get(self.search_param)
+        if text:
+            queryset = search(queryset, text)
+        return queryset
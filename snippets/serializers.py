@@ -1,12 +1,14 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 
+from snippets.metrics import TimedSerializerMixin
 from snippets.models import Snippet, LANGUAGE_CHOICES, STYLE_CHOICES
 
 
 # Los Serializers se usan para nuestras representaciones de datos.
 # Usando la class Serializer(BaseSerializer): de rest_framework --> serializers Tutorial1
-class SnippetSerializer(serializers.Serializer):
+class SnippetSerializer(TimedSerializerMixin, serializers.Serializer):
     id = serializers.IntegerField(read_only=True)
     title = serializers.CharField(required=False, allow_blank=True, max_length=100)
     code = serializers.CharField(style={'base_template': 'textarea.html'})
@@ -16,10 +18,30 @@ class SnippetSerializer(serializers.Serializer):
     owner = serializers.ReadOnlyField(source='owner.username')
 
 
+class BulkListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """
+    Valida cada elemento por separado: los errores quedan en `item_errors`
+    (None para los válidos) en lugar de rechazar la lista entera.
+    """
+
+    def to_internal_value(self, data):
+        validated, self.item_errors = [], []
+        for item in data:
+            try:
+                validated.append(self.child.run_validation(item))
+                self.item_errors.append(None)
+            except serializers.ValidationError as exc:
+                validated.append(None)
+                self.item_errors.append(exc.detail)
+        return validated
+
+
 # Usando la class ModelSerializer(Serializer): de rest_framework --> serializers
-class SnippetModelSerializer(serializers.ModelSerializer):
+class SnippetModelSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Snippet
+        # Para SnippetModelSerializer(many=True, data=...) en /snippets/bulk/
+        list_serializer_class = BulkListSerializer
         owner = serializers.ReadOnlyField(source='owner.username')
         fields = ('id', 'title', 'code', 'linenos', 'language', 'style', 'owner')
 
@@ -43,7 +65,7 @@ class SnippetModelSerializer(serializers.ModelSerializer):
 
 
 # Serializer de usuario tutorial 4 parte 1 el campo owner
-class UserSerializerNotOwner(serializers.ModelSerializer):
+class UserSerializerNotOwner(TimedSerializerMixin, serializers.ModelSerializer):
     snippets = serializers.PrimaryKeyRelatedField(many=True, queryset=Snippet.objects.all())
 
     class Meta:
@@ -52,7 +74,7 @@ class UserSerializerNotOwner(serializers.ModelSerializer):
 
 
 # Serializer de usuario tutorial 4 parte 2
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     snippets = serializers.PrimaryKeyRelatedField(many=True, queryset=Snippet.objects.all())
 
     class Meta:
@@ -60,6 +82,23 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'snippets', 'owner')
 
 
+class UserSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Usuario sin la lista de pks de sus snippets (`?compact=1`): el número,
+    el último y el enlace a su listado paginado.
+    """
+    snippet_count = serializers.IntegerField(source='snippet_profile.snippet_count', read_only=True)
+    latest_snippet = serializers.PrimaryKeyRelatedField(source='snippet_profile.latest_snippet', read_only=True)
+    snippets = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'snippet_count', 'latest_snippet', 'snippets')
+
+    def get_snippets(self, obj):
+        return '%s?owner=%d' % (reverse('snippet-list', request=self.context.get('request')), obj.pk)
+
+
 """
 Tutorial 5 Hyperlinked
 El HyperlinkedModelSerializer tiene las siguientes diferencias de ModelSerializer:
@@ -69,7 +108,7 @@ Las relaciones usan HyperlinkedRelatedField, en lugar de PrimaryKeyRelatedField.
 """
 
 
-class SnippetSerializerHyperLinked(serializers.HyperlinkedModelSerializer):
+class SnippetSerializerHyperLinked(TimedSerializerMixin, serializers.HyperlinkedModelSerializer):
     owner = serializers.ReadOnlyField(source='owner.username')
     highlight = serializers.HyperlinkedIdentityField(view_name='snippet-highlight', format='html')
 
@@ -80,10 +119,30 @@ class SnippetSerializerHyperLinked(serializers.HyperlinkedModelSerializer):
                   'title', 'code', 'linenos', 'language', 'style')
 
 
-class UserSerializerHyperLinked(serializers.HyperlinkedModelSerializer):
+class UserSerializerHyperLinked(TimedSerializerMixin, serializers.HyperlinkedModelSerializer):
     snippets = serializers.HyperlinkedRelatedField(many=True, view_name='snippet-detail', read_only=True)
 
     class Meta:
         model = User
         fields = ('url', 'id', 'username', 'snippets')
 
+
+class SnippetRevisionSerializer(TimedSerializerMixin, serializers.Serializer):
+    """
+    Una revisión del código (filas de .values() de SnippetRevision), sin el código.
+    """
+    url = serializers.SerializerMethodField()
+    number = serializers.IntegerField(read_only=True)
+    # Número del keyframe desde el que se reconstruye
+    keyframe = serializers.IntegerField(read_only=True)
+    size = serializers.IntegerField(read_only=True)
+    digest = serializers.CharField(read_only=True)
+    created = serializers.DateTimeField(read_only=True)
+
+    def get_url(self, row):
+        return reverse('snippet-revision', kwargs={'pk': row['snippet_id'], 'number': row['number']},
+                       request=self.context.get('request'))
+
+
+class SnippetRevisionDetailSerializer(SnippetRevisionSerializer):
+    code = serializers.CharField(read_only=True)
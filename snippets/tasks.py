@@ -0,0 +1,154 @@
+"""
+Resaltado en segundo plano de los snippets (modo HIGHLIGHT_MODE = 'deferred')
+y de las variantes más pedidas (HIGHLIGHT_PRECOMPUTE_VARIANTS).
+
+El render de `pygments` se hace en un pool de procesos (o de hilos, útil en
+los tests) y el resultado se escribe en la base de datos desde un único hilo
+escritor, para que los hilos del pool no abran conexiones. El mismo pool
+resalta los lotes de /snippets/bulk/ (`render_many`).
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from django.db import connection
+
+from snippets.conf import snippets_setting
+from snippets.highlighting import highlight_cache, render, variant_cache, variant_key
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+_writer = None
+
+
+def create_executor(workers=None):
+    """
+    Crea un pool de render según HIGHLIGHT_EXECUTOR.
+    """
+    if snippets_setting('HIGHLIGHT_EXECUTOR') == 'process':
+        try:
+            return ProcessPoolExecutor(max_workers=workers)
+        except (OSError, NotImplementedError):
+            # Plataformas sin soporte de multiprocessing
+            logger.warning('ProcessPoolExecutor no disponible, se usan hilos')
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='highlight')
+
+
+def get_executor():
+    """
+    Devuelve el pool de render, creándolo la primera vez.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = create_executor(snippets_setting('HIGHLIGHT_WORKERS'))
+        return _executor
+
+
+def _get_writer():
+    global _writer
+    with _lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='highlight-writer')
+        return _writer
+
+
+def shutdown(wait=True):
+    """
+    Cierra los pools (p.ej. al terminar los tests).
+    """
+    global _executor, _writer
+    with _lock:
+        executor, writer = _executor, _writer
+        _executor = _writer = None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+    if writer is not None:
+        writer.shutdown(wait=wait)
+
+
+def _render(inputs, full):
+    return render(*inputs, full=full)
+
+
+def render_many(inputs, full=True, executor=None):
+    """
+    Resalta varios snippets en paralelo (lotes de /snippets/bulk/ y
+    `manage.py rehighlight`) y devuelve el HTML en el mismo orden que `inputs`.
+    """
+    if len(inputs) < 2:
+        return [_render(values, full) for values in inputs]
+    chunksize = max(1, len(inputs) // (4 * (os.cpu_count() or 1)))
+    executor = executor or get_executor()
+    return list(executor.map(partial(_render, full=full), inputs, chunksize=chunksize))
+
+
+def schedule_render(model, pk, key, inputs, full=True, attempt=0):
+    """
+    Encola el resaltado de la fila `pk`; se llama tras su commit.
+
+    `inputs` son los valores de `model.RENDER_FIELDS` y `key` su hash. Si el
+    render falla se vuelve a encolar hasta HIGHLIGHT_RETRIES veces y después
+    la fila queda en HIGHLIGHT_FAILED.
+    """
+    future = get_executor().submit(render, *inputs, full=full)
+    future.add_done_callback(partial(_render_done, model, pk, key, inputs, full, attempt))
+    return future
+
+
+def _render_done(model, pk, key, inputs, full, attempt, future):
+    _get_writer().submit(_store, model, pk, key, inputs, full, attempt, future)
+
+
+def _store(model, pk, key, inputs, full, attempt, future):
+    # Si la fila ha cambiado desde que se encoló, su clave ya no coincide
+    # y este resultado se descarta.
+    try:
+        try:
+            html = future.result()
+        except Exception:
+            if attempt < snippets_setting('HIGHLIGHT_RETRIES'):
+                logger.warning('Error resaltando el snippet %s, se reintenta', pk, exc_info=True)
+                schedule_render(model, pk, key, inputs, full=full, attempt=attempt + 1)
+                return
+            logger.exception('Error resaltando el snippet %s', pk)
+            model.objects.filter(pk=pk, highlight_key=key).update(highlight_status=model.HIGHLIGHT_FAILED)
+        else:
+            highlight_cache.set(key, html)
+            model.store_highlight(pk, key, html, full)
+    finally:
+        connection.close()
+
+
+def precompute_variants(inputs, version, variants, full=True):
+    """
+    Resalta en el pool las variantes (style, linenos) de un snippet que aún
+    no están en `variant_cache`; `inputs` son sus RENDER_FIELDS y `version`
+    su highlight_key. No escribe en la base de datos.
+    """
+    code, language, style, linenos, title = inputs
+    futures, seen = [], set()
+    for variant_style, variant_linenos in variants:
+        if variant_linenos == linenos and (variant_style == style or not full):
+            # La propia, o con 'fragment' el fragmento guardado sirve para cualquier estilo
+            continue
+        key = variant_key(version, variant_style, variant_linenos, full)
+        if key in seen or variant_cache.get(key) is not None:
+            continue
+        seen.add(key)
+        future = get_executor().submit(render, code, language, variant_style, variant_linenos, title, full=full)
+        future.add_done_callback(partial(_variant_done, key))
+        futures.append(future)
+    return futures
+
+
+def _variant_done(key, future):
+    try:
+        variant_cache.set(key, future.result())
+    except Exception:
+        logger.exception('Error resaltando una variante')
@@ -1,3 +1,1540 @@
-from django.test import TestCase
+import datetime
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import json
+from concurrent.futures import Future
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.utils import ConnectionHandler, OperationalError
+from django.core.cache import caches
+from django.contrib.auth.models import Group
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import AdminRenderer, BrowsableAPIRenderer, JSONRenderer
+
+from snippets.compression import PREFIX, compress, decompress, zstandard
+from snippets.db.pool import ConnectionPool, PoolTimeout, close_pools
+from snippets.db.routers import ReplicaRouter
+from snippets.export import export_snippets
+from snippets import catalog, tasks
+from snippets.fastpath import FastJSONRenderer, values_plan
+from snippets.highlighting import highlight_cache, render, variant_cache, variant_stats
+from snippets.metrics import registry
+from snippets.models import SearchToken, Snippet, SnippetRendering, SnippetRevision, UserProfile
+from snippets.revisions import apply_delta, code_digest, make_delta, reconstruct
+from snippets.serializers import SnippetModelSerializer, SnippetSerializer, SnippetSerializerHyperLinked
+from snippets.serializers import UserSerializerNotOwner
+from snippets.throttling import LocalBucketStore, SQLiteBucketStore, TokenBucketThrottle, get_store, take
+from snippets.views import SnippetViewSetT6
+
+
+# Los cubos del throttle duran todo el proceso: sin límite salvo en ThrottleTests
+# Paginación por clave de SnippetViewSetT6/UserViewSetT6 (por defecto van por páginas)
+KEYSET = {'PAGINATION_CLASS': 'snippets.pagination.KeysetPagination'}
+
+_no_throttle = override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={}))
+
+
+def setUpModule():
+    _no_throttle.enable()
+
+
+def tearDownModule():
+    _no_throttle.disable()
+
+
+class QueryCountTests(TestCase):
+    """
+    Los listados tienen que hacer el mismo número de consultas
+    con pocos o con muchos usuarios y snippets (sin N+1).
+    """
+
+    def add_data(self, users, snippets_per_user):
+        start = User.objects.count()
+        for i in range(start, start + users):
+            user = User.objects.create(username='user%d' % i)
+            for j in range(snippets_per_user):
+                Snippet.objects.create(owner=user, title='s%d' % j, code='print(%d)' % j)
+
+    def assertConstantQueries(self, url, num):
+        for users, snippets_per_user in ((1, 1), (4, 3)):
+            self.add_data(users, snippets_per_user)
+            with self.assertNumQueries(num):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    # Listados sin paginar: una sola consulta con el JOIN de owner
+    def test_snippet_list_t1(self):
+        self.assertConstantQueries('/snippets/t1/list/', 1)
+
+    def test_snippet_list_t2(self):
+        self.assertConstantQueries('/snippets/t2/list/', 1)
+
+    def test_snippet_list_t3p1(self):
+        self.assertConstantQueries('/snippets/t3p1/list', 1)
+
+    # Listados paginados: COUNT + página
+    def test_snippet_list_t3p2(self):
+        self.assertConstantQueries('/snippets/t3p2/list/', 2)
+
+    def test_snippet_list_t3p3(self):
+        self.assertConstantQueries('/snippets/t3p3/list/', 2)
+
+    def test_snippet_list_t5(self):
+        self.assertConstantQueries('/snippets/t5/', 2)
+
+    def test_snippet_list_t6(self):
+        self.assertConstantQueries('/snippets/t6/', 2)
+
+    def test_snippet_list_router(self):
+        self.assertConstantQueries('/snippets/', 2)
+
+    # Con la paginación por clave no hay COUNT
+    @override_settings(SNIPPETS=KEYSET)
+    def test_snippet_list_keyset(self):
+        self.assertConstantQueries('/snippets/', 1)
+
+    # Usuarios: COUNT + página + prefetch de `snippets`
+    def test_user_list_t4(self):
+        self.assertConstantQueries('/users/t4/p1/list/', 3)
+        self.assertConstantQueries('/users/t4/p2/list/', 3)
+
+    def test_user_list_t5(self):
+        self.assertConstantQueries('/users/t5/', 3)
+
+    def test_user_list_t6(self):
+        self.assertConstantQueries('/users/t6/', 3)
+
+    def test_user_list_router(self):
+        self.assertConstantQueries('/users/', 3)
+
+    @override_settings(SNIPPETS=KEYSET)
+    def test_user_list_keyset(self):
+        self.assertConstantQueries('/users/', 2)
+
+    def test_snippet_detail(self):
+        self.add_data(1, 1)
+        snippet = Snippet.objects.get()
+        with self.assertNumQueries(1):
+            self.client.get('/snippets/t2/detail/%d/' % snippet.pk)
+        with self.assertNumQueries(1):
+            self.client.get('/snippets/%d/' % snippet.pk)
+
+
+class DeferredColumnsTests(TestCase):
+    """
+    Los listados y detalles JSON no leen `highlighted`; `?fields=` limita el resto.
+    """
+
+    def setUp(self):
+        user = User.objects.create(username='user')
+        self.snippet = Snippet.objects.create(owner=user, title='t', code='print(1)')
+
+    def select_sql(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries if 'snippets_snippet' in q['sql'] and 'COUNT' not in q['sql']]
+
+    def test_list_and_detail_skip_highlighted(self):
+        for url in ('/snippets/t1/list/', '/snippets/t6/', '/snippets/%d/' % self.snippet.pk):
+            sql = self.select_sql(url)
+            self.assertTrue(sql)
+            self.assertNotIn('snippets_snippetrendering', ' '.join(sql))
+
+    def test_highlight_reads_highlighted(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/snippets/%d/highlight/' % self.snippet.pk)
+        self.assertContains(response, 'class="highlight"')
+
+    def test_sparse_fields(self):
+        response = self.client.get('/snippets/%d/?fields=id,title' % self.snippet.pk)
+        self.assertEqual(response.json(), {'id': self.snippet.pk, 'title': 't'})
+        sql = ' '.join(self.select_sql('/snippets/?fields=id,title'))
+        self.assertNotIn('"code"', sql)
+
+
+class CatalogTests(SimpleTestCase):
+    """
+    Las choices de lenguajes y estilos salen de catalog.json si es de la
+    versión de pygments instalada, sin recorrer sus registros.
+    """
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'catalog.json')
+        self.addCleanup(lambda: os.path.exists(self.path) and os.remove(self.path))
+        call_command('build_catalog', output=self.path, stdout=StringIO())
+
+    def load(self):
+        with override_settings(SNIPPETS={'CATALOG_PATH': self.path}), \
+                mock.patch('snippets.catalog.build_catalog', wraps=catalog.build_catalog) as built:
+            return catalog.load_catalog(), built.called
+
+    def test_precomputed(self):
+        loaded, built = self.load()
+        self.assertFalse(built)
+        self.assertEqual(loaded, catalog.build_catalog())
+        self.assertIn(['python', 'Python'], loaded['languages'])
+        self.assertIn(('monokai', 'monokai'), Snippet._meta.get_field('style').choices)
+
+    def test_rebuilt(self):
+        # De otra versión de pygments, o ilegible
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'pygments': '0.0', 'languages': [], 'styles': []}, f)
+        loaded, built = self.load()
+        self.assertTrue(built)
+        self.assertIn('monokai', loaded['styles'])
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{')
+        self.assertTrue(self.load()[1])
+
+
+@override_settings(SNIPPETS={'HIGHLIGHT_CACHE_ALIAS': None})
+class HighlightCacheTests(TestCase):
+    """
+    save() solo vuelve a resaltar si cambia algo de RENDER_FIELDS.
+    """
+
+    def setUp(self):
+        highlight_cache.clear()
+        user = User.objects.create(username='user')
+        self.snippet = Snippet.objects.create(owner=user, title='t', code='print(1)')
+
+    def counters(self):
+        stats = highlight_cache.stats()
+        return stats['hits'], stats['misses'], stats['skips']
+
+    def test_unchanged_inputs_skip(self):
+        self.assertEqual(self.counters(), (0, 1, 0))
+        snippet = Snippet.objects.get(pk=self.snippet.pk)
+        with mock.patch('snippets.models.render') as rendered:
+            snippet.save()
+            self.snippet.save()
+        self.assertFalse(rendered.called)
+        self.assertEqual(self.counters(), (0, 1, 2))
+
+    def test_changed_inputs(self):
+        self.snippet.code = 'print(2)'
+        with mock.patch('snippets.models.render', wraps=render) as rendered:
+            self.snippet.save()
+        self.assertEqual(rendered.call_count, 1)
+        self.assertEqual(self.counters(), (0, 2, 0))
+        # Volver al código anterior lo encuentra en la caché
+        self.snippet.code = 'print(1)'
+        self.snippet.save()
+        self.assertEqual(self.counters(), (1, 2, 0))
+        self.assertEqual(highlight_cache.stats()['size'], 2)
+
+
+@override_settings(SNIPPETS=KEYSET)
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create(username='user')
+        # Mismo `created` en varias filas para probar el desempate por id
+        Snippet.objects.create(owner=user, code='0')
+        created = Snippet.objects.get().created
+        for i in range(1, 7):
+            Snippet.objects.create(owner=user, code=str(i))
+        Snippet.objects.filter(code__in=['2', '3', '4']).update(created=created)
+        self.expected = [s.code for s in Snippet.objects.order_by('created', 'pk')]
+
+    def walk(self, url, link):
+        codes = []
+        for _ in range(10):
+            if not url:
+                break
+            data = self.client.get(url).json()
+            codes.extend(item['code'] for item in data['results'])
+            url = data[link]
+        return codes, data
+
+    def test_next_and_previous(self):
+        codes, last_page = self.walk('/snippets/?page_size=3', 'next')
+        self.assertEqual(codes, self.expected)
+        self.assertIsNotNone(last_page['previous'])
+        previous = self.client.get(last_page['previous']).json()
+        self.assertEqual([item['code'] for item in previous['results']], self.expected[3:6])
+
+    def test_max_page_size_and_count(self):
+        with self.settings(SNIPPETS=dict(KEYSET, PAGINATION_MAX_PAGE_SIZE=4)):
+            data = self.client.get('/snippets/?page_size=50&count=approximate').json()
+        self.assertEqual(len(data['results']), 4)
+        self.assertEqual(data['count'], 7)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/snippets/?cursor=nope').status_code, 404)
+
+
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN de las consultas frecuentes: fallan si recorren entera la tabla
+    de snippets en lugar de usar un índice (SQLite o PostgreSQL).
+    """
+    table = 'snippets_snippet'
+
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        for i in range(5):
+            Snippet.objects.create(owner=self.user, code='print(%d)' % i)
+
+    def explain(self, sql, params=()):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Con tablas tan pequeñas el planificador siempre prefiere el seq scan
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql, params)
+            else:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [str(row[-1]) for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, sql, params=()):
+        plan = self.explain(sql, params)
+        if connection.vendor == 'postgresql':
+            self.assertFalse([line for line in plan if 'Seq Scan on %s' % self.table in line], plan)
+        else:
+            full_scans = [line for line in plan
+                          if line.strip() == 'SCAN %s' % self.table or 'TEMP B-TREE' in line]
+            self.assertFalse(full_scans, plan)
+
+    def assertEndpointUsesIndex(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and self.table in q['sql']]
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertUsesIndex(sql)
+        return response
+
+    @override_settings(SNIPPETS=KEYSET)
+    def test_keyset_pages(self):
+        data = self.assertEndpointUsesIndex('/snippets/?page_size=2').json()
+        data = self.assertEndpointUsesIndex(data['next']).json()
+        self.assertEndpointUsesIndex(data['previous'])
+
+    def test_owner_snippets(self):
+        queryset = Snippet.objects.filter(owner=self.user).order_by('created', 'pk')[:10]
+        self.assertUsesIndex(*queryset.query.sql_with_params())
+
+    def test_language_filter(self):
+        queryset = Snippet.objects.filter(language='python').order_by('created', 'pk')[:10]
+        self.assertUsesIndex(*queryset.query.sql_with_params())
+
+    def test_search(self):
+        self.assertEndpointUsesIndex('/snippets/?search=print+1&style=friendly')
+
+
+class ConditionalGetTests(TestCase):
+    """
+    ETag / Last-Modified: un 304 no carga el objeto ni serializa.
+    """
+
+    def setUp(self):
+        user = User.objects.create(username='user')
+        self.snippet = Snippet.objects.create(owner=user, title='t', code='print(1)')
+
+    def assertNotModified(self, url, num_queries=1):
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(num_queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        return etag
+
+    def test_detail(self):
+        url = '/snippets/%d/' % self.snippet.pk
+        etag = self.assertNotModified(url)
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        # Otro renderer u otros ?fields= no comparten ETag
+        self.assertNotEqual(self.client.get(url + '?fields=id')['ETag'], etag)
+
+        self.snippet.title = 'nuevo'
+        self.snippet.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_highlight(self):
+        url = '/snippets/%d/highlight/' % self.snippet.pk
+        etag = self.assertNotModified(url)
+        self.assertEqual(self.client.get('/snippets/t5/%d/highlight/' % self.snippet.pk,
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Cambiar solo el título regenera el HTML (aparece en el documento)
+        self.snippet.title = 'nuevo'
+        self.snippet.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(SNIPPETS={'RESPONSE_CACHE_ALIAS': None})
+    def test_list(self):
+        etag = self.assertNotModified('/snippets/', 2)
+        Snippet.objects.create(owner=self.snippet.owner, code='print(2)')
+        self.assertEqual(self.client.get('/snippets/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(SNIPPETS={'RESPONSE_CACHE_ALIAS': None})
+    def test_owner_renamed(self):
+        # SnippetSerializer saca owner.username, que no cambia `updated`
+        urls = ['/snippets/t5/', '/snippets/t5/%d/' % self.snippet.pk, '/snippets/t6/%d/' % self.snippet.pk]
+        if django.VERSION >= (3, 1):
+            urls.append('/async/snippets/%d/' % self.snippet.pk)
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.snippet.owner.username = 'otro'
+        self.snippet.owner.save()
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertContains(self.client.get(urls[1]), '"owner":"otro"')
+
+
+class StyleCssTests(TestCase):
+    """
+    /snippets/styles/<style>.css: una hoja por estilo con ETag.
+    """
+
+    def test_etag(self):
+        response = self.client.get('/snippets/styles/monokai.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/css; charset=utf-8')
+        self.assertIn('public', response['Cache-Control'])
+        etag = response['ETag']
+        response = self.client.get('/snippets/styles/monokai.css', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+        self.assertEqual(self.client.get('/snippets/styles/friendly.css', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get('/snippets/styles/nope.css').status_code, 404)
+
+
+class DataMigrationTests(TransactionTestCase):
+    """
+    Migraciones de datos, hacia delante y al deshacerlas.
+    """
+
+    def migrate(self, name):
+        targets = [('snippets', name)]
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_models_match_migrations(self):
+        # Las choices salen de catalog.json: al regenerarlo puede hacer falta una migración
+        call_command('makemigrations', 'snippets', check=True, dry_run=True, stdout=StringIO())
+
+    def test_highlighted_fragments(self):
+        # 0004 vuelve a resaltar las filas como fragmento, y como documento completo al deshacerla
+        apps = self.migrate('0003_snippet_highlight_status')
+        owner = apps.get_model('auth', 'User').objects.create(username='user')
+        inputs = ('print(1)', 'python', 'monokai', True, 't')
+        apps.get_model('snippets', 'Snippet').objects.create(
+            owner_id=owner.pk, code=inputs[0], language=inputs[1], style=inputs[2], linenos=inputs[3],
+            title=inputs[4], highlighted=render(*inputs), highlight_key='')
+
+        row = self.migrate('0004_highlighted_fragments').get_model('snippets', 'Snippet').objects.get()
+        self.assertEqual(row.highlighted, render(*inputs, full=False))
+        self.assertEqual((len(row.highlight_key), row.highlight_status), (64, 'ready'))
+
+        row = self.migrate('0003_snippet_highlight_status').get_model('snippets', 'Snippet').objects.get()
+        self.assertEqual(row.highlighted, render(*inputs))
+        self.assertNotEqual(row.highlight_key, '')
+
+    def test_search_tokens(self):
+        # 0007 indexa las filas que ya existían
+        apps = self.migrate('0006_snippet_updated')
+        owner = apps.get_model('auth', 'User').objects.create(username='user')
+        snippet = apps.get_model('snippets', 'Snippet').objects.create(
+            owner_id=owner.pk, code='print(Hola)', title='Saludo', highlighted='')
+
+        apps = self.migrate('0007_search')
+        tokens = apps.get_model('snippets', 'SearchToken').objects.filter(snippet_id=snippet.pk)
+        self.assertEqual(set(tokens.values_list('token', flat=True)), {'saludo', 'print', 'hola'})
+
+    def test_compressed_text(self):
+        # 0010 comprime las filas grandes y las deja como texto al deshacerla
+        apps = self.migrate('0009_snippetrevision')
+        owner = apps.get_model('auth', 'User').objects.create(username='user')
+        code = 'print(1)\n' * 200
+        snippet = apps.get_model('snippets', 'Snippet').objects.create(owner_id=owner.pk, code=code, highlighted='')
+
+        def stored_code():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT code FROM snippets_snippet WHERE id = %s', [snippet.pk])
+                return cursor.fetchone()[0]
+
+        self.migrate('0010_compressed_text')
+        self.assertTrue(stored_code().startswith(PREFIX))
+        self.migrate('0009_snippetrevision')
+        self.assertEqual(stored_code(), code)
+
+    def test_snippet_renderings(self):
+        # 0011 pasa `highlighted` a un SnippetRendering por código y opciones, y lo devuelve al deshacerla
+        apps = self.migrate('0010_compressed_text')
+        owner = apps.get_model('auth', 'User').objects.create(username='user')
+        for title in ('a', 'b'):
+            apps.get_model('snippets', 'Snippet').objects.create(owner_id=owner.pk, code='x', title=title,
+                                                                 highlighted='<div>x</div>')
+
+        apps = self.migrate('0011_snippet_renderings')
+        rendering = apps.get_model('snippets', 'SnippetRendering').objects.get()
+        self.assertEqual((rendering.digest, rendering.refcount, rendering.html, rendering.title),
+                         (code_digest('x'), 2, '<div>x</div>', ''))
+        self.assertEqual(set(apps.get_model('snippets', 'Snippet').objects.values_list('rendering_id', flat=True)),
+                         {rendering.pk})
+
+        apps = self.migrate('0010_compressed_text')
+        self.assertEqual(list(apps.get_model('snippets', 'Snippet').objects.values_list('highlighted', flat=True)),
+                         ['<div>x</div>'] * 2)
+
+
+class HighlightVariantTests(TestCase):
+    """
+    ?style=&linenos= en el highlight: la variante no escribe en la fila y se
+    resalta una sola vez.
+    """
+
+    def setUp(self):
+        highlight_cache.clear()
+        variant_cache.clear()
+        variant_stats.clear()
+        user = User.objects.create(username='user')
+        self.snippet = Snippet.objects.create(owner=user, title='t', code='print(1)')
+        self.url = '/snippets/%d/highlight/' % self.snippet.pk
+
+    def get(self, query, renders=0, url=None):
+        with mock.patch('snippets.models.render', wraps=render) as rendered:
+            response = self.client.get((url or self.url) + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(rendered.call_count, renders)
+        return response
+
+    def test_style(self):
+        with self.assertNumQueries(1):
+            response = self.get('?style=monokai')
+        self.assertContains(response, '/snippets/styles/monokai.css')
+        self.assertEqual(self.get('?style=monokai', url='/snippets/t5/%d/highlight/' % self.snippet.pk).content,
+                         response.content)
+        # La fila no cambia
+        self.assertEqual(Snippet.objects.get(pk=self.snippet.pk).updated, self.snippet.updated)
+
+    def test_linenos(self):
+        response = self.get('?linenos=true&style=monokai', renders=1)
+        self.assertContains(response, 'linenos')
+        self.assertEqual(self.get('?linenos=true&style=monokai').content, response.content)
+        # Con 'fragment' el estilo no cambia el fragmento
+        self.assertContains(self.get('?linenos=1&style=vim'), 'linenos')
+
+    @override_settings(SNIPPETS={'HIGHLIGHT_STORAGE': 'full'})
+    def test_full_document(self):
+        self.snippet.save()
+        self.get('?style=monokai', renders=1)
+        self.get('?style=monokai')
+        self.assertEqual(self.get('?style=friendly').content, self.get('').content)
+
+    def test_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        variant = self.client.get(self.url + '?style=monokai')['ETag']
+        self.assertNotEqual(variant, etag)
+        self.assertEqual(self.client.get(self.url + '?style=friendly')['ETag'], etag)
+        self.assertEqual(self.client.get(self.url + '?style=monokai', HTTP_IF_NONE_MATCH=variant).status_code, 304)
+
+    def test_invalid(self):
+        self.assertEqual(self.client.get(self.url + '?style=nope').status_code, 400)
+        self.assertEqual(self.client.get(self.url + '?linenos=maybe').status_code, 400)
+
+    @override_settings(SNIPPETS={'HIGHLIGHT_PRECOMPUTE_VARIANTS': 2, 'HIGHLIGHT_EXECUTOR': 'thread'})
+    def test_precompute(self):
+        self.get('?linenos=true', renders=1)
+        tasks.shutdown()
+        with mock.patch('django.db.transaction.on_commit', lambda func: func()):
+            other = Snippet.objects.create(owner=self.snippet.owner, code='print(2)')
+        tasks.shutdown()
+        self.get('?linenos=true', url='/snippets/%d/highlight/' % other.pk)
+
+
+class SnippetRevisionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        code = ''.join('line_%d = %d\n' % (i, i) for i in range(20))
+        self.snippet = Snippet.objects.create(owner=self.user, code=code)
+        self.versions = [self.snippet.code]
+
+    def edit(self, count):
+        for i in range(count):
+            lines = self.snippet.code.splitlines(True)
+            lines[i % len(lines)] = 'x%d = %d\n' % (i, i)
+            self.snippet.code = ''.join(lines + ['c%d = %d\n' % (i, i)])
+            self.snippet.save()
+            self.versions.append(self.snippet.code)
+
+    def test_delta(self):
+        for old, new in (('', 'a\n'), ('a\nb\nc', 'a\nc\nd'), ('a\n', ''), ('ñ\r\nb', 'ñ\r\nb\r\nc')):
+            self.assertEqual(apply_delta(old, make_delta(old, new)), new)
+
+    @override_settings(SNIPPETS={'REVISION_KEYFRAME_INTERVAL': 4})
+    def test_keyframes(self):
+        self.edit(9)
+        revisions = list(self.snippet.revisions.all())
+        self.assertEqual([r.number for r in revisions], list(range(1, 11)))
+        self.assertEqual([r.number for r in revisions if r.is_keyframe], [1, 5, 9])
+        # Los deltas son más pequeños que el código
+        self.assertTrue(all(len(r.data) < r.size for r in revisions if not r.is_keyframe))
+        for number, code in enumerate(self.versions, 1):
+            with self.assertNumQueries(1):
+                self.assertEqual(reconstruct(self.snippet.pk, number), code)
+        self.assertIsNone(reconstruct(self.snippet.pk, 11))
+
+    def test_unchanged(self):
+        self.snippet.title = 'otro'
+        self.snippet.save()
+        self.assertEqual(self.snippet.revisions.count(), 1)
+        # Un update() se salta el historial: la siguiente revisión es un keyframe
+        Snippet.objects.filter(pk=self.snippet.pk).update(code='z = 0\n')
+        self.snippet.refresh_from_db()
+        self.edit(1)
+        self.assertTrue(self.snippet.revisions.last().is_keyframe)
+        self.assertEqual(reconstruct(self.snippet.pk, 2), self.versions[-1])
+
+    def test_bulk(self):
+        self.client.force_login(self.user)
+        response = self.client.patch('/snippets/bulk/', json.dumps([{'id': self.snippet.pk, 'code': self.snippet.code + 'a = 3\n'}]),
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        revision = self.snippet.revisions.last()
+        self.assertEqual((revision.number, revision.is_keyframe), (2, False))
+        self.assertEqual(reconstruct(self.snippet.pk, 2), Snippet.objects.get(pk=self.snippet.pk).code)
+
+    def test_endpoints(self):
+        self.edit(2)
+        url = '/snippets/%d/revisions/' % self.snippet.pk
+        data = self.client.get(url).json()
+        self.assertEqual([r['number'] for r in data['results']], [1, 2])
+        self.assertNotIn('code', data['results'][0])
+        self.assertTrue(data['results'][1]['url'].endswith(url + '2/'))
+
+        response = self.client.get(url + '3/')
+        self.assertEqual(response.json()['code'], self.versions[2])
+        self.assertEqual(response.json()['keyframe'], 1)
+        self.assertEqual(self.client.get(url + '3/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url + '4/').status_code, 404)
+        self.assertEqual(self.client.get('/snippets/0/revisions/').status_code, 404)
+        # Borrar el snippet borra su historial
+        self.snippet.delete()
+        self.assertFalse(SnippetRevision.objects.exists())
+
+
+class CompressionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+
+    def stored(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT code, html FROM snippets_snippet'
+                           ' JOIN snippets_snippetrendering ON snippets_snippetrendering.id = rendering_id'
+                           ' WHERE snippets_snippet.id = %s', [pk])
+            return cursor.fetchone()
+
+    def test_round_trip(self):
+        for text in ('', 'corto', 'x = "ñ"\n' * 200, PREFIX + 'z'):
+            value = compress(text, threshold=64)
+            self.assertEqual(decompress(value), text)
+        self.assertEqual(compress('corto', threshold=64), 'corto')
+        # Si no se reduce, se guarda tal cual
+        random_text = ''.join(chr(0x4e00 + (i * 7919) % 20000) for i in range(100))
+        self.assertEqual(compress(random_text, threshold=0), random_text)
+
+    @unittest.skipUnless(zstandard, 'zstandard no está instalado')
+    def test_zstd(self):
+        value = compress('x = 1\n' * 200, threshold=0)
+        self.assertTrue(value.startswith(PREFIX + 's'))
+        self.assertEqual(decompress(value), 'x = 1\n' * 200)
+
+    def test_field(self):
+        code = 'def f(x):\n    return x * 2\n' * 100
+        snippet = Snippet.objects.create(owner=self.user, code=code)
+        stored_code, stored_html = self.stored(snippet.pk)
+        self.assertTrue(stored_code.startswith(PREFIX))
+        self.assertTrue(stored_html.startswith(PREFIX))
+        self.assertLess(len(stored_html), len(snippet.highlighted) / 4)
+
+        loaded = Snippet.objects.get(pk=snippet.pk)
+        self.assertEqual((loaded.code, loaded.highlighted), (code, snippet.highlighted))
+        self.assertEqual(Snippet.objects.values_list('code', flat=True).get(pk=snippet.pk), code)
+        self.assertEqual(self.client.get('/snippets/%d/' % snippet.pk).json()['code'], code)
+        self.assertContains(self.client.get('/snippets/%d/highlight/' % snippet.pk), snippet.highlighted)
+        # update() también comprime
+        Snippet.objects.filter(pk=snippet.pk).update(code=code + '# fin\n')
+        self.assertTrue(self.stored(snippet.pk)[0].startswith(PREFIX))
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).code, code + '# fin\n')
+
+    @override_settings(SNIPPETS={'COMPRESSION_THRESHOLD': 10 ** 6})
+    def test_threshold(self):
+        snippet = Snippet.objects.create(owner=self.user, code='print(1)\n' * 100)
+        self.assertEqual(self.stored(snippet.pk), (snippet.code, snippet.highlighted))
+        # Un texto que empieza por PREFIX siempre se comprime
+        snippet = Snippet.objects.create(owner=self.user, code=PREFIX + 'zabc')
+        self.assertNotEqual(self.stored(snippet.pk)[0], PREFIX + 'zabc')
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).code, PREFIX + 'zabc')
+
+
+class SnippetContentsTests(TestCase):
+    """
+    Los snippets con el mismo código y opciones comparten SnippetRendering,
+    que se borra al dejar de usarlo.
+    """
+
+    def setUp(self):
+        highlight_cache.clear()
+        self.user = User.objects.create(username='user')
+        self.client.force_login(self.user)
+
+    def refcounts(self):
+        return list(SnippetRendering.objects.order_by('pk').values_list('refcount', flat=True))
+
+    def test_shared(self):
+        first = Snippet.objects.create(owner=self.user, title='a', code='print(1)')
+        highlight_cache.clear()
+        with mock.patch('snippets.models.render', wraps=render) as rendered:
+            second = Snippet.objects.create(owner=self.user, title='b', code='print(1)', style='monokai')
+        self.assertEqual(rendered.call_count, 0)
+        self.assertEqual(first.rendering_id, second.rendering_id)
+        self.assertEqual(self.refcounts(), [2])
+        # Otras opciones, otro resaltado del mismo código
+        third = Snippet.objects.create(owner=self.user, code='print(1)', linenos=True)
+        self.assertNotEqual(third.rendering_id, first.rendering_id)
+        self.assertEqual(self.refcounts(), [2, 1])
+        self.assertEqual(Snippet.objects.get(pk=second.pk).highlighted, first.highlighted)
+
+    def test_edit_and_delete(self):
+        first = Snippet.objects.create(owner=self.user, code='print(1)')
+        second = Snippet.objects.create(owner=self.user, code='print(1)')
+        second.code = 'print(2)'
+        second.save()
+        self.assertEqual(self.refcounts(), [1, 1])
+        self.assertIn('2', Snippet.objects.get(pk=second.pk).highlighted)
+        # Cambiar el título no cambia el resaltado compartido
+        first.title = 'otro'
+        first.save()
+        self.assertEqual(self.refcounts(), [1, 1])
+        first.delete()
+        self.assertEqual(list(SnippetRendering.objects.values_list('pk', flat=True)), [second.rendering_id])
+        self.user.delete()
+        self.assertEqual(self.refcounts(), [])
+
+    def test_bulk(self):
+        response = self.client.post('/snippets/bulk/', json.dumps([{'code': 'x = 1'}] * 3 + [{'code': 'y = 2'}]),
+                                    content_type='application/json')
+        pks = [item['data']['id'] for item in response.json()['results']]
+        self.assertEqual(self.refcounts(), [3, 1])
+        self.client.patch('/snippets/bulk/', json.dumps([{'id': pks[0], 'code': 'y = 2'}]),
+                          content_type='application/json')
+        self.assertEqual(self.refcounts(), [2, 2])
+        self.client.generic('DELETE', '/snippets/bulk/', json.dumps(pks[:3]), content_type='application/json')
+        self.assertEqual(self.refcounts(), [1])
+
+    @override_settings(SNIPPETS={'HIGHLIGHT_MODE': 'deferred'})
+    def test_deferred(self):
+        with mock.patch('snippets.models.Snippet.schedule_highlight'):
+            snippet = Snippet.objects.create(owner=self.user, code='print(1)')
+        self.assertEqual((snippet.highlight_status, snippet.rendering_id), (Snippet.HIGHLIGHT_PENDING, None))
+        html = render('print(1)', 'python', 'friendly', False, '', full=False)
+        self.assertFalse(Snippet.store_highlight(snippet.pk, 'otra', html, False))
+        self.assertTrue(Snippet.store_highlight(snippet.pk, snippet.highlight_key, html, False))
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).highlighted, html)
+        # Otro snippet igual ya no espera al resaltado
+        other = Snippet.objects.create(owner=self.user, code='print(1)')
+        self.assertEqual((other.highlight_status, other.rendering_id),
+                         (Snippet.HIGHLIGHT_READY, Snippet.objects.get(pk=snippet.pk).rendering_id))
+        self.assertEqual(self.refcounts(), [2])
+
+
+@override_settings(SNIPPETS={'HIGHLIGHT_MODE': 'deferred'})
+class DeferredHighlightTests(TestCase):
+    """
+    Resaltado en segundo plano: 202 mientras está pendiente, tasks._store
+    guarda el resultado o, tras HIGHLIGHT_RETRIES fallos, marca la fila 'failed'.
+    """
+
+    def setUp(self):
+        highlight_cache.clear()
+        user = User.objects.create(username='user')
+        with mock.patch('snippets.models.Snippet.schedule_highlight'):
+            self.snippet = Snippet.objects.create(owner=user, code='print(1)')
+        self.inputs = self.snippet.render_values()
+        self.url = '/snippets/t6/%d/highlight/' % self.snippet.pk
+
+    def store(self, key, result=None, error=None, attempt=0):
+        future = Future()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        with mock.patch('snippets.tasks.connection'), mock.patch('snippets.tasks.logger'):
+            tasks._store(Snippet, self.snippet.pk, key, self.inputs, False, attempt, future)
+        return Snippet.objects.get(pk=self.snippet.pk)
+
+    def test_pending(self):
+        self.assertEqual(self.snippet.highlight_status, Snippet.HIGHLIGHT_PENDING)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_store(self):
+        html = render(*self.inputs, full=False)
+        snippet = self.store(self.snippet.highlight_key, html)
+        self.assertEqual((snippet.highlight_status, snippet.highlighted), (Snippet.HIGHLIGHT_READY, html))
+        self.assertEqual(highlight_cache.get(self.snippet.highlight_key), html)
+        self.assertContains(self.client.get(self.url), html)
+
+    def test_stale_key(self):
+        # El snippet ha cambiado mientras se resaltaba
+        snippet = self.store('otra', '<pre>viejo</pre>')
+        self.assertEqual((snippet.highlight_status, snippet.rendering_id), (Snippet.HIGHLIGHT_PENDING, None))
+
+    def test_retry(self):
+        with mock.patch('snippets.tasks.schedule_render') as schedule:
+            snippet = self.store(self.snippet.highlight_key, error=ValueError('pygments'))
+        schedule.assert_called_once_with(Snippet, self.snippet.pk, self.snippet.highlight_key, self.inputs,
+                                         full=False, attempt=1)
+        self.assertEqual(snippet.highlight_status, Snippet.HIGHLIGHT_PENDING)
+
+    def test_failed(self):
+        with mock.patch('snippets.tasks.schedule_render') as schedule:
+            snippet = self.store(self.snippet.highlight_key, error=ValueError('pygments'), attempt=2)
+        self.assertFalse(schedule.called)
+        self.assertEqual(snippet.highlight_status, Snippet.HIGHLIGHT_FAILED)
+        # No se vuelve a llamar a pygments en cada petición
+        with mock.patch('snippets.models.render') as rendered:
+            response = self.client.get(self.url)
+            self.assertEqual(self.client.get(self.url + '?style=monokai').status_code, 422)
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(rendered.called)
+        # Guardarlo de nuevo lo vuelve a encolar
+        with mock.patch('snippets.models.Snippet.schedule_highlight') as schedule:
+            snippet.save()
+        self.assertTrue(schedule.called)
+        self.assertEqual(snippet.highlight_status, Snippet.HIGHLIGHT_PENDING)
+
+
+@override_settings(SNIPPETS={'HIGHLIGHT_EXECUTOR': 'thread'})
+class RehighlightTests(TestCase):
+    """
+    `manage.py rehighlight` vuelve a resaltar los snippets obsoletos por lotes.
+    """
+
+    def setUp(self):
+        highlight_cache.clear()
+        self.user = User.objects.create(username='user')
+        # Los dos primeros y el cuarto comparten código, los dos últimos son 'text'
+        self.snippets = [Snippet.objects.create(owner=self.user, code='print(%d)' % (i % 3),
+                                                language='text' if i > 3 else 'python') for i in range(6)]
+
+    def make_stale(self, snippets):
+        Snippet.objects.filter(pk__in=[s.pk for s in snippets]).update(highlight_key='antigua')
+        SnippetRendering.objects.filter(snippets__in=snippets).update(html='<div>antiguo</div>')
+
+    def rehighlight(self, *args, **options):
+        out = StringIO()
+        with mock.patch('snippets.tasks.render', wraps=render) as rendered:
+            call_command('rehighlight', *args, chunk_size=2, stdout=out, **options)
+        return rendered.call_count, out.getvalue()
+
+    def test_stale(self):
+        self.make_stale(self.snippets[:4])
+        renders, out = self.rehighlight()
+        # Un render por clave distinta de cada lote de dos
+        self.assertEqual(renders, 4)
+        self.assertIn('4 snippets guardados', out)
+        for snippet in Snippet.objects.all():
+            self.assertNotEqual(snippet.highlight_key, 'antigua')
+            self.assertNotIn('antiguo', snippet.highlighted)
+        self.assertEqual(self.rehighlight()[0], 0)
+        self.assertEqual(self.rehighlight('--all')[0], 6)
+        self.assertEqual(list(SnippetRendering.objects.order_by('pk').values_list('refcount', flat=True)),
+                         [2, 1, 1, 1, 1])
+
+    def test_filters(self):
+        self.make_stale(self.snippets)
+        self.rehighlight(language=['text'])
+        stale = Snippet.objects.filter(highlight_key='antigua')
+        self.assertEqual(stale.count(), 4)
+        self.rehighlight(owner=['otro'])
+        self.assertEqual(stale.count(), 4)
+        self.rehighlight(owner=['user'], style=['friendly'])
+        self.assertEqual(stale.count(), 0)
+
+    def test_checkpoint(self):
+        self.make_stale(self.snippets)
+        path = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+        with open(path, 'w') as f:
+            json.dump({'filters': {}, 'force': False, 'last_pk': self.snippets[1].pk, 'done': 2}, f)
+        _, out = self.rehighlight(checkpoint=path)
+        self.assertIn('6/6 snippets', out)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(list(Snippet.objects.filter(highlight_key='antigua').values_list('pk', flat=True)),
+                         [s.pk for s in self.snippets[:2]])
+        with open(path, 'w') as f:
+            json.dump({'filters': {}, 'force': False, 'last_pk': 0, 'done': 0}, f)
+        with self.assertRaises(CommandError):
+            self.rehighlight(checkpoint=path, language=['python'])
+
+
+class BulkTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.other = User.objects.create(username='other')
+        self.client.force_login(self.user)
+
+    def bulk(self, method, data, **kwargs):
+        response = getattr(self.client, method)('/snippets/bulk/', json.dumps(data),
+                                                content_type='application/json', **kwargs)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [item['status'] for item in response.json()['results']], response.json()['results']
+
+    def test_create(self):
+        statuses, results = self.bulk('post', [
+            {'code': 'print(1)', 'title': 'a'},
+            {'code': 'print(2)', 'language': 'nope'},
+            {'code': 'print(1)', 'title': 'a'},
+        ])
+        self.assertEqual(statuses, [201, 400, 201])
+        self.assertIn('language', results[1]['errors'])
+        snippet = Snippet.objects.get(pk=results[0]['data']['id'])
+        self.assertEqual(snippet.owner, self.user)
+        self.assertIn('class="highlight"', snippet.highlighted)
+        self.assertEqual(Snippet.objects.count(), 2)
+
+    @unittest.skipUnless(connection.features.can_return_rows_from_bulk_insert, 'sin RETURNING en bulk_create')
+    def test_create_single_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            statuses, results = self.bulk('post', [{'code': 'print(%d)' % i} for i in range(20)])
+        self.assertEqual(statuses, [201] * 20)
+        inserts = [q['sql'] for q in queries if q['sql'].startswith('INSERT INTO "snippets_snippet"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(len({item['data']['id'] for item in results}), 20)
+
+    def test_create_ndjson(self):
+        body = '{"code": "print(1)"}\n\n{"code": "print(2)"}\n'
+        response = self.client.post('/snippets/t6/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual([item['status'] for item in response.json()['results']], [201, 201])
+        response = self.client.post('/snippets/bulk/', '{"code": ', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_and_delete(self):
+        mine = Snippet.objects.create(owner=self.user, code='print(1)')
+        theirs = Snippet.objects.create(owner=self.other, code='print(2)')
+        statuses, results = self.bulk('patch', [
+            {'id': mine.pk, 'code': 'print(3)'},
+            {'id': theirs.pk, 'code': 'print(4)'},
+            {'id': 0, 'code': 'print(5)'},
+            {'code': 'print(6)'},
+            {'id': mine.pk, 'language': 'nope'},
+        ])
+        self.assertEqual(statuses, [200, 403, 404, 400, 400])
+        mine.refresh_from_db()
+        self.assertEqual(mine.code, 'print(3)')
+        self.assertIn('print', mine.highlighted)
+        self.assertEqual(Snippet.objects.get(pk=theirs.pk).code, 'print(2)')
+
+        statuses, _ = self.bulk('delete', [mine.pk, {'id': theirs.pk}])
+        self.assertEqual(statuses, [204, 403])
+        self.assertEqual(list(Snippet.objects.values_list('pk', flat=True)), [theirs.pk])
+
+    def test_requires_list(self):
+        response = self.client.post('/snippets/bulk/', {'code': 'x'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create(username='user')
+        for i in range(5):
+            Snippet.objects.create(owner=user, title='ñ%d' % i, code='print(%d)' % i)
+        self.expected = [SnippetModelSerializer(s).data for s in Snippet.objects.order_by('pk')]
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get('/snippets/export/').status_code, 403)
+        self.client.force_login(User.objects.get(username='user'))
+        self.assertEqual(self.client.get('/snippets/export/').status_code, 403)
+
+    def test_endpoint(self):
+        self.client.force_login(User.objects.create(username='staff', is_staff=True))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/snippets/export/')
+            body = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in body.splitlines()], self.expected)
+        self.assertNotIn('snippets_snippetrendering', ' '.join(q['sql'] for q in queries))
+
+        response = self.client.get('/snippets/export/?format=json')
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), self.expected)
+        self.assertEqual(self.client.get('/snippets/export/?format=xml').status_code, 400)
+
+    def test_chunks(self):
+        self.assertEqual(list(export_snippets('json', queryset=Snippet.objects.none())), ['[]'])
+        chunks = list(export_snippets('json', chunk_size=2))
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(json.loads(''.join(chunks)), self.expected)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_snippets', chunk_size=2, stdout=out)
+        self.assertEqual([json.loads(line) for line in out.getvalue().splitlines()], self.expected)
+
+
+class FastPathTests(TestCase):
+    """
+    El camino rápido (.values() + FastJSONRenderer) da los mismos bytes que los serializers.
+    """
+    urls = ('/snippets/t1/list/', '/snippets/t2/list/', '/snippets/t3p1/list', '/snippets/t3p2/list/',
+            '/snippets/t3p3/list/', '/snippets/?page_size=3', '/snippets/?fields=id,owner',
+            '/users/t4/p1/list/', '/users/t6/', '/users/')
+
+    def setUp(self):
+        users = [User.objects.create(username='user%d' % i) for i in range(3)]
+        User.objects.create(username='sin snippets')
+        for i in range(7):
+            Snippet.objects.create(owner=users[i % 2], title='ñ "%d"   <b>' % i,
+                                   code='print(%d)\n\t\x01' % i, linenos=i % 2 == 0)
+
+    def test_same_output(self):
+        for url in self.urls:
+            fast = self.client.get(url).content
+            with mock.patch('snippets.fastpath.values_plan', return_value=None), \
+                    mock.patch('snippets.fastpath.orjson', None):
+                slow = self.client.get(url).content
+            self.assertEqual(fast, slow, url)
+
+    def test_plans(self):
+        self.assertIsNotNone(values_plan(SnippetSerializer, Snippet))
+        self.assertIsNotNone(values_plan(UserSerializerNotOwner, User))
+        self.assertIsNone(values_plan(SnippetSerializerHyperLinked, Snippet))
+
+    def test_renderer(self):
+        data = [{'a': 'ñ  \x00\x7f"\\', 'b': [1, True, None]}, {'c': datetime.datetime(2020, 1, 2)},
+                {1: 'clave no str'}]
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_renderer_classes(self):
+        # Los de la vista, cambiando solo el JSONRenderer
+        self.assertEqual([type(renderer) for renderer in SnippetViewSetT6().get_renderers()],
+                         [FastJSONRenderer, BrowsableAPIRenderer])
+
+        class View(SnippetViewSetT6):
+            renderer_classes = (AdminRenderer, JSONRenderer)
+
+        self.assertEqual([type(renderer) for renderer in View().get_renderers()], [AdminRenderer, FastJSONRenderer])
+        self.assertEqual(self.client.get('/snippets/', HTTP_ACCEPT='text/html').status_code, 200)
+
+
+@override_settings(SNIPPETS={'RESPONSE_CACHE_ALIAS': 'responses'},
+                   CACHES={'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                         'LOCATION': 'tests'}})
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.user = User.objects.create(username='user')
+        self.snippet = Snippet.objects.create(owner=self.user, code='print(1)')
+
+    def assertCached(self, url, **headers):
+        first = self.client.get(url, **headers)
+        with self.assertNumQueries(0):
+            second = self.client.get(url, **headers)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.content, second.content)
+        return second
+
+    def test_lists_and_root(self):
+        for url in ('/snippets/', '/snippets/t5/', '/users/', '/users/t5/', '/', '/groups/'):
+            self.assertCached(url)
+        # Otros parámetros u otro renderer son otra entrada
+        self.assertEqual(self.client.get('/snippets/?page_size=1')['X-Cache'], 'MISS')
+        self.assertNotIn('X-Cache', self.client.get('/snippets/?format=api'))
+
+    def test_invalidation(self):
+        self.assertCached('/snippets/')
+        self.assertCached('/users/')
+        self.snippet.title = 'nuevo'
+        self.snippet.save()
+        self.assertContains(self.client.get('/snippets/'), 'nuevo')
+        self.assertEqual(self.client.get('/users/')['X-Cache'], 'MISS')
+
+        self.assertCached('/groups/')
+        self.user.groups.add(Group.objects.create(name='g'))
+        self.assertEqual(self.client.get('/groups/')['X-Cache'], 'MISS')
+
+        self.snippet.delete()
+        self.assertEqual(self.client.get('/snippets/').json()['results'], [])
+
+    def test_authenticated_not_cached(self):
+        self.client.force_login(self.user)
+        self.client.get('/snippets/')
+        self.assertNotIn('X-Cache', self.client.get('/snippets/'))
+
+    def test_bulk_invalidates(self):
+        self.assertCached('/snippets/')
+        self.client.force_login(self.user)
+        self.client.patch('/snippets/bulk/', json.dumps([{'id': self.snippet.pk, 'title': 'bulk'}]),
+                          content_type='application/json')
+        self.client.logout()
+        self.assertContains(self.client.get('/snippets/'), 'bulk')
+
+    def test_not_modified(self):
+        etag = self.client.get('/snippets/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/snippets/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.other = User.objects.create(username='other')
+        self.a = Snippet.objects.create(owner=self.user, title='Hola mundo', code='print("hola")')
+        self.b = Snippet.objects.create(owner=self.other, title='Otro', code='def mundo(): pass',
+                                        language='python3', style='monokai')
+
+    def search(self, query):
+        response = self.client.get('/snippets/?' + query)
+        self.assertEqual(response.status_code, 200)
+        return sorted(item['id'] for item in response.json()['results'])
+
+    def test_search(self):
+        self.assertEqual(self.search('search=MUNDO'), [self.a.pk, self.b.pk])
+        self.assertEqual(self.search('search=hola mundo'), [self.a.pk])
+        self.assertEqual(self.search('search=nada'), [])
+
+    def test_filters(self):
+        self.assertEqual(self.search('language=python3'), [self.b.pk])
+        self.assertEqual(self.search('style=monokai&search=mundo'), [self.b.pk])
+        self.assertEqual(self.search('owner=user'), [self.a.pk])
+        self.assertEqual(self.search('owner=%d' % self.other.pk), [self.b.pk])
+
+    def test_index_maintenance(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('PostgreSQL usa el índice GIN')
+        self.a.code = 'adios'
+        self.a.save()
+        self.assertEqual(self.search('search=hola'), [self.a.pk])
+        self.assertEqual(self.search('search=adios'), [self.a.pk])
+        self.a.title = 'fin'
+        self.a.save()
+        self.assertEqual(self.search('search=hola'), [])
+        self.a.delete()
+        self.assertFalse(SearchToken.objects.filter(token='adios').exists())
+
+        self.client.force_login(self.user)
+        self.client.post('/snippets/bulk/', json.dumps([{'code': 'bulkword'}]), content_type='application/json')
+        self.client.logout()
+        self.assertEqual(len(self.search('search=bulkword')), 1)
+
+
+class UserProfileTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.other = User.objects.create(username='other')
+
+    def profile(self, user):
+        return UserProfile.objects.get(user=user)
+
+    def test_counters(self):
+        first = Snippet.objects.create(owner=self.user, code='1')
+        second = Snippet.objects.create(owner=self.user, code='2')
+        profile = self.profile(self.user)
+        self.assertEqual((profile.snippet_count, profile.latest_snippet_id), (2, second.pk))
+
+        second.delete()
+        profile = self.profile(self.user)
+        self.assertEqual((profile.snippet_count, profile.latest_snippet_id), (1, first.pk))
+
+        first.owner = self.other
+        first.save()
+        self.assertEqual(self.profile(self.user).snippet_count, 0)
+        self.assertIsNone(self.profile(self.user).latest_snippet_id)
+        self.assertEqual(self.profile(self.other).snippet_count, 1)
+
+    def test_bulk(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/snippets/bulk/', json.dumps([{'code': 'a'}, {'code': 'b'}]),
+                                    content_type='application/json')
+        last = response.json()['results'][-1]['data']['id']
+        profile = self.profile(self.user)
+        self.assertEqual((profile.snippet_count, profile.latest_snippet_id), (2, last))
+
+        self.client.generic('DELETE', '/snippets/bulk/', json.dumps([last]), content_type='application/json')
+        self.assertEqual(self.profile(self.user).snippet_count, 1)
+
+    def test_compact(self):
+        snippet = Snippet.objects.create(owner=self.user, code='1')
+        response = self.client.get('/users/%d/?compact=1' % self.user.pk)
+        self.assertEqual(response.json(), {
+            'id': self.user.pk, 'username': 'user', 'snippet_count': 1, 'latest_snippet': snippet.pk,
+            'snippets': 'http://testserver/snippets/?owner=%d' % self.user.pk,
+        })
+        self.assertIn('snippets', self.client.get('/users/%d/' % self.user.pk).json())
+
+    @override_settings(SNIPPETS={'RESPONSE_CACHE_ALIAS': None})
+    # Con la paginación por clave, para leer todos los usuarios con ?page_size=
+    @override_settings(SNIPPETS=KEYSET)
+    def test_compact_queries(self):
+        for i in range(3):
+            Snippet.objects.create(owner=self.user, code=str(i))
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/users/?compact=1&page_size=50')
+        for i in range(5):
+            User.objects.create(username='user%d' % i)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get('/users/?compact=1&page_size=50')
+        self.assertEqual(len(response.json()['results']), 7)
+        self.assertEqual(len(few), len(many))
+
+
+@override_settings(SNIPPETS={'METRICS_ENABLED': True})
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        registry.clear()
+        highlight_cache.clear()
+        self.user = User.objects.create(username='user')
+
+    def test_metrics(self):
+        self.client.force_login(self.user)
+        self.client.post('/snippets/', json.dumps({'code': 'print(1)', 'owner': self.user.pk}),
+                         content_type='application/json')
+        self.client.get('/snippets/')
+        text = self.client.get('/metrics').content.decode()
+        view = 'view="snippets.views.SnippetViewSetT6:snippet-list"'
+        self.assertIn('http_requests_total{%s,method="POST",status="201"} 1' % view, text)
+        self.assertIn('http_request_duration_seconds_count{%s} 2' % view, text)
+        self.assertIn('highlight_duration_seconds_count{%s} 1' % view, text)
+        self.assertIn('serializer_duration_seconds_count{%s} 2' % view, text)
+        self.assertIn('db_queries_per_request_bucket{%s,le="+Inf"} 2' % view, text)
+
+    def test_allowed_ips(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 404)
+        with override_settings(SNIPPETS={'METRICS_ENABLED': True, 'METRICS_ALLOWED_IPS': ['10.0.0.1']}):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 200)
+        with override_settings(SNIPPETS={}):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(SNIPPETS={'METRICS_ENABLED': True, 'METRICS_SERVER_TIMING': True,
+                                 'RESPONSE_CACHE_ALIAS': None})
+    def test_server_timing(self):
+        Snippet.objects.create(owner=self.user, code='1')
+        response = self.client.get('/snippets/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", serializer;dur=[\d.]+, total;dur=')
+
+    def test_no_server_timing(self):
+        self.assertFalse(self.client.get('/snippets/').has_header('Server-Timing'))
+
+
+# Las vistas asíncronas siempre paginan por clave
+@unittest.skipUnless(django.VERSION >= (3, 1), 'las vistas asíncronas requieren Django 3.1')
+@override_settings(SNIPPETS=KEYSET)
+class AsyncViewsTests(TestCase):
+
+    def setUp(self):
+        highlight_cache.clear()
+        self.user = User.objects.create(username='user')
+        self.snippets = [Snippet.objects.create(owner=self.user, title='s%d' % i, code='print(%d)' % i)
+                         for i in range(3)]
+
+    def assertSameResponse(self, path, query=''):
+        sync = self.client.get('/%s%s' % (path, query))
+        response = self.client.get('/async/%s%s' % (path, query))
+        self.assertEqual(response.status_code, 200)
+        # Los enlaces de paginación apuntan a la propia ruta /async/
+        self.assertEqual(response.content.replace(b'/async/', b'/'), sync.content)
+        return sync, response
+
+    def test_same_as_sync(self):
+        sync, response = self.assertSameResponse('snippets/', '?page_size=2&count=1')
+        self.assertEqual(response['ETag'], sync['ETag'])
+        self.assertSameResponse('snippets/', '?cursor=' + sync.json()['next'].split('cursor=')[1])
+        self.assertSameResponse('snippets/', '?fields=id,title')
+        sync, response = self.assertSameResponse('snippets/%d/' % self.snippets[0].pk)
+        self.assertEqual(response['ETag'], sync['ETag'])
+        self.assertSameResponse('users/')
+        self.assertSameResponse('users/%d/' % self.user.pk)
+
+    def test_not_modified(self):
+        for path in ('/async/snippets/', '/async/snippets/%d/' % self.snippets[0].pk,
+                     '/async/snippets/%d/highlight/' % self.snippets[0].pk):
+            etag = self.client.get(path)['ETag']
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            if 'highlight' in path:
+                self.assertNotIn('"code"', queries[0]['sql'])
+
+    def test_highlight(self):
+        path = 'snippets/%d/highlight/' % self.snippets[0].pk
+        for query in ('', '?style=monokai', '?linenos=true&style=vim'):
+            sync = self.client.get('/' + path + query)
+            response = self.client.get('/async/' + path + query)
+            self.assertEqual(response.content, sync.content)
+            self.assertEqual(response['ETag'], sync['ETag'])
+        self.assertEqual(self.client.get('/async/' + path + '?style=nope').status_code, 400)
+
+    def test_highlight_defers_code(self):
+        path = '/async/snippets/%d/highlight/' % self.snippets[0].pk
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"code"', queries[0]['sql'])
+        # Una variante que hay que resaltar lee el código aparte
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(path + '?linenos=true').status_code, 200)
+        self.assertEqual(len(queries), 2)
+
+    def test_highlight_failed(self):
+        Snippet.objects.filter(pk=self.snippets[0].pk).update(highlight_status=Snippet.HIGHLIGHT_FAILED)
+        with mock.patch('snippets.models.render') as rendered:
+            response = self.client.get('/async/snippets/%d/highlight/' % self.snippets[0].pk)
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(rendered.called)
+
+    @override_settings(SNIPPETS={'HIGHLIGHT_PENDING_RESPONSE': 'render', 'HIGHLIGHT_EXECUTOR': 'thread'})
+    def test_highlight_pending(self):
+        snippet = self.snippets[0]
+        Snippet.objects.filter(pk=snippet.pk).update(rendering=None, highlight_status=Snippet.HIGHLIGHT_PENDING)
+        response = self.client.get('/async/snippets/%d/highlight/' % snippet.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('print', response.content.decode())
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_errors(self):
+        self.assertEqual(self.client.get('/async/snippets/0/').status_code, 404)
+        self.assertEqual(self.client.get('/async/snippets/?cursor=x').status_code, 404)
+        self.assertEqual(self.client.post('/async/snippets/').status_code, 405)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        self.name = os.path.join(directory, 'pool.sqlite3')
+        self.addCleanup(lambda: os.path.exists(self.name) and os.remove(self.name))
+        self.addCleanup(close_pools)
+
+    def connect(self):
+        import sqlite3
+        return sqlite3.connect(self.name, check_same_thread=False)
+
+    def check(self, connection):
+        connection.execute('SELECT 1')
+
+    def reset(self, connection):
+        connection.rollback()
+
+    def test_wrapper_reuses_connection(self):
+        databases = {'default': {}, 'pooled': {
+            'ENGINE': 'snippets.db.sqlite3', 'NAME': self.name, 'POOL': {'SIZE': 1, 'TIMEOUT': 0.05},
+        }}
+        wrapper = ConnectionHandler(databases)['pooled']
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (id INTEGER)')
+        raw = wrapper.connection
+        wrapper.close()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM t')
+        self.assertIs(wrapper.connection, raw)
+        self.assertEqual(wrapper.pool.stats()['reused'], 1)
+
+        # Con el pool agotado falla tras TIMEOUT
+        other = ConnectionHandler(databases)['pooled']
+        with self.assertRaises(OperationalError):
+            other.ensure_connection()
+        wrapper.close()
+        other.ensure_connection()
+        self.assertIs(other.connection, raw)
+        other.close()
+
+    def test_size_and_timeout(self):
+        pool = ConnectionPool(size=1, timeout=0.05)
+        first = pool.acquire(self.connect, self.check)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.connect, self.check)
+        pool.release(first, self.reset)
+        self.assertIs(pool.acquire(self.connect, self.check), first)
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_health_check(self):
+        pool = ConnectionPool(size=1, health_check_interval=0)
+        first = pool.acquire(self.connect, self.check)
+        pool.release(first, self.reset)
+        first.close()
+        second = pool.acquire(self.connect, self.check)
+        self.assertIsNot(second, first)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+    def test_max_lifetime(self):
+        pool = ConnectionPool(size=1, max_lifetime=0)
+        pool.release(pool.acquire(self.connect, self.check), self.reset)
+        self.assertEqual(pool.stats(), dict(pool.stats(), open=0, idle=0, discarded=1))
+
+
+@override_settings(SNIPPETS={'DATABASE_REPLICAS': ('replica',)})
+class ReplicaRouterTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+
+    def reads(self, path):
+        aliases = set()
+        original = ReplicaRouter.db_for_read
+
+        def db_for_read(router, model, **hints):
+            alias = original(router, model, **hints)
+            aliases.add(alias)
+            # La réplica de los tests es la propia base 'default'
+            return alias and 'default'
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', db_for_read):
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return aliases
+
+    def test_read_only_views(self):
+        self.assertEqual(self.reads('/users/t4/p1/list/'), {'replica'})
+        self.assertEqual(self.reads('/users/t4/p1/detail/%d/' % self.user.pk), {'replica'})
+        self.assertEqual(self.reads('/snippets/t6/'), {None})
+
+    def test_writes(self):
+        router = ReplicaRouter()
+        self.user._state.db = 'replica'
+        self.assertEqual(router.db_for_write(User, instance=self.user), 'default')
+        self.assertIsNone(router.db_for_write(User))
+        self.assertIs(router.allow_migrate('replica', 'snippets'), False)
+        self.assertIsNone(router.allow_migrate('default', 'snippets'))
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def test_take(self):
+        self.assertEqual(take(None, None, 0, 3, 10, 1), (7, 0))
+        self.assertEqual(take(1, 0, 2, 5, 10, 1), (None, 2))
+        # Se rellena hasta la capacidad y el coste no pasa de ella
+        self.assertEqual(take(0, 0, 100, 50, 10, 1), (0, 0))
+
+    def check_store(self, store, other=None):
+        other = other or store
+        self.assertEqual(store.consume('a', 6, 10, 1, now=0), (True, 0))
+        self.assertEqual(other.consume('a', 6, 10, 1, now=0), (False, 2))
+        self.assertEqual(other.consume('b', 6, 10, 1, now=0), (True, 0))
+        self.assertEqual(store.consume('a', 6, 10, 1, now=2), (True, 0))
+        store.clear()
+        self.assertEqual(other.consume('a', 10, 10, 1, now=2), (True, 0))
+
+    def test_local(self):
+        self.check_store(LocalBucketStore())
+        store = LocalBucketStore(max_entries=1)
+        store.consume('a', 10, 10, 1, now=0)
+        store.consume('b', 10, 10, 1, now=0)
+        self.assertTrue(store.consume('a', 10, 10, 1, now=0)[0])
+
+    def test_sqlite(self):
+        path = os.path.join(tempfile.mkdtemp(), 'throttle.sqlite3')
+        # Dos almacenes sobre el mismo fichero, como dos procesos
+        self.check_store(SQLiteBucketStore(path), SQLiteBucketStore(path))
+
+
+@override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'snippets': '30/min'}))
+class ThrottleTests(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.user = User.objects.create(username='user')
+        self.snippet = Snippet.objects.create(owner=self.user, code='print(1)')
+        timer = mock.patch.object(TokenBucketThrottle, 'timer', mock.Mock(return_value=1000.0))
+        timer.start()
+        self.addCleanup(timer.stop)
+
+    def test_costs(self):
+        url = '/snippets/t6/%d/' % self.snippet.pk
+        # 30 fichas: dos highlights de 10 y diez lecturas de 1
+        for _ in range(2):
+            self.assertEqual(self.client.get(url + 'highlight/').status_code, 200)
+        for _ in range(10):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get(url + 'highlight/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+        self.assertEqual(self.client.get('/snippets/%d/highlight/' % self.snippet.pk).status_code, 429)
+        # Otro usuario y otros ámbitos tienen sus propios cubos
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url + 'highlight/').status_code, 200)
+        self.assertEqual(self.client.get('/users/t6/').status_code, 200)
+
+    @unittest.skipUnless(django.VERSION >= (3, 1), 'las vistas asíncronas requieren Django 3.1')
+    def test_async(self):
+        url = '/async/snippets/%d/' % self.snippet.pk
+        for _ in range(2):
+            self.assertEqual(self.client.get(url + 'highlight/').status_code, 200)
+        for _ in range(10):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(url + 'highlight/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+        # El mismo cubo que las vistas síncronas
+        self.assertEqual(self.client.get('/snippets/t6/%d/' % self.snippet.pk).status_code, 429)
+        self.assertEqual(self.client.get('/async/users/').status_code, 200)
+
+    def test_export(self):
+        # La exportación gasta como un /bulk/: 50 fichas, que se quedan en la capacidad (30)
+        self.client.force_login(User.objects.create(username='staff', is_staff=True))
+        self.assertEqual(self.client.get('/snippets/export/').status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/snippets/export/?format=json')
+        self.assertEqual(response.status_code, 429)
+        self.assertNotIn('snippets_snippet', ' '.join(q['sql'] for q in queries))
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    @override_settings(SNIPPETS={'THROTTLE_STORE': 'sqlite',
+                                 'THROTTLE_SQLITE_PATH': os.path.join(tempfile.mkdtemp(), 'throttle.sqlite3')})
+    def test_bulk_sqlite(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/snippets/t6/').status_code, 200)
+        # El coste de 50 se queda en la capacidad (30), que ya no está entera
+        self.assertEqual(self.client.post('/snippets/bulk/', json.dumps([{'code': 'x'}]),
+                                          content_type='application/json').status_code, 429)
+        self.assertEqual(self.client.get('/snippets/t6/').status_code, 200)
+
+
+class BenchmarkSmokeTests(SimpleTestCase):
+    """
+    benchmarks/endpoints.py con unos pocos datos, para que el harness no se rompa sin enterarse.
+    """
+
+    def test_endpoints(self):
+        output = os.path.join(tempfile.mkdtemp(), 'endpoints.json')
+        self.addCleanup(lambda: os.path.exists(output) and os.remove(output))
+        script = os.path.join(settings.BASE_DIR, 'benchmarks', 'endpoints.py')
+        result = subprocess.run(
+            [sys.executable, script, '--database', 'sqlite', '--users', '2', '--snippets', '3',
+             '--large-snippets', '1', '--large-lines', '5', '--repeat', '1', '--output', output],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stdout)
+        with open(output, encoding='utf-8') as f:
+            routes = {(route['route'], route['variant']): route for route in json.load(f)['routes']}
+        self.assertEqual(routes[('/snippets/t6/', None)]['status'], 200)
+        self.assertEqual(routes[('/snippets/t6/<int:pk>/highlight/', 'grande')]['status'], 200)
@@ -0,0 +1,197 @@
+"""
+Límite de peticiones por cliente y ámbito con token buckets.
+
+Cada (ámbito, cliente) tiene un cubo de REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+[ámbito] fichas ('n/s', 'n/m', 'n/h' o 'n/d': capacidad n, se rellena a n por
+periodo). El ámbito es el `throttle_scope` de la vista y el cliente el usuario
+autenticado o la IP. Cada petición gasta según lo que cuesta servirla
+(THROTTLE_COSTS): un highlight resalta con pygments y un /bulk/ escribe hasta
+BULK_MAX_ITEMS snippets, así que gastan más que una lectura.
+
+El cubo guarda solo (fichas, instante): al consultarlo se rellena con el
+tiempo pasado, así que cada decisión es una lectura y una escritura por clave,
+sin listas de peticiones como SimpleRateThrottle. No se usa la base de datos:
+
+- 'local': diccionario en memoria del proceso (LRU de THROTTLE_MAX_ENTRIES).
+  Con varios procesos cada uno tiene sus cubos.
+- 'sqlite': fichero SQLite propio (THROTTLE_SQLITE_PATH), compartido por los
+  procesos de la máquina; cada decisión es una transacción sobre la clave
+  primaria.
+
+Un cubo que no está guardado está lleno, así que los llenos se pueden borrar.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from snippets.conf import snippets_setting
+
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    'n/periodo' -> (capacidad, fichas por segundo), o None.
+    """
+    if rate is None:
+        return None
+    num, period = rate.split('/')
+    return int(num), int(num) / DURATIONS[period[0]]
+
+
+def take(tokens, updated, now, cost, capacity, rate):
+    """
+    Gasta `cost` fichas de un cubo con `tokens` en `updated` (None si está
+    lleno). Devuelve (fichas que quedan o None si no alcanzan, segundos hasta
+    que alcancen).
+    """
+    if tokens is not None:
+        tokens = min(capacity, tokens + (now - updated) * rate)
+    else:
+        tokens = capacity
+    cost = min(cost, capacity)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return None, (cost - tokens) / rate
+
+
+class LocalBucketStore:
+    """
+    Cubos en memoria del proceso. Al pasar de `max_entries` se descartan
+    los usados hace más tiempo, que son los que más probablemente ya están llenos.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, cost, capacity, rate, now):
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (None, None))
+            left, wait = take(tokens, updated, now, cost, capacity, rate)
+            if left is not None:
+                self._buckets[key] = (left, now)
+                self._buckets.move_to_end(key)
+                if len(self._buckets) > self.max_entries:
+                    self._buckets.popitem(last=False)
+            return left is not None, wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBucketStore:
+    """
+    Cubos en un fichero SQLite, con una conexión por hilo. `full_at` es
+    cuándo se llena cada cubo; cada CLEANUP_INTERVAL decisiones se borran
+    los ya llenos.
+    """
+    CLEANUP_INTERVAL = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._count = 0
+        connection = self._connection()
+        connection.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                           'updated REAL NOT NULL, full_at REAL NOT NULL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS buckets_full_at ON buckets (full_at)')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            self._local.connection = connection
+        return connection
+
+    def consume(self, key, cost, capacity, rate, now):
+        connection = self._connection()
+        # BEGIN IMMEDIATE bloquea la escritura: otro proceso no lee el mismo cubo a la vez
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            left, wait = take(*(row or (None, None)), now, cost, capacity, rate)
+            if left is not None:
+                connection.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) '
+                                   'VALUES (?, ?, ?, ?)', (key, left, now, now + (capacity - left) / rate))
+            self._count += 1
+            if self._count % self.CLEANUP_INTERVAL == 0:
+                connection.execute('DELETE FROM buckets WHERE full_at < ?', (now,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return left is not None, wait
+
+    def clear(self):
+        self._connection().execute('DELETE FROM buckets')
+
+
+_stores = {}
+_lock = threading.Lock()
+
+
+def get_store():
+    """
+    El almacén de THROTTLE_STORE, creado la primera vez.
+    """
+    kind = snippets_setting('THROTTLE_STORE')
+    if kind == 'sqlite':
+        key = (kind, snippets_setting('THROTTLE_SQLITE_PATH')
+               or os.path.join(tempfile.gettempdir(), 'snippets_throttle.sqlite3'))
+    else:
+        key = (kind, snippets_setting('THROTTLE_MAX_ENTRIES'))
+    store = _stores.get(key)
+    if store is None:
+        with _lock:
+            store = _stores.get(key)
+            if store is None:
+                store = SQLiteBucketStore(key[1]) if kind == 'sqlite' else LocalBucketStore(key[1])
+                _stores[key] = store
+    return store
+
+
+def request_cost(request, view):
+    """
+    Fichas que gasta la petición: la de `throttle_cost` de la vista o de su
+    acción si está en THROTTLE_COSTS, y si no 'read' o 'write' según el método.
+    """
+    costs = snippets_setting('THROTTLE_COSTS')
+    for name in (getattr(view, 'throttle_cost', None), getattr(view, 'action', None)):
+        if name in costs:
+            return costs[name]
+    return costs['read' if request.method in ('GET', 'HEAD', 'OPTIONS') else 'write']
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle de DRF con los cubos de get_store(). Las vistas sin
+    `throttle_scope` usan el ámbito 'default'; sin tasa no hay límite.
+    """
+    timer = time.time
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        scope = getattr(view, 'throttle_scope', 'default')
+        rate = parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(scope))
+        if rate is None:
+            return True
+        user = request.user
+        ident = 'user:%s' % user.pk if user and user.is_authenticated else 'ip:%s' % self.get_ident(request)
+        allowed, self.wait_time = get_store().consume(
+            '%s:%s' % (scope, ident), request_cost(request, view), *rate, now=self.timer())
+        return allowed
+
+    def wait(self):
+        return self.wait_time
@@ -1,10 +1,12 @@
+import django
 from django.urls import path, re_path, include
-from django.conf.urls import url
 from rest_framework.urlpatterns import format_suffix_patterns
 from rest_framework import renderers
-from rest_framework.routers import DefaultRouter
+from rest_framework.parsers import JSONParser
 
 from snippets import views
+from snippets.parsers import NDJSONParser
+from snippets.response_cache import CachedRouter
 from snippets.views import SnippetViewSetT6, UserViewSetT6  # , api_root
 
 
@@ -22,6 +24,14 @@ snippet_detail_t6 = SnippetViewSetT6.as_view({
     'delete': 'destroy'
 })
 
+# Lotes: crear, modificar o borrar varios snippets en una petición
+snippet_bulk_t6 = SnippetViewSetT6.as_view({
+    'post': 'bulk',
+    'put': 'bulk',
+    'patch': 'bulk',
+    'delete': 'bulk'
+}, parser_classes=[JSONParser, NDJSONParser])
+
 snippet_highlight_t6 = SnippetViewSetT6.as_view({
     'get': 'highlight'
 }, renderer_classes=[renderers.StaticHTMLRenderer])
@@ -36,7 +46,8 @@ user_detail_t6 = UserViewSetT6.as_view({
 
 # Tutorial 6 Routers
 # Crea un enrutador y registra nuestros conjuntos de vistas con él.
-router = DefaultRouter()
+# (DefaultRouter con la vista raíz cacheada)
+router = CachedRouter()
 router.register(r'snippets', views.SnippetViewSetT6)
 router.register(r'users', views.UserViewSetT6)
 
@@ -76,15 +87,33 @@ urlpatterns = [
 
     # Tutorial 6: suprimo esta url ya viene del tutorial 5 "path('', views.api_root),"
     path('snippets/t6/', snippet_list_t6, name='snippet-list'),
+    path('snippets/t6/bulk/', snippet_bulk_t6, name='snippet-bulk'),
     path('snippets/t6/<int:pk>/', snippet_detail_t6, name='snippet-detail'),
     path('snippets/t6/<int:pk>/highlight/', snippet_highlight_t6, name='snippet-highlight'),
     path('users/t6/', user_list_t6, name='user-list'),
     path('users/t6/<int:pk>/', user_detail_t6, name='user-detail'),
 
-    # Routers url: conecta los recursos en vistas y url automaticamente
-    path('', include(router.urls)),
-]
+    # Hoja de estilos de pygments por estilo, enlazada desde los highlight
+    path('snippets/styles/<str:style>.css', views.snippet_style_css, name='snippet-style-css'),
 
+    # Exportación completa de los snippets (NDJSON o JSON) en streaming
+    path('snippets/export/', views.SnippetExport.as_view(), name='snippet-export'),
 
+    # Métricas de rendimiento para Prometheus
+    path('metrics', views.metrics, name='metrics'),
 
+    # Routers url: conecta los recursos en vistas y url automaticamente
+    path('', include(router.urls)),
+]
 
+# Vistas asíncronas de solo lectura para el despliegue ASGI (tutorial/asgi.py)
+if django.VERSION >= (3, 1):
+    from snippets import async_views
+
+    urlpatterns += [
+        path('async/snippets/', async_views.snippet_list, name='async-snippet-list'),
+        path('async/snippets/<int:pk>/', async_views.snippet_detail, name='async-snippet-detail'),
+        path('async/snippets/<int:pk>/highlight/', async_views.snippet_highlight, name='async-snippet-highlight'),
+        path('async/users/', async_views.user_list, name='async-user-list'),
+        path('async/users/<int:pk>/', async_views.user_detail, name='async-user-detail'),
+    ]
@@ -1,8 +1,10 @@
-from django.http import HttpResponse, JsonResponse, Http404
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, Http404, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
 from django.contrib.auth.models import User
 from rest_framework import status, mixins, generics, permissions
-from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import APIException
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework import renderers
 from rest_framework.parsers import JSONParser
 from rest_framework.decorators import api_view
@@ -12,10 +14,114 @@ from rest_framework.reverse import reverse  # Para devolver direcciones URL comp
 from rest_framework import viewsets
 from rest_framework.decorators import action
 
-from snippets.models import Snippet
+from snippets.bulk import BulkMixin
+from snippets.conditional import ConditionalGetMixin, _etag
+from snippets.conf import snippets_setting
+from snippets.db.routers import ReplicaReadMixin
+from snippets.export import FORMATS, export_snippets
+from snippets.fastpath import FastReadMixin, list_data
+from snippets.highlighting import full_document, is_full_document, style_css, variant_stats
+from snippets.metrics import registry
+from snippets.pagination import PaginationSettingMixin
+from snippets.catalog import STYLE_NAMES
+from snippets.models import HIGHLIGHT_FAILED_DETAIL, Snippet, SnippetRevision
 from snippets.serializers import SnippetSerializer, SnippetModelSerializer
 from snippets.serializers import UserSerializerNotOwner, UserSerializer
+from snippets.serializers import SnippetRevisionSerializer, SnippetRevisionDetailSerializer
 from snippets.permissions import IsOwnerOrReadOnly
+from snippets.profiles import CompactUserMixin
+from snippets.querysets import EagerLoadingMixin, eager_load
+from snippets.response_cache import ResponseCacheMixin
+from snippets.revisions import reconstruct
+from snippets.search import SnippetSearchFilter
+
+
+REVISION_COLUMNS = ('snippet_id', 'number', 'keyframe', 'size', 'digest', 'created')
+
+
+class HighlightFailed(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = HIGHLIGHT_FAILED_DETAIL
+    default_code = 'highlight_failed'
+
+
+def highlight_response(snippet, style=None, linenos=None):
+    """
+    Respuesta HTML del highlight. Si el resaltado en segundo plano todavía no
+    ha terminado devuelve 202, o lo genera en el momento según
+    HIGHLIGHT_PENDING_RESPONSE. Con otro `style` o `linenos` (?style=&linenos=)
+    devuelve la variante, sin guardarla en el snippet.
+
+    Si el resaltado en segundo plano ha fallado (tras HIGHLIGHT_RETRIES) se
+    devuelve 422 sin volver a llamar a pygments; se reintenta al guardar el
+    snippet o con `manage.py rehighlight`.
+    """
+    if snippet.highlight_status == Snippet.HIGHLIGHT_FAILED:
+        raise HighlightFailed()
+    if snippet.is_variant(style, linenos):
+        style = style or snippet.style
+        variant_stats.record(style, snippet.linenos if linenos is None else linenos)
+        html = snippet.render_variant(style, linenos)
+    elif (snippet.highlight_status == Snippet.HIGHLIGHT_PENDING
+            and snippets_setting('HIGHLIGHT_PENDING_RESPONSE') == 'accepted'):
+        return Response('', status=status.HTTP_202_ACCEPTED, headers={'Retry-After': '1'})
+    else:
+        style, html = snippet.style, snippet.render_highlighted()
+    if not is_full_document(html):
+        css_url = reverse('snippet-style-css', kwargs={'style': style})
+        html = full_document(html, snippet.title, css_url)
+    return Response(html)
+
+
+# Hoja de estilos compartida por todos los snippets de un mismo `style`
+@require_safe
+def snippet_style_css(request, style):
+    if style not in STYLE_NAMES:
+        raise Http404
+    css, etag = style_css(style)
+    if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(css, content_type='text/css; charset=utf-8')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+
+class ExportNegotiation(DefaultContentNegotiation):
+    # ?format= elige el formato de la exportación, no el renderer (solo se usa para los errores)
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class SnippetExport(APIView):
+    """
+    Exportación completa en streaming: ?format=ndjson (por defecto) o json.
+    Vuelca todos los snippets, así que es solo para staff, y gasta las fichas
+    de un /bulk/.
+    """
+    permission_classes = (permissions.IsAdminUser,)
+    renderer_classes = (renderers.JSONRenderer,)
+    content_negotiation_class = ExportNegotiation
+    throttle_scope = 'snippets'
+    throttle_cost = 'bulk'
+
+    def get(self, request):
+        fmt = request.query_params.get('format', 'ndjson')
+        if fmt not in FORMATS:
+            return HttpResponse('Formato no soportado: %s' % fmt, status=400)
+        response = StreamingHttpResponse(export_snippets(fmt), content_type=FORMATS[fmt])
+        response['Content-Disposition'] = 'attachment; filename="snippets.%s"' % fmt
+        return response
+
+
+# Métricas de MetricsMiddleware en formato de texto de Prometheus, solo para METRICS_ALLOWED_IPS
+@require_safe
+def metrics(request):
+    if (not snippets_setting('METRICS_ENABLED')
+            or request.META.get('REMOTE_ADDR') not in snippets_setting('METRICS_ALLOWED_IPS')):
+        raise Http404
+    return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 #####################
@@ -28,9 +134,7 @@ def snippet_list_t1(request):
 
     # Listar (Depurado y funciona)
     if request.method == 'GET':
-        snippets = Snippet.objects.all()
-        serializer = SnippetSerializer(snippets, many=True)
-        return JsonResponse(serializer.data, safe=False)
+        return JsonResponse(list_data(SnippetSerializer, Snippet.objects.all()), safe=False)
 
     # Crear
     elif request.method == 'POST':
@@ -48,7 +152,8 @@ def snippet_detail_t1(request, pk):
 
     # Comprueba que existe (Depurado, el fragmento solicitado por PK lo almacena en la variable snippet).
     try:
-        snippet = Snippet.objects.get(pk=pk)
+        snippets = eager_load(Snippet.objects.all(), SnippetSerializer, only=request.method == 'GET')
+        snippet = snippets.get(pk=pk)
     except Snippet.DoesNotExist:
         return HttpResponse(status=404)
 
@@ -81,9 +186,7 @@ def snippet_list_t2(request, format=None):
 
     # Listar (Depurado me lista todos los fragmentos).
     if request.method == 'GET':
-        snippets = Snippet.objects.all()
-        serializer = SnippetSerializer(snippets, many=True)
-        return Response(serializer.data)
+        return Response(list_data(SnippetSerializer, Snippet.objects.all()))
 
     # Crear (Depurado, crea fragmento)
     # Ejemplo usando Httpie: http --form POST http://127.0.0.1:8080/snippets_t2/ code="print 123" --> Usando FORM data
@@ -102,7 +205,8 @@ def snippet_detail(request, pk, format=None):
 
     # Comprueba que existe por PK
     try:
-        snippet = Snippet.objects.get(pk=pk)
+        snippets = eager_load(Snippet.objects.all(), SnippetSerializer, only=request.method == 'GET')
+        snippet = snippets.get(pk=pk)
     except Snippet.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -134,9 +238,7 @@ class SnippetListT3P1(APIView):
     # Listar (Depurado)
     # Usando Httpie: http http://127.0.0.1:8080/snippets_t3/
     def get(self, request, format=None):
-        snippets = Snippet.objects.all()
-        serializer = SnippetSerializer(snippets, many=True)
-        return Response(serializer.data)
+        return Response(list_data(SnippetSerializer, Snippet.objects.all()))
     # Crear (Depurado)
     # Usando Httpie: http http://127.0.0.1:8080/snippets_t3/ code=1989
     def post(self, request, format=None):
@@ -152,7 +254,9 @@ class SnippetDetailT3P1(APIView):
     # Recoge el objeto si existe(Depurado)
     def get_object(self, pk):
         try:
-            return Snippet.objects.get(pk=pk)
+            snippets = eager_load(Snippet.objects.all(), SnippetSerializer,
+                                  only=self.request.method == 'GET')
+            return snippets.get(pk=pk)
         except Snippet.DoesNotExist:
             raise Http404
 
@@ -183,7 +287,7 @@ class SnippetDetailT3P1(APIView):
 ##############################################
 # Vistas tutorial 3 Parte 2 Utilizando Mixin #
 ##############################################
-class SnippetListT3P2(mixins.ListModelMixin, mixins.CreateModelMixin, generics.GenericAPIView):
+class SnippetListT3P2(ResponseCacheMixin, ConditionalGetMixin, FastReadMixin, EagerLoadingMixin, mixins.ListModelMixin, mixins.CreateModelMixin, generics.GenericAPIView):
     queryset = Snippet.objects.all()
     serializer_class = SnippetSerializer
 
@@ -198,7 +302,7 @@ class SnippetListT3P2(mixins.ListModelMixin, mixins.CreateModelMixin, generics.G
         return self.create(request, *args, **kwargs)
 
 
-class SnippetDetailT3P2(mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin, generics.GenericAPIView):
+class SnippetDetailT3P2(ConditionalGetMixin, EagerLoadingMixin, mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin, generics.GenericAPIView):
     queryset = Snippet.objects.all()
     serializer_class = SnippetSerializer
 
@@ -220,13 +324,13 @@ class SnippetDetailT3P2(mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mixi
 ################################################################
 # Vistas tutorial 3 Parte 3 Vistas genéricas basadas en clases #
 ################################################################
-class SnippetListT3P3(generics.ListCreateAPIView):  # Lista todos los fragmentos de código o crea uno nuevo.
+class SnippetListT3P3(ConditionalGetMixin, FastReadMixin, EagerLoadingMixin, generics.ListCreateAPIView):  # Lista todos los fragmentos de código o crea uno nuevo.
     queryset = Snippet.objects.all()
     serializer_class = SnippetSerializer
     # (Depurado listar y crear)
 
 
-class SnippetDetailT3P3(generics.RetrieveUpdateDestroyAPIView):  # Recoge el objeto, lo muestra, edita o elimina.
+class SnippetDetailT3P3(ConditionalGetMixin, EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):  # Recoge el objeto, lo muestra, edita o elimina.
     queryset = Snippet.objects.all()
     serializer_class = SnippetSerializer
     # (Depurado eliminar y listar)
@@ -238,29 +342,29 @@ class SnippetDetailT3P3(generics.RetrieveUpdateDestroyAPIView):  # Recoge el obj
 
 # Tutorial 4 Permisos y autenticacion Sin owner
 # ListAPIViewy RetrieveAPIView las vistas genéricas basadas en clases
-class UserListNotOwner(generics.ListAPIView):
+class UserListNotOwner(ReplicaReadMixin, FastReadMixin, EagerLoadingMixin, generics.ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializerNotOwner
 
 
-class UserDetailNotOwner(generics.RetrieveAPIView):
+class UserDetailNotOwner(ReplicaReadMixin, EagerLoadingMixin, generics.RetrieveAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializerNotOwner
 
 
 # Tutorial 4 Permisos y autenticacion con owner #
 # ListAPIViewy RetrieveAPIView las vistas genéricas basadas en clases
-class UserList(generics.ListAPIView):
+class UserList(ReplicaReadMixin, ResponseCacheMixin, FastReadMixin, EagerLoadingMixin, generics.ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializerNotOwner
 
 
-class UserDetail(generics.RetrieveAPIView):
+class UserDetail(ReplicaReadMixin, EagerLoadingMixin, generics.RetrieveAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
 
-class SnippetListT4P2(generics.ListCreateAPIView):  # Lista todos los fragmentos de código o crea uno nuevo.
+class SnippetListT4P2(ConditionalGetMixin, FastReadMixin, EagerLoadingMixin, generics.ListCreateAPIView):  # Lista todos los fragmentos de código o crea uno nuevo.
     queryset = Snippet.objects.all()
     serializer_class = SnippetSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
@@ -270,7 +374,7 @@ class SnippetListT4P2(generics.ListCreateAPIView):  # Lista todos los fragmentos
         serializer.save(owner=self.request.user)
 
 
-class SnippetDetailT4P2(generics.RetrieveUpdateDestroyAPIView):  # Recoge el objeto, lo muestra, edita o elimina.
+class SnippetDetailT4P2(ConditionalGetMixin, EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):  # Recoge el objeto, lo muestra, edita o elimina.
     queryset = Snippet.objects.all()
     serializer_class = SnippetSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,
@@ -279,13 +383,16 @@ class SnippetDetailT4P2(generics.RetrieveUpdateDestroyAPIView):  # Recoge el obj
 
 # Tutorial 5 Relaciones y APIs hipervinculadas
 # Highlight para tratar con HTML pre-renderizado
-class SnippetHighlight(generics.GenericAPIView):
-    queryset = Snippet.objects.all()
+class SnippetHighlight(ConditionalGetMixin, generics.GenericAPIView):
+    # El HTML está en SnippetRendering
+    queryset = Snippet.objects.select_related('rendering')
     renderer_classes = (renderers.StaticHTMLRenderer,)
+    throttle_scope = 'snippets'
+    throttle_cost = 'highlight'
 
     def get(self, request, *args, **kwargs):
-        snippet = self.get_object()
-        return Response(snippet.highlighted)
+        variant = self.highlight_variant()
+        return self.conditional(lambda snippet: highlight_response(snippet, *variant), kind='highlight')
 
 
 # Vista regular basada en funciones con @api_view ya no es necesario con los routers
@@ -302,15 +409,18 @@ def api_root(request, format=None):
 # Vistas tutorial 6 ViewSets & Routers #
 ########################################
 # Refactorizando las vistas usando ViewSet
-class UserViewSetT6(viewsets.ReadOnlyModelViewSet):
+class UserViewSetT6(ReplicaReadMixin, ResponseCacheMixin, CompactUserMixin, FastReadMixin, EagerLoadingMixin,
+                    PaginationSettingMixin, viewsets.ReadOnlyModelViewSet):
     """
     This viewset automatically provides `list` and `detail` actions.
+    `?compact=1` devuelve el número de snippets en lugar de sus pks.
     """
     queryset = User.objects.all()
     serializer_class = UserSerializerNotOwner
 
 
-class SnippetViewSetT6(viewsets.ModelViewSet):
+class SnippetViewSetT6(BulkMixin, ResponseCacheMixin, ConditionalGetMixin, FastReadMixin, EagerLoadingMixin,
+                       PaginationSettingMixin, viewsets.ModelViewSet):
     """
     This viewset automatically provides `list`, `create`, `retrieve`,
     `update` and `destroy` actions.
@@ -320,19 +430,53 @@ class SnippetViewSetT6(viewsets.ModelViewSet):
     serializer_class = SnippetModelSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,
                           IsOwnerOrReadOnly,)
+    # ?search=, ?language=, ?style=, ?owner=
+    filter_backends = (SnippetSearchFilter,)
+    # highlight y bulk gastan más (SNIPPETS['THROTTLE_COSTS'])
+    throttle_scope = 'snippets'
+
+    def filter_queryset(self, queryset):
+        # En el highlight ?style= elige la variante, no filtra
+        if self.action == 'highlight':
+            return queryset.select_related('rendering')
+        return super().filter_queryset(queryset)
 
     # Este decorador se puede usar para agregar puntos finales personalizados que no se ajusten al estilo.
     # methods argumento si quisiéramos una acción que respondiera a las solicitud POST.
     @action(detail=True, renderer_classes=[renderers.StaticHTMLRenderer])
     def highlight(self, request, *args, **kwargs):
-        snippet = self.get_object()
-        return Response(snippet.highlighted)
+        variant = self.highlight_variant()
+        return self.conditional(lambda snippet: highlight_response(snippet, *variant), kind='highlight')
+
+    @action(detail=True)
+    def revisions(self, request, *args, **kwargs):
+        """
+        Revisiones del código del snippet, de la primera a la última, sin el código.
+        """
+        queryset = SnippetRevision.objects.filter(snippet_id=kwargs['pk']).values(*REVISION_COLUMNS)
+        page = self.paginate_queryset(queryset)
+        if not page and not Snippet.objects.filter(pk=kwargs['pk']).exists():
+            raise Http404
+        data = SnippetRevisionSerializer(page, many=True, context=self.get_serializer_context()).data
+        return self.get_paginated_response(data)
+
+    @action(detail=True, url_path=r'revisions/(?P<number>[0-9]+)', url_name='revision')
+    def revision(self, request, *args, **kwargs):
+        """
+        El código de una revisión. Las revisiones no cambian: el ETag es el hash del código.
+        """
+        pk, number = kwargs['pk'], int(kwargs['number'])
+        row = SnippetRevision.objects.filter(snippet_id=pk, number=number).values(*REVISION_COLUMNS).first()
+        if row is None:
+            raise Http404
+        etag = _etag('revision', row['digest'])
+        response = self.not_modified(etag)
+        if response is not None:
+            return response
+        row['code'] = reconstruct(pk, number)
+        response = Response(SnippetRevisionDetailSerializer(row, context=self.get_serializer_context()).data)
+        response['ETag'] = etag
+        return response
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
-
-
-
-
-
-
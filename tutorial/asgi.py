@@ -0,0 +1,20 @@
+"""
+ASGI config for tutorial project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Requiere Django 3.1 o posterior; las vistas asíncronas van bajo /async/
+(snippets/async_views.py).
+
+Por ejemplo: uvicorn tutorial.asgi:application --workers 4
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutorial.settings')
+
+application = get_asgi_application()
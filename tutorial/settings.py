@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # La primera, para medir la petición completa (ver /metrics)
+    'snippets.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,9 +84,23 @@ DATABASES = {
         'USER': 'tutorial',
         'PASSWORD': 'tutorial',
         'HOST': 'localhost',
+        # Conexión persistente por hilo del worker (segundos), comprobada antes de
+        # reutilizarla (CONN_HEALTH_CHECKS, Django 4.1+)
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Pool de conexiones por proceso (snippets/db/pool.py): en lugar de lo anterior,
+#     'ENGINE': 'snippets.db.postgresql',
+#     'CONN_MAX_AGE': 0,
+#     'POOL': {'SIZE': 10, 'TIMEOUT': 30, 'HEALTH_CHECK_INTERVAL': 30, 'MAX_LIFETIME': 3600},
+#
+# Réplicas de lectura para las vistas de solo lectura (snippets/db/routers.py):
+#     DATABASES['replica'] = {..., 'TEST': {'MIRROR': 'default'}}
+#     SNIPPETS['DATABASE_REPLICAS'] = ('replica',)
+DATABASE_ROUTERS = ['snippets.db.routers.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -127,5 +143,34 @@ STATIC_URL = '/static/'
 # Controla cuántos objetos por página se devuelven(chekeado con user-list)
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 2
+    'PAGE_SIZE': 2,
+    # Token buckets por usuario (o IP) y ámbito; el coste de cada petición en SNIPPETS['THROTTLE_COSTS']
+    'DEFAULT_THROTTLE_CLASSES': ['snippets.throttling.TokenBucketThrottle'],
+    'DEFAULT_THROTTLE_RATES': {
+        'default': '600/min',
+        'snippets': '600/min',
+    },
+}
+
+# Configuración de la app snippets (valores por defecto en snippets/conf.py)
+SNIPPETS = {
+    'HIGHLIGHT_CACHE_SIZE': 256,
+    # 'HIGHLIGHT_CACHE_ALIAS': 'default',  # Nivel compartido entre procesos
+    # 'HIGHLIGHT_MODE': 'deferred',  # Resaltado en segundo plano (pool de procesos)
+    'RESPONSE_CACHE_ALIAS': 'responses',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Caché de respuestas de los listados: LocMemCache descarta por LRU, pero es
+    # de cada proceso; con varios procesos usar FileBasedCache, p.ej.
+    # 'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    # 'LOCATION': '/var/tmp/tutorial_responses',
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
 }
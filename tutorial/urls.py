@@ -14,21 +14,20 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
-from django.conf.urls import url, include
-from rest_framework import routers
+from django.urls import include, path, re_path
 from quickstart import views
+from snippets.response_cache import CachedRouter
 
 
-router = routers.DefaultRouter()
+router = CachedRouter()
 router.register(r'users', views.UserViewSet)
 router.register(r'groups', views.GroupViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    url(r'^api-auth/', include('rest_framework.urls', namespace='rest_framework')),
+    re_path(r'^api-auth/', include('rest_framework.urls', namespace='rest_framework')),
     path('', include('snippets.urls')),  # Enlace a nuestras urls.py de la aplicación snippets
-    url(r'^', include(router.urls)),
+    re_path(r'^', include(router.urls)),
 ]
 
 